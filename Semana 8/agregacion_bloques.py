@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Cada cuántos conteos parciales se combinan, para que la memoria no crezca con la cantidad de bloques
+CONTEOS_POR_COMBINACION = 32
+
+
+def contar_valores(bloque, columna):
+    """Cantidad de filas de cada valor absoluto distinto de una columna (sin nulos)"""
+    valores = np.abs(bloque[columna].to_numpy(np.float32)).astype(np.float64)
+    unicos, conteos = np.unique(valores[~np.isnan(valores)], return_counts=True)
+    return pd.Series(conteos, index=unicos)
+
+
+def unir_conteos(conteos):
+    """Sumar conteos parciales de valores; el resultado queda ordenado por valor"""
+    if not conteos:
+        return pd.Series(dtype=np.int64)
+    return pd.concat(conteos).groupby(level=0).sum()
+
+
+def cuantiles_exactos(conteos, cuantiles):
+    """Cuantiles con interpolación lineal (los mismos de np.quantile) a partir de conteos de valores"""
+    valores = conteos.index.to_numpy(np.float64)
+    acumulado = np.cumsum(conteos.to_numpy())
+    n = acumulado[-1]
+    resultado = []
+    for cuantil in cuantiles:
+        posicion = (n - 1) * cuantil
+        abajo = int(np.floor(posicion))
+        a = valores[np.searchsorted(acumulado, abajo, side='right')]
+        b = valores[np.searchsorted(acumulado, min(abajo + 1, n - 1), side='right')]
+        t = posicion - abajo
+        # Misma fórmula de interpolación que numpy, para obtener el mismo resultado en coma flotante
+        resultado.append(b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t)
+    return resultado
+
+
+def rangos_promedio(conteos):
+    """Rango promedio (con empates, como stats.rankdata) de cada valor distinto de los conteos"""
+    conteos_valores = conteos.to_numpy(np.float64)
+    return conteos.index.to_numpy(np.float64), np.cumsum(conteos_valores) - (conteos_valores - 1) / 2
+
+
+class AgregacionBloques:
+    def __init__(self, n_procesos=None):
+        self.n_procesos = n_procesos or os.cpu_count()
+
+    def procesar(self, bloques, funcion, *argumentos):
+        """Aplicar funcion a cada bloque en paralelo, entregando los resultados en el orden de los bloques"""
+        listos = {}
+        siguiente = 0
+        with ProcessPoolExecutor(max_workers=self.n_procesos) as pool:
+            pendientes = {}
+            for indice, bloque in enumerate(bloques):
+                pendientes[pool.submit(funcion, bloque, *argumentos)] = indice
+
+                # Se lee un bloque nuevo solo cuando hay cupo, así la memoria no depende del total
+                while len(pendientes) >= 2 * self.n_procesos:
+                    terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        listos[pendientes.pop(futuro)] = futuro.result()
+                    while siguiente in listos:
+                        yield listos.pop(siguiente)
+                        siguiente += 1
+
+            while pendientes:
+                terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    listos[pendientes.pop(futuro)] = futuro.result()
+                while siguiente in listos:
+                    yield listos.pop(siguiente)
+                    siguiente += 1
+
+    def conteos(self, bloques, columna):
+        """Conteo exacto de los valores absolutos de una columna recorriendo todos los bloques"""
+        conteos = []
+        for conteo in self.procesar(bloques, contar_valores, columna):
+            conteos.append(conteo)
+            if len(conteos) >= CONTEOS_POR_COMBINACION:
+                conteos = [unir_conteos(conteos)]
+        return unir_conteos(conteos)
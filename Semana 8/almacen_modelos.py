@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+import joblib
+import pandas as pd
+
+# Directorio por defecto de los modelos entrenados (junto a los scripts de análisis)
+DIRECTORIO_MODELOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos_mermas')
+
+# Parámetros que solo afectan la velocidad de entrenamiento y no el modelo resultante
+PARAMETROS_HILOS = ['n_jobs', 'thread_count']
+
+
+def huella_datos(*partes):
+    """Huella SHA-256 del contenido de DataFrames y Series (valores, índice y columnas)"""
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(pd.util.hash_pandas_object(parte, index=True).to_numpy().tobytes())
+        nombres = list(parte.columns) if isinstance(parte, pd.DataFrame) else [parte.name]
+        h.update(json.dumps(nombres, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def huella_parametros(modelo, scaler=None):
+    """Huella de los hiperparámetros de un modelo y del escalador que lo acompaña"""
+    parametros = {k: v for k, v in modelo.get_params().items() if k not in PARAMETROS_HILOS}
+    descripcion = {
+        'modelo': type(modelo).__name__,
+        'parametros': parametros,
+        'scaler': type(scaler).__name__ if scaler is not None else None
+    }
+    return hashlib.sha256(json.dumps(descripcion, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class AlmacenModelos:
+    def __init__(self, directorio=DIRECTORIO_MODELOS):
+        self.directorio = directorio
+        self.ruta_estado = os.path.join(directorio, '_estado.json')
+        # Métricas de cada paquete, para elegir el mejor sin cargar los modelos
+        self.ruta_metricas = os.path.join(directorio, '_metricas.json')
+
+    def leer_estado(self):
+        """Watermark del último entrenamiento, fecha del último reentrenamiento completo y límites IQR"""
+        if not os.path.exists(self.ruta_estado):
+            return {'watermark': None, 'ultimo_completo': None, 'limites_iqr': None}
+        with open(self.ruta_estado, encoding='utf-8') as f:
+            return json.load(f)
+
+    def guardar_estado(self, estado):
+        """Guardar el estado de entrenamiento de forma atómica"""
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta_tmp = self.ruta_estado + '.tmp'
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, indent=2)
+        os.replace(ruta_tmp, self.ruta_estado)
+
+    def ruta(self, nombre):
+        """Archivo del paquete de un modelo"""
+        archivo = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+        archivo = re.sub(r'[^0-9a-zA-Z]+', '_', archivo).strip('_').lower()
+        return os.path.join(self.directorio, f'{archivo}.joblib')
+
+    def clave(self, huella, modelo, scaler=None):
+        """Clave de un paquete: huella de los datos de entrenamiento más hiperparámetros"""
+        return hashlib.sha256((huella + huella_parametros(modelo, scaler)).encode('utf-8')).hexdigest()
+
+    def cargar(self, nombre, clave=None):
+        """Paquete guardado del modelo (si se indica clave, solo si coincide), o None"""
+        ruta = self.ruta(nombre)
+        if not os.path.exists(ruta):
+            return None
+        try:
+            paquete = joblib.load(ruta)
+        except Exception as e:
+            print(f"No se pudo leer {ruta}: {e}")
+            return None
+        return paquete if clave is None or paquete.get('clave') == clave else None
+
+    def guardar(self, nombre, clave, modelo, scaler, encoders, feature_names, metricas, perfil=None,
+                evaluacion=None, motor_rezagos=None, metricas_incrementales=None):
+        """Guardar de forma atómica el paquete completo de un modelo; metricas es la prueba del último
+        entrenamiento completo y metricas_incrementales la evaluación sobre los últimos días incorporados"""
+        os.makedirs(self.directorio, exist_ok=True)
+        paquete = {
+            'clave': clave,
+            'modelo': modelo,
+            'scaler': scaler,
+            'encoders': encoders,
+            'feature_names': list(feature_names),
+            'metricas': metricas,
+            'perfil': perfil,
+            'evaluacion': evaluacion,
+            'motor_rezagos': motor_rezagos,
+            'metricas_incrementales': metricas_incrementales
+        }
+        ruta = self.ruta(nombre)
+        ruta_tmp = ruta + '.tmp'
+        joblib.dump(paquete, ruta_tmp)
+        os.replace(ruta_tmp, ruta)
+
+        # El índice solo lleva métricas de prueba, comparables entre modelos
+        indice = self.leer_metricas()
+        indice[os.path.basename(ruta)] = metricas
+        self.guardar_metricas(indice)
+
+    def leer_metricas(self):
+        """Índice archivo del paquete -> métricas"""
+        if not os.path.exists(self.ruta_metricas):
+            return {}
+        with open(self.ruta_metricas, encoding='utf-8') as f:
+            return json.load(f)
+
+    def guardar_metricas(self, indice):
+        """Guardar el índice de métricas de forma atómica"""
+        ruta_tmp = self.ruta_metricas + '.tmp'
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, indent=2, ensure_ascii=False, default=float)
+        os.replace(ruta_tmp, self.ruta_metricas)
+
+    def mejor(self):
+        """Nombre del modelo guardado con mayor R² (leído del índice de métricas)"""
+        if not os.path.isdir(self.directorio):
+            return None
+        indice = self.leer_metricas()
+
+        # Paquetes guardados antes de existir el índice: se leen una vez y se agregan
+        faltantes = [archivo for archivo in os.listdir(self.directorio)
+                     if archivo.endswith('.joblib') and archivo not in indice]
+        for archivo in faltantes:
+            indice[archivo] = joblib.load(os.path.join(self.directorio, archivo)).get('metricas')
+        if faltantes:
+            self.guardar_metricas(indice)
+
+        mejor_nombre, mejor_r2 = None, None
+        for archivo, metricas in indice.items():
+            if not os.path.exists(os.path.join(self.directorio, archivo)):
+                continue
+            if metricas and (mejor_r2 is None or metricas['R²'] > mejor_r2):
+                mejor_nombre, mejor_r2 = metricas['Modelo'], metricas['R²']
+        return mejor_nombre
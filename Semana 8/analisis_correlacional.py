@@ -1,16 +1,77 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pymysql
+import pyarrow.compute as pc
 import warnings
-from scipy import stats
+from snapshot_mermas import SnapshotMermas
+from cubos_mermas import CubosMermas
+from etl_datamart import cargar_desde_datamart
+from cargador_mermas import cargar_en_bloques, leer_en_bloques, compactar_tipos, TAMANO_BLOQUE
+from motor_caracteristicas import MotorCaracteristicas
+from motor_correlaciones import calcular_correlaciones, calcular_correlaciones_celdas
+from agregacion_bloques import AgregacionBloques, rangos_promedio
+from renderizador_graficos import RenderizadorGraficos, dibujar_mapa_calor, dibujar_serie
 
 warnings.filterwarnings('ignore')
 
+# Variables derivadas: (nombre de columna, dimensiones combinadas, tipo)
+COMBINACIONES = [
+    # Variables categóricas numéricas
+    ('linea_num', ('linea',), 'codigo'),
+    ('categoria_num', ('categoria',), 'codigo'),
+    ('seccion_num', ('seccion',), 'codigo'),
+    ('motivo_num', ('motivo',), 'codigo'),
+    # 1. Combinaciones que ya sabemos que funcionan
+    ('seccion_motivo_num', ('seccion', 'motivo'), 'codigo'),
+    ('linea_categoria_num', ('linea', 'categoria'), 'codigo'),
+    ('linea_motivo_num', ('linea', 'motivo'), 'codigo'),
+    ('categoria_motivo_num', ('categoria', 'motivo'), 'codigo'),
+    # 2. Agregaciones que ya sabemos que funcionan
+    ('merma_categoria_promedio', ('categoria',), 'promedio'),
+    ('merma_linea_promedio', ('linea',), 'promedio'),
+    ('merma_seccion_promedio', ('seccion',), 'promedio'),
+    ('merma_motivo_promedio', ('motivo',), 'promedio'),
+    ('merma_linea_categoria_promedio', ('linea', 'categoria'), 'promedio'),
+    ('merma_seccion_motivo_promedio', ('seccion', 'motivo'), 'promedio'),
+    # 3. Combinaciones con variables temporales
+    ('merma_fin_semana_categoria', ('fin_semana', 'categoria'), 'promedio'),
+    ('merma_fin_mes_linea', ('fin_mes', 'linea'), 'promedio'),
+    ('merma_fin_semana_seccion', ('fin_semana', 'seccion'), 'promedio'),
+    ('merma_fin_mes_motivo', ('fin_mes', 'motivo'), 'promedio')
+]
+
+# Celdas del modo fuera de memoria: cada una resume las filas de un día con las mismas dimensiones
+DIMENSIONES_CELDA = ['fecha', 'linea', 'categoria', 'seccion', 'motivo']
+
+
+def _agregar_celdas(bloque, valores, rangos):
+    """Estadísticos suficientes por celda de un bloque: n, Σy, Σy², Σrango(y) y Σrango(y)²"""
+    y = np.abs(bloque['merma_unidad'].to_numpy(np.float32)).astype(np.float64)
+    rango = rangos[np.searchsorted(valores, y)]
+    celdas = bloque[DIMENSIONES_CELDA].assign(
+        peso=1.0, suma=y, suma_cuadrados=y ** 2, suma_rangos=rango, suma_rangos_cuadrados=rango ** 2
+    )
+    return celdas.groupby(DIMENSIONES_CELDA, observed=True, dropna=False, sort=False).sum().reset_index()
+
 class AnalisisCorrelacional:
-    def __init__(self):
-        pass
+    def __init__(self, fuente='snapshot', directorio_graficos=None, formatos_graficos=('png',),
+                 procesos_graficos=None, fuera_de_memoria=False, n_procesos=None, tamano_bloque=TAMANO_BLOQUE):
+        # fuente: 'snapshot' (copia local columnar), 'cubo' (agregados diarios),
+        # 'datamart' (esquema estrella) o 'bd' (consulta completa)
+        self.fuente = fuente
+        # fuera_de_memoria: leer las filas en bloques por fecha y reducirlas en paralelo a celdas
+        # día × dimensiones con estadísticos exactos (solo con 'snapshot' o 'bd')
+        if fuera_de_memoria and fuente not in ('snapshot', 'bd'):
+            raise ValueError(f"El modo fuera de memoria requiere fuente 'snapshot' o 'bd', no '{fuente}'")
+        self.fuera_de_memoria = fuera_de_memoria
+        self.tamano_bloque = tamano_bloque
+        self.agregacion = AgregacionBloques(n_procesos)
+        self.snapshot = SnapshotMermas(self.conectar_bd)
+        self.cubos = CubosMermas(self.conectar_bd)
+        self.motor = MotorCaracteristicas(COMBINACIONES)
+        # Con directorio_graficos los gráficos se guardan sin pantalla en vez de mostrarse
+        self.graficos = RenderizadorGraficos(directorio_graficos, formatos_graficos, procesos_graficos)
         
     def conectar_bd(self):
         """Conexión a la base de datos"""
@@ -21,11 +82,82 @@ class AnalisisCorrelacional:
             database='mermas'
         )
 
+    def refrescar_fuente(self):
+        """Incorporar a la fuente local las filas nuevas de mermasdb antes de leerla"""
+        if self.fuente == 'snapshot':
+            self.snapshot.actualizar()
+        if self.fuente == 'cubo':
+            self.cubos.actualizar()
+
     def cargar_datos(self):
-        """Cargar datos desde la base de datos"""
+        """Cargar datos desde el snapshot local o desde la base de datos"""
+        self.refrescar_fuente()
+        if self.fuera_de_memoria:
+            return self.cargar_datos_en_bloques()
+        if self.fuente == 'snapshot':
+            return self.cargar_datos_snapshot()
+        if self.fuente == 'cubo':
+            return self.cargar_datos_cubo()
+        if self.fuente == 'datamart':
+            return self.cargar_datos_datamart()
+        return self.cargar_datos_bd()
+
+    def filtro_snapshot(self):
+        """Filtro de filas válidas del snapshot"""
+        return (
+            pc.field('merma_unidad').is_valid() &
+            (pc.field('categoria') != 'insumos platos asadurias')
+        )
+
+    def cargar_datos_snapshot(self):
+        """Cargar datos desde el snapshot local, trayendo solo las fechas nuevas"""
+        data = self.snapshot.cargar(
+            columnas=['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'merma_unidad'],
+            filtro=self.filtro_snapshot()
+        )
+
+        print(f"Datos cargados: {len(data)} registros")
+        return data
+
+    def cargar_datos_cubo(self):
+        """Cargar celdas día × línea × categoría × sección × motivo desde el cubo agregado"""
+        data = self.cubos.cargar(
+            'cubo_dia_detalle',
+            dimensiones=['linea', 'categoria', 'seccion', 'motivo'],
+            # La categoría nula se guarda como '' en el cubo; se excluye igual que en las filas originales
+            condicion="categoria != '' AND categoria != 'insumos platos asadurias'"
+        )
+        data = data[data['n_unidad'] > 0]
+        
+        # Cada fila es el promedio de la celda; 'peso' mantiene exactos los promedios por grupo y,
+        # con Σy y Σy², el Pearson sobre las filas originales (el cubo no guarda rangos para Spearman)
+        data['merma_unidad'] = data['suma_unidad_abs'] / data['n_unidad']
+        data['peso'] = data['n_unidad']
+        data['suma'] = data['suma_unidad_abs']
+        data['suma_cuadrados'] = data['suma_cuadrados_unidad']
+        data = data[['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'merma_unidad', 'peso',
+                     'suma', 'suma_cuadrados']]
+        
+        print(f"Datos cargados: {len(data)} celdas ({int(data['peso'].sum())} registros)")
+        return data
+
+    def cargar_datos_datamart(self):
+        """Cargar datos desde la tabla de hechos MERMAS del datamart (llaves enteras)"""
         connection = self.conectar_bd()
+        data = cargar_desde_datamart(connection, ['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'merma_unidad'])
+        connection.close()
+        data = data[
+            data['merma_unidad'].notna() &
+            data['categoria'].notna() &
+            (data['categoria'] != 'insumos platos asadurias')
+        ].reset_index(drop=True)
         
-        query = """
+        print(f"Datos cargados: {len(data)} registros")
+        return data
+
+    def consulta_bd(self):
+        """Consulta de filas válidas ordenadas por fecha"""
+        return """
         SELECT 
             fecha,
             linea,
@@ -40,12 +172,48 @@ class AnalisisCorrelacional:
         ORDER BY fecha
         """
 
-        data = pd.read_sql(query, connection)
+    def cargar_datos_bd(self):
+        """Cargar datos desde la base de datos"""
+        connection = self.conectar_bd()
+        data = cargar_en_bloques(connection, self.consulta_bd())
         connection.close()
         
         print(f"Datos cargados: {len(data)} registros")
         return data
 
+    def bloques_datos(self):
+        """Recorrer las filas válidas en bloques ordenados por fecha, desde el snapshot o la base de datos"""
+        if self.fuente == 'snapshot':
+            yield from self.snapshot.bloques(DIMENSIONES_CELDA + ['merma_unidad'], self.filtro_snapshot(),
+                                             self.tamano_bloque)
+            return
+        connection = self.conectar_bd()
+        try:
+            yield from leer_en_bloques(connection, self.consulta_bd(), tamano_bloque=self.tamano_bloque)
+        finally:
+            connection.close()
+
+    def cargar_datos_en_bloques(self):
+        """Reducir las filas a celdas día × dimensiones leyendo por bloques, sin cargarlas completas"""
+        # Primera pasada: conteo de cada valor de merma para conocer su rango entre todas las filas
+        conteos = self.agregacion.conteos(self.bloques_datos(), 'merma_unidad')
+        valores, rangos = rangos_promedio(conteos)
+
+        # Segunda pasada: estadísticos por celda de cada bloque en paralelo; se suman al unirlos
+        parciales = list(self.agregacion.procesar(self.bloques_datos(), _agregar_celdas, valores, rangos))
+        data = pd.concat(parciales, ignore_index=True)
+        del parciales
+        for col in DIMENSIONES_CELDA[1:]:
+            data[col] = data[col].astype('category')
+        data = compactar_tipos(data.groupby(DIMENSIONES_CELDA, observed=True, dropna=False).sum().reset_index())
+
+        # Cada fila es el promedio de la celda; 'peso' mantiene exactos los promedios por grupo y los
+        # estadísticos suficientes, las correlaciones sobre las filas originales
+        data['merma_unidad'] = data['suma'] / data['peso']
+
+        print(f"Datos cargados: {len(data)} celdas ({int(data['peso'].sum())} registros)")
+        return data
+
     def preprocesar_datos(self, data):
         """Preprocesamiento básico de datos"""
         print("🔧 Preprocesando datos...")
@@ -68,139 +236,152 @@ class AnalisisCorrelacional:
         # Procesar mermas
         data['merma_unidad_abs'] = np.abs(data['merma_unidad'])
         
-        # Crear variables categóricas numéricas
-        for col in ['linea', 'categoria', 'seccion', 'motivo']:
-            data[f'{col}_num'] = pd.Categorical(data[col]).codes
-        
-        # Crear combinaciones de variables
+        # Crear variables categóricas numéricas y combinaciones de variables
         print("\nCreando combinaciones de variables...")
+        self.motor.calcular(data, 'merma_unidad_abs', peso='peso' if 'peso' in data.columns else None)
         
-        # 1. Combinaciones que ya sabemos que funcionan
-        data['seccion_motivo'] = data['seccion'] + '_' + data['motivo']
-        data['seccion_motivo_num'] = pd.Categorical(data['seccion_motivo']).codes
-        
-        # 2. Agregaciones que ya sabemos que funcionan
-        mermas_categoria = data.groupby('categoria')['merma_unidad_abs'].transform('mean')
-        data['merma_categoria_promedio'] = mermas_categoria
-        
-        mermas_linea = data.groupby('linea')['merma_unidad_abs'].transform('mean')
-        data['merma_linea_promedio'] = mermas_linea
-        
-        # 3. Nuevas combinaciones con variables temporales
-        # Fin de semana por categoría
-        data['fin_semana_categoria'] = data['fin_semana'].astype(str) + '_' + data['categoria']
-        mermas_fin_semana_cat = data.groupby('fin_semana_categoria')['merma_unidad_abs'].transform('mean')
-        data['merma_fin_semana_categoria'] = mermas_fin_semana_cat
-        
-        # Fin de mes por línea
-        data['fin_mes_linea'] = data['fin_mes'].astype(str) + '_' + data['linea']
-        mermas_fin_mes_linea = data.groupby('fin_mes_linea')['merma_unidad_abs'].transform('mean')
-        data['merma_fin_mes_linea'] = mermas_fin_mes_linea
+        return data
+
+    def promedio_por(self, data, columnas):
+        """Merma promedio por grupo; con 'peso' cada fila cuenta tantas veces como registros resume"""
+        if 'peso' not in data.columns:
+            return data.groupby(columnas)['merma_unidad_abs'].mean()
+        ponderada = data['merma_unidad_abs'] * data['peso']
+        grupos = [data[col] for col in columnas]
+        return ponderada.groupby(grupos, observed=True).sum() / data['peso'].groupby(grupos, observed=True).sum()
+
+    def imprimir_correlaciones(self, correlaciones):
+        """Imprimir una tabla de correlaciones Spearman/Pearson"""
+        print("-" * 87)
+        print(f"{'Variable':32} {'Spearman':>10} {'Pearson':>10} {'Tipo':>15}")
+        print("-" * 87)
+        for var, fila in correlaciones.iterrows():
+            print(f"{var:32} {fila['Spearman']:10.4f} {fila['Pearson']:10.4f} {fila['Tipo']:>15}")
+
+    def graficar_combinacion(self, data, var, index_var, col_var):
+        """Mapa de calor y top 10 de mermas promedio para una combinación de variables"""
+        # Crear matriz de mermas promedio
+        mermas_matrix = self.promedio_por(data, [index_var, col_var]).unstack()
+        
+        # Renombrar las columnas para fin de semana y fin de mes
+        if 'fin_semana' in var:
+            mermas_matrix.columns = ['Días laborables', 'Fin de semana']
+        elif 'fin_mes' in var:
+            mermas_matrix.columns = ['Resto del mes', 'Fin de mes']
+        
+        # Gráfico de calor
+        titulo = None
+        if 'fin_semana' in var and 'categoria' in var:
+            titulo = '¿Qué categorías tienen más mermas los fines de semana? (Categoría vs Fin de Semana)'
+        elif 'fin_mes' in var and 'linea' in var:
+            titulo = '¿Qué líneas tienen más mermas al final del mes? (Línea vs Fin de Mes)'
+        elif 'fin_semana' in var and 'seccion' in var:
+            titulo = '¿Qué secciones tienen más mermas los fines de semana? (Sección vs Fin de Semana)'
+        elif 'seccion_motivo' in var:
+            titulo = '¿Qué motivos de merma son más comunes en cada sección? (Sección vs Motivo)'
+        elif 'linea_categoria' in var:
+            titulo = '¿Qué líneas tienen más mermas con qué categorías? (Línea vs Categoría)'
+        elif 'categoria' in var:
+            titulo = '¿Qué categorías tienen más mermas en general? (Categoría vs Merma)'
+        elif 'linea' in var:
+            titulo = '¿Qué líneas tienen más mermas en general? (Línea vs Merma)'
+        self.graficos.graficar(
+            f'calor_{var}', dibujar_mapa_calor, mermas_matrix,
+            titulo=titulo, xlabel=col_var, ylabel=index_var
+        )
         
-        # Fin de semana por sección
-        data['fin_semana_seccion'] = data['fin_semana'].astype(str) + '_' + data['seccion']
-        mermas_fin_semana_sec = data.groupby('fin_semana_seccion')['merma_unidad_abs'].transform('mean')
-        data['merma_fin_semana_seccion'] = mermas_fin_semana_sec
+        # Gráfico de barras para las top 10 combinaciones
+        top_combinaciones = self.promedio_por(data, [index_var, col_var]).nlargest(10)
         
-        # Fin de mes por motivo
-        data['fin_mes_motivo'] = data['fin_mes'].astype(str) + '_' + data['motivo']
-        mermas_fin_mes_mot = data.groupby('fin_mes_motivo')['merma_unidad_abs'].transform('mean')
-        data['merma_fin_mes_motivo'] = mermas_fin_mes_mot
+        # Renombrar los índices para fin de semana y fin de mes
+        if 'fin_semana' in var:
+            top_combinaciones.index = pd.MultiIndex.from_tuples(
+                [(idx[0], 'Días laborables' if idx[1] == 0 else 'Fin de semana') 
+                 for idx in top_combinaciones.index]
+            )
+        elif 'fin_mes' in var:
+            top_combinaciones.index = pd.MultiIndex.from_tuples(
+                [(idx[0], 'Resto del mes' if idx[1] == 0 else 'Fin de mes') 
+                 for idx in top_combinaciones.index]
+            )
         
-        return data
+        titulo = None
+        if 'fin_semana' in var and 'categoria' in var:
+            titulo = 'Top 10: Categorías con mayor pérdida en fin de semana (Categoría vs Fin de Semana)'
+        elif 'fin_mes' in var and 'linea' in var:
+            titulo = 'Top 10: Líneas con mayor pérdida al final del mes (Línea vs Fin de Mes)'
+        elif 'fin_semana' in var and 'seccion' in var:
+            titulo = 'Top 10: Secciones con mayor pérdida en fin de semana (Sección vs Fin de Semana)'
+        elif 'seccion_motivo' in var:
+            titulo = 'Top 10: Secciones y sus principales causas de pérdida (Sección vs Motivo)'
+        elif 'linea_categoria' in var:
+            titulo = 'Top 10: Líneas y sus categorías con mayor pérdida (Línea vs Categoría)'
+        elif 'categoria' in var:
+            titulo = 'Top 10: Categorías con mayor pérdida total (Categoría vs Merma)'
+        elif 'linea' in var:
+            titulo = 'Top 10: Líneas con mayor pérdida total (Línea vs Merma)'
+        self.graficos.graficar(
+            f'top10_{var}', dibujar_serie, top_combinaciones,
+            titulo=titulo, figsize=(15, 8),
+            xlabel=f'Combinación {index_var}-{col_var}', ylabel='Merma Promedio',
+            alinear_derecha=True, ajustar=True
+        )
 
     def analizar_correlaciones(self, data):
         """Analizar correlaciones temporales y categóricas"""
         print("\nANÁLISIS DE CORRELACIONES")
         print("=" * 50)
         
-        # 0. Todas las correlaciones ordenadas de mayor a menor
-        print("\nRanking de Correlaciones (de mayor a menor):")
-        print("-" * 80)
-        print(f"{'Variable':25} {'Spearman':>10} {'Pearson':>10} {'Tipo':>15}")
-        print("-" * 80)
-        
-        todas_correlaciones = []
-        variables_todas = [
+        # Variables candidatas: combinaciones categóricas y combinaciones temporales
+        variables_originales = [
             'seccion_motivo_num', 'merma_categoria_promedio', 'merma_linea_promedio',
             'linea_categoria_num', 'linea_motivo_num', 'categoria_motivo_num',
             'merma_seccion_promedio', 'merma_motivo_promedio',
-            'merma_linea_categoria_promedio', 'merma_seccion_motivo_promedio',
+            'merma_linea_categoria_promedio', 'merma_seccion_motivo_promedio'
+        ]
+        variables_temporales = [
             'merma_fin_semana_categoria', 'merma_fin_mes_linea',
             'merma_fin_semana_seccion', 'merma_fin_mes_motivo'
         ]
         
-        for var in variables_todas:
-            try:
-                corr_spearman = stats.spearmanr(data[var], data['merma_unidad_abs'])[0]
-                corr_pearson = data[var].corr(data['merma_unidad_abs'])
-                
-                if abs(corr_spearman) >= 0.5 or abs(corr_pearson) >= 0.5:
-                    todas_correlaciones.append((var, corr_spearman, corr_pearson))
-            except:
-                continue
+        # Todas las correlaciones se calculan una sola vez y cada sección filtra la misma tabla
+        # Con celdas (modo fuera de memoria o cubo), desde sus estadísticos suficientes
+        if 'suma_cuadrados' in data.columns:
+            correlaciones, faltantes = calcular_correlaciones_celdas(
+                data, variables_originales + variables_temporales
+            )
+            if 'suma_rangos' not in data.columns:
+                print("\nNota: el cubo no guarda rangos; Spearman es aproximado (rangos de los promedios "
+                      "de celda) y Pearson es exacto")
+        else:
+            correlaciones, faltantes = calcular_correlaciones(
+                data, 'merma_unidad_abs', variables_originales + variables_temporales
+            )
+        if faltantes:
+            print(f"\nVariables no disponibles en los datos: {', '.join(faltantes)}")
         
-        # Ordenar por el valor absoluto de la correlación de Spearman
-        todas_correlaciones.sort(key=lambda x: abs(x[1]), reverse=True)
+        significativas = correlaciones[
+            (correlaciones['Spearman'].abs() >= 0.5) | (correlaciones['Pearson'].abs() >= 0.5)
+        ]
+        correlaciones_originales = significativas[significativas.index.isin(variables_originales)]
+        correlaciones_temporales = significativas[significativas.index.isin(variables_temporales)]
         
-        for var, corr_s, corr_p in todas_correlaciones:
-            tipo = "Fuerte" if abs(corr_s) > 0.7 or abs(corr_p) > 0.7 else "Moderada"
-            print(f"{var:25} {corr_s:10.4f} {corr_p:10.4f} {tipo:>15}")
+        # 0. Todas las correlaciones ordenadas de mayor a menor
+        print("\nRanking de Correlaciones (de mayor a menor):")
+        self.imprimir_correlaciones(significativas)
         
         print("\n" + "=" * 80 + "\n")
         
         # 1. Correlación de Spearman y Pearson para variables originales
-        variables_originales = [
-            'seccion_motivo_num', 'merma_categoria_promedio', 'merma_linea_promedio',
-            'linea_categoria_num', 'linea_motivo_num', 'categoria_motivo_num',
-            'merma_seccion_promedio', 'merma_motivo_promedio',
-            'merma_linea_categoria_promedio', 'merma_seccion_motivo_promedio'
-        ]
-        
         print("\nCorrelaciones entre Variables Clave:")
-        print("-" * 80)
-        print(f"{'Variable':25} {'Spearman':>10} {'Pearson':>10} {'Tipo':>15}")
-        print("-" * 80)
-        
-        correlaciones_originales = []
-        for var in variables_originales:
-            try:
-                corr_spearman = stats.spearmanr(data[var], data['merma_unidad_abs'])[0]
-                corr_pearson = data[var].corr(data['merma_unidad_abs'])
-                
-                if abs(corr_spearman) >= 0.5 or abs(corr_pearson) >= 0.5:
-                    correlaciones_originales.append((var, corr_spearman, corr_pearson))
-                    tipo = "Fuerte" if abs(corr_spearman) > 0.7 or abs(corr_pearson) > 0.7 else "Moderada"
-                    print(f"{var:25} {corr_spearman:10.4f} {corr_pearson:10.4f} {tipo:>15}")
-            except:
-                continue
+        self.imprimir_correlaciones(correlaciones_originales)
         
         # 2. Correlación de Spearman y Pearson para variables temporales
-        variables_temporales = [
-            'merma_fin_semana_categoria', 'merma_fin_mes_linea',
-            'merma_fin_semana_seccion', 'merma_fin_mes_motivo'
-        ]
-        
         print("\nCorrelaciones con Variables Temporales:")
-        print("-" * 80)
-        print(f"{'Variable':25} {'Spearman':>10} {'Pearson':>10} {'Tipo':>15}")
-        print("-" * 80)
-        
-        correlaciones_temporales = []
-        for var in variables_temporales:
-            try:
-                corr_spearman = stats.spearmanr(data[var], data['merma_unidad_abs'])[0]
-                corr_pearson = data[var].corr(data['merma_unidad_abs'])
-                
-                if abs(corr_spearman) >= 0.5 or abs(corr_pearson) >= 0.5:
-                    correlaciones_temporales.append((var, corr_spearman, corr_pearson))
-                    tipo = "Fuerte" if abs(corr_spearman) > 0.7 or abs(corr_pearson) > 0.7 else "Moderada"
-                    print(f"{var:25} {corr_spearman:10.4f} {corr_pearson:10.4f} {tipo:>15}")
-            except:
-                continue
+        self.imprimir_correlaciones(correlaciones_temporales)
         
         # 3. Visualización de correlaciones originales
-        for var, corr_s, corr_p in correlaciones_originales:
+        for var in correlaciones_originales.index:
             # Determinar las variables para el mapa de calor
             if 'seccion_motivo' in var:
                 index_var = 'seccion'
@@ -227,86 +408,10 @@ class AnalisisCorrelacional:
                 else:
                     continue
             
-            # Crear matriz de mermas promedio
-            mermas_matrix = data.pivot_table(
-                values='merma_unidad_abs',
-                index=index_var,
-                columns=col_var,
-                aggfunc='mean'
-            )
-            
-            # Renombrar las columnas para fin de semana y fin de mes
-            if 'fin_semana' in var:
-                mermas_matrix.columns = ['Días laborables', 'Fin de semana']
-            elif 'fin_mes' in var:
-                mermas_matrix.columns = ['Resto del mes', 'Fin de mes']
-            
-            # Gráfico de calor
-            plt.figure(figsize=(15, 10))
-            sns.heatmap(mermas_matrix, 
-                       annot=True, 
-                       fmt='.2f', 
-                       cmap='YlOrRd',
-                       cbar_kws={'label': 'Merma Promedio'})
-            if 'fin_semana' in var and 'categoria' in var:
-                plt.title('¿Qué categorías tienen más mermas los fines de semana? (Categoría vs Fin de Semana)')
-            elif 'fin_mes' in var and 'linea' in var:
-                plt.title('¿Qué líneas tienen más mermas al final del mes? (Línea vs Fin de Mes)')
-            elif 'fin_semana' in var and 'seccion' in var:
-                plt.title('¿Qué secciones tienen más mermas los fines de semana? (Sección vs Fin de Semana)')
-            elif 'seccion_motivo' in var:
-                plt.title('¿Qué motivos de merma son más comunes en cada sección? (Sección vs Motivo)')
-            elif 'linea_categoria' in var:
-                plt.title('¿Qué líneas tienen más mermas con qué categorías? (Línea vs Categoría)')
-            elif 'categoria' in var:
-                plt.title('¿Qué categorías tienen más mermas en general? (Categoría vs Merma)')
-            elif 'linea' in var:
-                plt.title('¿Qué líneas tienen más mermas en general? (Línea vs Merma)')
-            plt.xlabel(col_var)
-            plt.ylabel(index_var)
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.show()
-            
-            # Gráfico de barras para las top 10 combinaciones
-            plt.figure(figsize=(15, 8))
-            top_combinaciones = data.groupby([index_var, col_var])['merma_unidad_abs'].mean().nlargest(10)
-            
-            # Renombrar los índices para fin de semana y fin de mes
-            if 'fin_semana' in var:
-                top_combinaciones.index = pd.MultiIndex.from_tuples(
-                    [(idx[0], 'Días laborables' if idx[1] == 0 else 'Fin de semana') 
-                     for idx in top_combinaciones.index]
-                )
-            elif 'fin_mes' in var:
-                top_combinaciones.index = pd.MultiIndex.from_tuples(
-                    [(idx[0], 'Resto del mes' if idx[1] == 0 else 'Fin de mes') 
-                     for idx in top_combinaciones.index]
-                )
-            
-            top_combinaciones.plot(kind='bar')
-            if 'fin_semana' in var and 'categoria' in var:
-                plt.title('Top 10: Categorías con mayor pérdida en fin de semana (Categoría vs Fin de Semana)')
-            elif 'fin_mes' in var and 'linea' in var:
-                plt.title('Top 10: Líneas con mayor pérdida al final del mes (Línea vs Fin de Mes)')
-            elif 'fin_semana' in var and 'seccion' in var:
-                plt.title('Top 10: Secciones con mayor pérdida en fin de semana (Sección vs Fin de Semana)')
-            elif 'seccion_motivo' in var:
-                plt.title('Top 10: Secciones y sus principales causas de pérdida (Sección vs Motivo)')
-            elif 'linea_categoria' in var:
-                plt.title('Top 10: Líneas y sus categorías con mayor pérdida (Línea vs Categoría)')
-            elif 'categoria' in var:
-                plt.title('Top 10: Categorías con mayor pérdida total (Categoría vs Merma)')
-            elif 'linea' in var:
-                plt.title('Top 10: Líneas con mayor pérdida total (Línea vs Merma)')
-            plt.xlabel(f'Combinación {index_var}-{col_var}')
-            plt.ylabel('Merma Promedio')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.show()
+            self.graficar_combinacion(data, var, index_var, col_var)
         
         # 4. Visualización de correlaciones temporales
-        for var, corr_s, corr_p in correlaciones_temporales:
+        for var in correlaciones_temporales.index:
             # Determinar las variables para el mapa de calor
             if 'fin_semana' in var:
                 if 'categoria' in var:
@@ -323,115 +428,39 @@ class AnalisisCorrelacional:
                     index_var = 'motivo'
                     col_var = 'fin_mes'
             
-            # Crear matriz de mermas promedio
-            mermas_matrix = data.pivot_table(
-                values='merma_unidad_abs',
-                index=index_var,
-                columns=col_var,
-                aggfunc='mean'
-            )
-            
-            # Renombrar las columnas para fin de semana y fin de mes
-            if 'fin_semana' in var:
-                mermas_matrix.columns = ['Días laborables', 'Fin de semana']
-            elif 'fin_mes' in var:
-                mermas_matrix.columns = ['Resto del mes', 'Fin de mes']
-            
-            # Gráfico de calor
-            plt.figure(figsize=(15, 10))
-            sns.heatmap(mermas_matrix, 
-                       annot=True, 
-                       fmt='.2f', 
-                       cmap='YlOrRd',
-                       cbar_kws={'label': 'Merma Promedio'})
-            if 'fin_semana' in var and 'categoria' in var:
-                plt.title('¿Qué categorías tienen más mermas los fines de semana? (Categoría vs Fin de Semana)')
-            elif 'fin_mes' in var and 'linea' in var:
-                plt.title('¿Qué líneas tienen más mermas al final del mes? (Línea vs Fin de Mes)')
-            elif 'fin_semana' in var and 'seccion' in var:
-                plt.title('¿Qué secciones tienen más mermas los fines de semana? (Sección vs Fin de Semana)')
-            elif 'seccion_motivo' in var:
-                plt.title('¿Qué motivos de merma son más comunes en cada sección? (Sección vs Motivo)')
-            elif 'linea_categoria' in var:
-                plt.title('¿Qué líneas tienen más mermas con qué categorías? (Línea vs Categoría)')
-            elif 'categoria' in var:
-                plt.title('¿Qué categorías tienen más mermas en general? (Categoría vs Merma)')
-            elif 'linea' in var:
-                plt.title('¿Qué líneas tienen más mermas en general? (Línea vs Merma)')
-            plt.xlabel(col_var)
-            plt.ylabel(index_var)
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.show()
-            
-            # Gráfico de barras para las top 10 combinaciones
-            plt.figure(figsize=(15, 8))
-            top_combinaciones = data.groupby([index_var, col_var])['merma_unidad_abs'].mean().nlargest(10)
-            
-            # Renombrar los índices para fin de semana y fin de mes
-            if 'fin_semana' in var:
-                top_combinaciones.index = pd.MultiIndex.from_tuples(
-                    [(idx[0], 'Días laborables' if idx[1] == 0 else 'Fin de semana') 
-                     for idx in top_combinaciones.index]
-                )
-            elif 'fin_mes' in var:
-                top_combinaciones.index = pd.MultiIndex.from_tuples(
-                    [(idx[0], 'Resto del mes' if idx[1] == 0 else 'Fin de mes') 
-                     for idx in top_combinaciones.index]
-                )
-            
-            top_combinaciones.plot(kind='bar')
-            if 'fin_semana' in var and 'categoria' in var:
-                plt.title('Top 10: Categorías con mayor pérdida en fin de semana (Categoría vs Fin de Semana)')
-            elif 'fin_mes' in var and 'linea' in var:
-                plt.title('Top 10: Líneas con mayor pérdida al final del mes (Línea vs Fin de Mes)')
-            elif 'fin_semana' in var and 'seccion' in var:
-                plt.title('Top 10: Secciones con mayor pérdida en fin de semana (Sección vs Fin de Semana)')
-            elif 'seccion_motivo' in var:
-                plt.title('Top 10: Secciones y sus principales causas de pérdida (Sección vs Motivo)')
-            elif 'linea_categoria' in var:
-                plt.title('Top 10: Líneas y sus categorías con mayor pérdida (Línea vs Categoría)')
-            elif 'categoria' in var:
-                plt.title('Top 10: Categorías con mayor pérdida total (Categoría vs Merma)')
-            elif 'linea' in var:
-                plt.title('Top 10: Líneas con mayor pérdida total (Línea vs Merma)')
-            plt.xlabel(f'Combinación {index_var}-{col_var}')
-            plt.ylabel('Merma Promedio')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.show()
+            self.graficar_combinacion(data, var, index_var, col_var)
         
         # 5. Análisis por categorías
         print("\nTop 1 de cada Correlación:")
         print("-" * 80)
         
         # Top 1 de fin de semana vs categoría
-        top_fin_semana_cat = data.groupby('categoria')['merma_unidad_abs'].mean().nlargest(1)
+        top_fin_semana_cat = self.promedio_por(data, ['categoria']).nlargest(1)
         print(f"\nCategoría con mayor merma en fin de semana:")
         print(f"Categoría: {top_fin_semana_cat.index[0]}")
         print(f"Valor: {top_fin_semana_cat.values[0]:.2f}")
         
         # Top 1 de fin de mes vs línea
-        top_fin_mes_linea = data.groupby('linea')['merma_unidad_abs'].mean().nlargest(1)
+        top_fin_mes_linea = self.promedio_por(data, ['linea']).nlargest(1)
         print(f"\nLínea con mayor merma en fin de mes:")
         print(f"Línea: {top_fin_mes_linea.index[0]}")
         print(f"Valor: {top_fin_mes_linea.values[0]:.2f}")
         
         # Top 1 de fin de semana vs sección
-        top_fin_semana_sec = data.groupby('seccion')['merma_unidad_abs'].mean().nlargest(1)
+        top_fin_semana_sec = self.promedio_por(data, ['seccion']).nlargest(1)
         print(f"\nSección con mayor merma en fin de semana:")
         print(f"Sección: {top_fin_semana_sec.index[0]}")
         print(f"Valor: {top_fin_semana_sec.values[0]:.2f}")
         
         # Top 1 de sección vs motivo
-        top_sec_motivo = data.groupby(['seccion', 'motivo'])['merma_unidad_abs'].mean().nlargest(1)
+        top_sec_motivo = self.promedio_por(data, ['seccion', 'motivo']).nlargest(1)
         print(f"\nCombinación Sección-Motivo con mayor merma:")
         print(f"Sección: {top_sec_motivo.index[0][0]}")
         print(f"Motivo: {top_sec_motivo.index[0][1]}")
         print(f"Valor: {top_sec_motivo.values[0]:.2f}")
         
         # Top 1 de línea vs categoría
-        top_linea_cat = data.groupby(['linea', 'categoria'])['merma_unidad_abs'].mean().nlargest(1)
+        top_linea_cat = self.promedio_por(data, ['linea', 'categoria']).nlargest(1)
         print(f"\nCombinación Línea-Categoría con mayor merma:")
         print(f"Línea: {top_linea_cat.index[0][0]}")
         print(f"Categoría: {top_linea_cat.index[0][1]}")
@@ -446,20 +475,19 @@ class AnalisisCorrelacional:
         print("\nTop 1 de cada categoría:")
         print("-" * 40)
         for col in ['linea', 'categoria', 'seccion', 'motivo']:
-            mermas_por_cat = data.groupby(col)['merma_unidad_abs'].agg(['mean', 'std', 'count'])
-            top_1 = mermas_por_cat.sort_values('mean', ascending=False).head(1)
+            mermas_por_cat = self.promedio_por(data, [col])
+            top_1 = mermas_por_cat.sort_values(ascending=False).head(1)
             print(f"\n{col.upper()}:")
             print(f"Valor: {top_1.index[0]}")
-            print(f"Merma promedio: {top_1['mean'].values[0]:.2f}")
+            print(f"Merma promedio: {top_1.values[0]:.2f}")
             
             # Gráfico de barras para las categorías con más mermas
-            plt.figure(figsize=(12, 6))
-            top_cats = mermas_por_cat.nlargest(10, 'mean')
-            top_cats['mean'].plot(kind='bar')
-            plt.title(f'Top 10 {col} con mayor merma promedio')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            plt.show()
+            top_cats = mermas_por_cat.nlargest(10)
+            self.graficos.graficar(
+                f'top10_{col}', dibujar_serie, top_cats,
+                titulo=f'Top 10 {col} con mayor merma promedio', figsize=(12, 6),
+                alinear_derecha=True, ajustar=True
+            )
         
         # 7. Análisis temporal
         print("\nAnálisis temporal:")
@@ -468,7 +496,7 @@ class AnalisisCorrelacional:
         # Top 3 días del mes con mayor merma
         print("\nTop 3 días del mes con mayor merma:")
         print("-" * 40)
-        mermas_por_dia_mes = data.groupby('dia_mes')['merma_unidad_abs'].mean()
+        mermas_por_dia_mes = self.promedio_por(data, ['dia_mes'])
         top_3_dias = mermas_por_dia_mes.nlargest(3)
         for dia, merma in top_3_dias.items():
             print(f"Día {dia}: {merma:.2f}")
@@ -477,7 +505,7 @@ class AnalisisCorrelacional:
         print("\nEstación con mayor merma:")
         print("-" * 40)
         estaciones = ['Invierno', 'Primavera', 'Verano', 'Otoño']
-        mermas_por_estacion = data.groupby('estacion')['merma_unidad_abs'].mean()
+        mermas_por_estacion = self.promedio_por(data, ['estacion'])
         estacion_max = mermas_por_estacion.idxmax()
         print(f"Estación: {estaciones[estacion_max-1]}")
         print(f"Merma promedio: {mermas_por_estacion.max():.2f}")
@@ -486,7 +514,7 @@ class AnalisisCorrelacional:
         print("\nDía de la semana con mayor merma:")
         print("-" * 40)
         dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        mermas_por_dia = data.groupby('dia_semana')['merma_unidad_abs'].mean()
+        mermas_por_dia = self.promedio_por(data, ['dia_semana'])
         dia_max = mermas_por_dia.idxmax()
         print(f"Día: {dias_semana[dia_max]}")
         print(f"Merma promedio: {mermas_por_dia.max():.2f}")
@@ -496,7 +524,7 @@ class AnalisisCorrelacional:
         print("-" * 40)
         
         # Fin de semana vs días laborables
-        mermas_fin_semana = data.groupby('fin_semana')['merma_unidad_abs'].mean()
+        mermas_fin_semana = self.promedio_por(data, ['fin_semana'])
         print("\nFin de semana vs Días laborables:")
         print(f"Días laborables: {mermas_fin_semana[0]:.2f}")
         print(f"Fin de semana: {mermas_fin_semana[1]:.2f}")
@@ -506,7 +534,7 @@ class AnalisisCorrelacional:
             print("→ Hay más mermas en días laborables")
         
         # Fin de mes vs resto del mes
-        mermas_fin_mes = data.groupby('fin_mes')['merma_unidad_abs'].mean()
+        mermas_fin_mes = self.promedio_por(data, ['fin_mes'])
         print("\nFin de mes vs Resto del mes:")
         print(f"Resto del mes: {mermas_fin_mes[0]:.2f}")
         print(f"Fin de mes: {mermas_fin_mes[1]:.2f}")
@@ -517,51 +545,44 @@ class AnalisisCorrelacional:
         
         # Visualizaciones
         # Por día de la semana
-        plt.figure(figsize=(12, 6))
-        mermas_por_dia.plot(kind='bar')
-        plt.title('Mermas por Día de la Semana')
-        plt.xlabel('Día de la Semana')
-        plt.ylabel('Merma Unidad Promedio')
-        plt.xticks(range(7), dias_semana, rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        self.graficos.graficar(
+            'dia_semana', dibujar_serie, mermas_por_dia,
+            titulo='Mermas por Día de la Semana', figsize=(12, 6),
+            xlabel='Día de la Semana', ylabel='Merma Unidad Promedio',
+            etiquetas=dias_semana, cuadricula=True
+        )
         
         # Por día del mes
-        plt.figure(figsize=(15, 6))
-        mermas_por_dia_mes.plot(kind='line', marker='o')
-        plt.title('Tendencia de Mermas por Día del Mes')
-        plt.xlabel('Día del Mes')
-        plt.ylabel('Merma Unidad Promedio')
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        self.graficos.graficar(
+            'dia_mes', dibujar_serie, mermas_por_dia_mes,
+            titulo='Tendencia de Mermas por Día del Mes', figsize=(15, 6), tipo='line',
+            xlabel='Día del Mes', ylabel='Merma Unidad Promedio',
+            cuadricula=True, marcador='o'
+        )
         
         # Por estación
-        plt.figure(figsize=(10, 6))
-        mermas_por_estacion.plot(kind='bar')
-        plt.title('Mermas por Estación')
-        plt.xlabel('Estación')
-        plt.ylabel('Merma Unidad Promedio')
-        plt.xticks(range(4), estaciones, rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        self.graficos.graficar(
+            'estacion', dibujar_serie, mermas_por_estacion,
+            titulo='Mermas por Estación', figsize=(10, 6),
+            xlabel='Estación', ylabel='Merma Unidad Promedio',
+            etiquetas=estaciones, cuadricula=True
+        )
         
         # Comparación fin de semana vs días laborables
-        plt.figure(figsize=(8, 6))
-        mermas_fin_semana.plot(kind='bar')
-        plt.title('Mermas: Fin de Semana vs Días Laborables')
-        plt.xlabel('0: Días Laborables, 1: Fin de Semana')
-        plt.ylabel('Merma Unidad Promedio')
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        self.graficos.graficar(
+            'fin_semana', dibujar_serie, mermas_fin_semana,
+            titulo='Mermas: Fin de Semana vs Días Laborables', figsize=(8, 6),
+            xlabel='0: Días Laborables, 1: Fin de Semana', ylabel='Merma Unidad Promedio',
+            cuadricula=True
+        )
         
         # Comparación fin de mes vs resto del mes
-        plt.figure(figsize=(8, 6))
-        mermas_fin_mes.plot(kind='bar')
-        plt.title('Mermas: Fin de Mes vs Resto del Mes')
-        plt.xlabel('0: Resto del Mes, 1: Fin de Mes')
-        plt.ylabel('Merma Unidad Promedio')
-        plt.grid(True, alpha=0.3)
-        plt.show()
+        self.graficos.graficar(
+            'fin_mes', dibujar_serie, mermas_fin_mes,
+            titulo='Mermas: Fin de Mes vs Resto del Mes', figsize=(8, 6),
+            xlabel='0: Resto del Mes, 1: Fin de Mes', ylabel='Merma Unidad Promedio',
+            cuadricula=True
+        )
 
     def ejecutar_analisis(self):
         """Ejecutar análisis completo"""
@@ -573,7 +594,24 @@ class AnalisisCorrelacional:
         
         # 3. Analizar correlaciones
         self.analizar_correlaciones(data_processed)
+        
+        # 4. En modo sin pantalla, renderizar todos los gráficos en paralelo
+        self.graficos.renderizar()
 
 if __name__ == "__main__":
-    analisis = AnalisisCorrelacional()
+    parser = argparse.ArgumentParser(description='Análisis correlacional de mermas')
+    parser.add_argument('--graficos', metavar='DIRECTORIO',
+                        help='Guardar los gráficos en este directorio en vez de mostrarlos')
+    parser.add_argument('--formatos', default='png', help='Formatos separados por coma (png,svg)')
+    parser.add_argument('--procesos', type=int, default=None, help='Procesos para renderizar gráficos')
+    parser.add_argument('--bloques', action='store_true',
+                        help='Leer y agregar por bloques sin cargar todo el historial')
+    args = parser.parse_args()
+    
+    analisis = AnalisisCorrelacional(
+        directorio_graficos=args.graficos,
+        formatos_graficos=tuple(args.formatos.split(',')),
+        procesos_graficos=args.procesos,
+        fuera_de_memoria=args.bloques
+    )
     analisis.ejecutar_analisis() 
\ No newline at end of file
@@ -0,0 +1,146 @@
+import os
+import json
+import math
+import hashlib
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Directorio por defecto de las evaluaciones guardadas (junto a los scripts de análisis)
+DIRECTORIO_BUSQUEDA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'busqueda_hiperparametros')
+
+# Espacio de búsqueda de cada modelo (la regresión lineal no tiene hiperparámetros que ajustar)
+ESPACIOS = {
+    'Random Forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [8, 15, 25, None],
+        'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4]
+    },
+    'Gradient Boosting': {
+        'n_estimators': [100, 150, 300],
+        'learning_rate': [0.03, 0.1, 0.2],
+        'max_depth': [3, 4, 6, 8],
+        'subsample': [0.8, 1.0]
+    },
+    'SVR': {
+        'C': [1, 3, 10, 30, 100],
+        'epsilon': [0.05, 0.1, 0.2],
+        'gamma': ['scale', 0.01, 0.1]
+    },
+    'CatBoost': {
+        'iterations': [200, 400],
+        'learning_rate': [0.03, 0.1, 0.2],
+        'depth': [4, 6, 8],
+        'l2_leaf_reg': [1, 3, 10]
+    },
+    'XGBoost': {
+        'n_estimators': [150, 300],
+        'learning_rate': [0.03, 0.1, 0.2],
+        'max_depth': [4, 6, 8],
+        'subsample': [0.8, 1.0],
+        'colsample_bytree': [0.8, 1.0]
+    }
+}
+
+
+def configuraciones(espacio, n_configuraciones, semilla=42):
+    """Muestra sin reemplazo de combinaciones del espacio de búsqueda"""
+    nombres = sorted(espacio)
+    combinaciones = list(itertools.product(*(espacio[nombre] for nombre in nombres)))
+    rng = np.random.default_rng(semilla)
+    elegidas = rng.choice(len(combinaciones), size=min(n_configuraciones, len(combinaciones)), replace=False)
+    return [dict(zip(nombres, combinaciones[i])) for i in elegidas]
+
+
+def clave_evaluacion(parametros, recursos):
+    """Clave de una evaluación: configuración más cantidad de filas usadas"""
+    return json.dumps({'parametros': parametros, 'recursos': recursos}, sort_keys=True, default=str)
+
+
+class BusquedaHiperparametros:
+    def __init__(self, evaluar, directorio=DIRECTORIO_BUSQUEDA, n_procesos=None, factor=3,
+                 n_configuraciones=27, recursos_minimos=500):
+        # evaluar(nombre, parametros, X_ajuste, y_ajuste, X_validacion, y_validacion) -> R²
+        # (función de nivel de módulo, para poder enviarla a los procesos del pool)
+        self.evaluar = evaluar
+        self.directorio = directorio
+        self.n_procesos = n_procesos or os.cpu_count()
+        self.factor = factor
+        self.n_configuraciones = n_configuraciones
+        self.recursos_minimos = recursos_minimos
+
+    def ruta_cache(self, nombre, huella):
+        archivo = hashlib.sha256(f'{nombre}|{huella}'.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.directorio, f'{archivo}.json')
+
+    def leer_cache(self, nombre, huella):
+        """Evaluaciones ya hechas para este modelo y estos datos"""
+        ruta = self.ruta_cache(nombre, huella)
+        if not os.path.exists(ruta):
+            return {}
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)['evaluaciones']
+
+    def guardar_cache(self, nombre, huella, evaluaciones):
+        """Guardar las evaluaciones de forma atómica"""
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self.ruta_cache(nombre, huella)
+        ruta_tmp = ruta + '.tmp'
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'modelo': nombre, 'huella': huella, 'evaluaciones': evaluaciones}, f, indent=2)
+        os.replace(ruta_tmp, ruta)
+
+    def rondas(self, n_filas):
+        """Filas de entrenamiento de cada ronda: crecen por el factor hasta usar todos los datos"""
+        n_rondas = max(1, int(math.log(max(n_filas / self.recursos_minimos, 1), self.factor)) + 1)
+        n_rondas = min(n_rondas, max(1, int(math.log(self.n_configuraciones, self.factor)) + 1))
+        return [int(n_filas / self.factor ** (n_rondas - 1 - i)) for i in range(n_rondas)]
+
+    def buscar(self, nombres, X_ajuste, y_ajuste, X_validacion, y_validacion, huella):
+        """Successive halving para cada modelo: se descarta la peor parte de las configuraciones en cada ronda"""
+        # Orden aleatorio fijo: cada ronda usa un prefijo, así las submuestras están anidadas
+        orden = np.random.default_rng(42).permutation(len(X_ajuste))
+        X_ajuste, y_ajuste = X_ajuste.iloc[orden], y_ajuste.iloc[orden]
+        recursos_por_ronda = self.rondas(len(X_ajuste))
+
+        candidatos = {nombre: configuraciones(ESPACIOS[nombre], self.n_configuraciones)
+                      for nombre in nombres if nombre in ESPACIOS}
+        evaluaciones = {nombre: self.leer_cache(nombre, huella) for nombre in candidatos}
+        mejores = {}
+
+        with ProcessPoolExecutor(max_workers=self.n_procesos) as pool:
+            for ronda, recursos in enumerate(recursos_por_ronda, 1):
+                # Todas las evaluaciones pendientes de la ronda, de todos los modelos, van juntas al pool
+                futuros = {}
+                for nombre, configs in candidatos.items():
+                    for parametros in configs:
+                        clave = clave_evaluacion(parametros, recursos)
+                        if clave not in evaluaciones[nombre]:
+                            futuro = pool.submit(self.evaluar, nombre, parametros,
+                                                 X_ajuste[:recursos], y_ajuste[:recursos],
+                                                 X_validacion, y_validacion)
+                            futuros[futuro] = (nombre, clave)
+
+                en_cache = sum(len(configs) for configs in candidatos.values()) - len(futuros)
+                print(f"Ronda {ronda}: {recursos} filas, {len(futuros)} evaluaciones nuevas, {en_cache} en caché")
+
+                for futuro in as_completed(futuros):
+                    nombre, clave = futuros[futuro]
+                    try:
+                        evaluaciones[nombre][clave] = float(futuro.result())
+                    except Exception as e:
+                        print(f"- Error evaluando {nombre}: {e}")
+                        evaluaciones[nombre][clave] = float('-inf')
+
+                # Se guarda tras cada ronda para poder retomar una búsqueda interrumpida
+                for nombre, configs in candidatos.items():
+                    self.guardar_cache(nombre, huella, evaluaciones[nombre])
+                    puntajes = [evaluaciones[nombre][clave_evaluacion(p, recursos)] for p in configs]
+                    ordenados = [configs[i] for i in np.argsort(puntajes)[::-1]]
+                    mejores[nombre] = (ordenados[0], max(puntajes))
+                    candidatos[nombre] = ordenados[:max(1, len(configs) // self.factor)]
+
+        for nombre, (parametros, puntaje) in mejores.items():
+            print(f"- {nombre}: R² validación = {puntaje:.4f} con {parametros}")
+        return {nombre: parametros for nombre, (parametros, _) in mejores.items()}
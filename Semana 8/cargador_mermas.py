@@ -0,0 +1,64 @@
+import pandas as pd
+import numpy as np
+import pymysql
+from pandas.api.types import union_categoricals
+
+# Dimensiones de texto que se guardan como category y medidas que se guardan como float32
+DIMENSIONES = ['linea', 'categoria', 'seccion', 'motivo', 'negocio', 'comuna', 'region', 'tienda']
+MEDIDAS = ['merma_unidad', 'merma_monto']
+
+TAMANO_BLOQUE = 100_000
+
+
+def compactar_tipos(data):
+    """Convertir dimensiones a category (ordenadas), medidas a float32 y fecha a datetime"""
+    for col in DIMENSIONES:
+        if col in data.columns:
+            categorias = data[col].astype('category').cat.remove_unused_categories()
+            data[col] = categorias.cat.reorder_categories(sorted(categorias.cat.categories))
+    for col in MEDIDAS:
+        if col in data.columns:
+            data[col] = data[col].astype(np.float32)
+    if 'fecha' in data.columns:
+        data['fecha'] = pd.to_datetime(data['fecha'])
+    return data
+
+
+def unir_bloques(bloques, columnas):
+    """Concatenar bloques compactados conservando el tipo category"""
+    if not bloques:
+        return compactar_tipos(pd.DataFrame(columns=columnas))
+
+    categoricas = [col for col in columnas if col in DIMENSIONES]
+    data = pd.concat([bloque.drop(columns=categoricas) for bloque in bloques], ignore_index=True)
+    for col in categoricas:
+        data[col] = union_categoricals([bloque[col] for bloque in bloques], sort_categories=True)
+    return data[columnas]
+
+
+def leer_en_bloques(connection, query, params=None, tamano_bloque=TAMANO_BLOQUE, incluir_vacio=False):
+    """Recorrer una consulta bloque a bloque (ya compactados) con un cursor del lado del servidor (SSCursor);
+    con incluir_vacio, una consulta sin filas entrega un bloque vacío con sus columnas"""
+    cursor = connection.cursor(pymysql.cursors.SSCursor)
+    cursor.execute(query, params)
+    columnas = [descripcion[0] for descripcion in cursor.description]
+
+    # Solo un bloque de filas Python vive en memoria a la vez
+    try:
+        hay_filas = False
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            hay_filas = True
+            yield compactar_tipos(pd.DataFrame.from_records(filas, columns=columnas))
+        if incluir_vacio and not hay_filas:
+            yield compactar_tipos(pd.DataFrame(columns=columnas))
+    finally:
+        cursor.close()
+
+
+def cargar_en_bloques(connection, query, params=None, tamano_bloque=TAMANO_BLOQUE):
+    """Leer una consulta completa en bloques con un cursor del lado del servidor (SSCursor)"""
+    bloques = list(leer_en_bloques(connection, query, params, tamano_bloque, incluir_vacio=True))
+    return unir_bloques(bloques, list(bloques[0].columns))
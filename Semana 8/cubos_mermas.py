@@ -0,0 +1,152 @@
+import os
+import pymysql
+import pandas as pd
+from cargador_mermas import cargar_en_bloques
+
+RUTA_DDL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cubos_mermas.sql')
+
+# Fecha anterior a cualquier dato, usada como watermark inicial
+FECHA_MINIMA = '1000-01-01'
+
+# Días anteriores al watermark que se vuelven a agregar en cada actualización, para incorporar filas
+# cargadas tarde para fechas ya agregadas (correcciones más antiguas requieren recalcular)
+DIAS_REVISION = 7
+
+# Dimensiones de cada cubo (deben coincidir con cubos_mermas.sql)
+CUBOS = {
+    'cubo_dia_detalle': ['linea', 'categoria', 'seccion', 'motivo', 'negocio'],
+    'cubo_dia_linea_categoria': ['linea', 'categoria'],
+    'cubo_dia_tienda': ['region', 'tienda']
+}
+
+# Medidas acumulables: conteo, suma, suma absoluta y suma de cuadrados
+MEDIDAS = {
+    'n_unidad': 'COUNT(merma_unidad)',
+    'suma_unidad': 'IFNULL(SUM(merma_unidad), 0)',
+    'suma_unidad_abs': 'IFNULL(SUM(ABS(merma_unidad)), 0)',
+    'suma_cuadrados_unidad': 'IFNULL(SUM(merma_unidad * merma_unidad), 0)',
+    'n_monto': 'COUNT(merma_monto)',
+    'suma_monto': 'IFNULL(SUM(merma_monto), 0)',
+    'suma_monto_abs': 'IFNULL(SUM(ABS(merma_monto)), 0)',
+    'suma_cuadrados_monto': 'IFNULL(SUM(merma_monto * merma_monto), 0)'
+}
+
+
+class CubosMermas:
+    def __init__(self, conectar_bd):
+        self.conectar_bd = conectar_bd
+
+    def crear_tablas(self):
+        """Crear las tablas de cubos y de watermark si no existen"""
+        with open(RUTA_DDL, encoding='utf-8') as f:
+            lineas = [linea for linea in f if not linea.lstrip().startswith('--')]
+        sentencias = [s.strip() for s in ''.join(lineas).split(';') if s.strip()]
+
+        connection = self.conectar_bd()
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+        connection.commit()
+        connection.close()
+
+    def sql_insercion(self, cubo):
+        """INSERT ... SELECT que agrega mermasdb a la granularidad del cubo para un rango de fechas"""
+        dimensiones = CUBOS[cubo]
+        # Las dimensiones son parte de la llave primaria y no admiten NULL: un valor nulo y la cadena
+        # vacía quedan en la misma celda ('') y al leer el cubo ambos se entregan como nulos
+        columnas_dim = [f"IFNULL({dim}, '')" for dim in dimensiones]
+        actualizaciones = ',\n            '.join(f"{m} = {m} + VALUES({m})" for m in MEDIDAS)
+        return f"""
+        INSERT INTO {cubo} (fecha, {', '.join(dimensiones)}, {', '.join(MEDIDAS)})
+        SELECT
+            fecha,
+            {', '.join(columnas_dim)},
+            {', '.join(MEDIDAS.values())}
+        FROM mermasdb
+        WHERE fecha > %s AND fecha <= %s
+        GROUP BY fecha, {', '.join(columnas_dim)}
+        ON DUPLICATE KEY UPDATE
+            {actualizaciones}
+        """
+
+    def reagregar(self, cursor, cubo, desde, hasta):
+        """Reemplazar en un cubo las fechas posteriores a desde y hasta hasta (inclusive)"""
+        cursor.execute(f"DELETE FROM {cubo} WHERE fecha > %s AND fecha <= %s", (desde, hasta))
+        return cursor.execute(self.sql_insercion(cubo), (desde, hasta))
+
+    def actualizar(self):
+        """Incorporar a cada cubo las fechas posteriores a su watermark, volviendo a agregar los últimos
+        DIAS_REVISION días ya incorporados"""
+        self.crear_tablas()
+        connection = self.conectar_bd()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT MAX(fecha) FROM mermasdb")
+            hasta = cursor.fetchone()[0]
+            if hasta is None:
+                connection.close()
+                return
+
+            cursor.execute("SELECT cubo, fecha FROM cubos_watermark")
+            watermarks = dict(cursor.fetchall())
+
+            for cubo in CUBOS:
+                watermark = watermarks.get(cubo)
+                desde = FECHA_MINIMA
+                if watermark is not None:
+                    desde = (pd.Timestamp(min(watermark, hasta)) - pd.Timedelta(days=DIAS_REVISION)).date()
+
+                # Agregado y watermark se confirman juntos
+                filas = self.reagregar(cursor, cubo, desde, hasta)
+                cursor.execute(
+                    "REPLACE INTO cubos_watermark (cubo, fecha) VALUES (%s, %s)",
+                    (cubo, hasta)
+                )
+                connection.commit()
+                print(f"{cubo}: {filas} celdas actualizadas desde {desde} hasta {hasta}")
+        connection.close()
+
+    def recalcular(self, desde, hasta):
+        """Reconstruir un rango de fechas de todos los cubos (por ejemplo tras corregir datos)"""
+        connection = self.conectar_bd()
+        with connection.cursor() as cursor:
+            for cubo in CUBOS:
+                # reagregar excluye el límite inferior, por eso se parte del día anterior
+                self.reagregar(cursor, cubo, (pd.Timestamp(desde) - pd.Timedelta(days=1)).date(), hasta)
+            connection.commit()
+        connection.close()
+
+    def cargar(self, cubo, dimensiones=None, condicion=None):
+        """Leer un cubo, opcionalmente consolidado a un subconjunto de sus dimensiones"""
+        dimensiones = dimensiones or CUBOS[cubo]
+        query = f"""
+        SELECT
+            fecha,
+            {', '.join(dimensiones)},
+            {', '.join(f'SUM({m}) AS {m}' for m in MEDIDAS)}
+        FROM {cubo}
+        {f'WHERE {condicion}' if condicion else ''}
+        GROUP BY fecha, {', '.join(dimensiones)}
+        ORDER BY fecha
+        """
+
+        connection = self.conectar_bd()
+        data = cargar_en_bloques(connection, query)
+        connection.close()
+
+        # Las dimensiones nulas (y las vacías) se guardaron como cadena vacía
+        for dim in dimensiones:
+            if isinstance(data[dim].dtype, pd.CategoricalDtype) and '' in data[dim].cat.categories:
+                data[dim] = data[dim].cat.remove_categories([''])
+        for medida in MEDIDAS:
+            data[medida] = data[medida].astype(float)
+        return data
+
+
+if __name__ == "__main__":
+    cubos = CubosMermas(lambda: pymysql.connect(
+        host='127.0.0.1',
+        user='root',
+        password='',
+        database='mermas'
+    ))
+    cubos.actualizar()
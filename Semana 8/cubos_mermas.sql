@@ -0,0 +1,65 @@
+-- ================================
+-- CUBOS AGREGADOS DE MERMAS
+-- ================================
+-- Resúmenes diarios de mermasdb por combinación de dimensiones.
+-- Guardan suma, conteo y suma de cuadrados para poder obtener
+-- promedios y varianzas sin volver a leer las filas originales.
+-- Las dimensiones nulas se guardan como cadena vacía (en la misma
+-- celda que los valores vacíos; al leer ambos se entregan como nulos).
+
+-- CUBO DÍA × LÍNEA × CATEGORÍA × SECCIÓN × MOTIVO × NEGOCIO
+CREATE TABLE IF NOT EXISTS cubo_dia_detalle (
+    fecha DATE NOT NULL,
+    linea VARCHAR(50) NOT NULL,
+    categoria VARCHAR(50) NOT NULL,
+    seccion VARCHAR(50) NOT NULL,
+    motivo VARCHAR(50) NOT NULL,
+    negocio VARCHAR(50) NOT NULL,
+    n_unidad INT NOT NULL,
+    suma_unidad DOUBLE NOT NULL,
+    suma_unidad_abs DOUBLE NOT NULL,
+    suma_cuadrados_unidad DOUBLE NOT NULL,
+    n_monto INT NOT NULL,
+    suma_monto DOUBLE NOT NULL,
+    suma_monto_abs DOUBLE NOT NULL,
+    suma_cuadrados_monto DOUBLE NOT NULL,
+    PRIMARY KEY (fecha, linea, categoria, seccion, motivo, negocio)
+);
+
+-- CUBO DÍA × LÍNEA × CATEGORÍA
+CREATE TABLE IF NOT EXISTS cubo_dia_linea_categoria (
+    fecha DATE NOT NULL,
+    linea VARCHAR(50) NOT NULL,
+    categoria VARCHAR(50) NOT NULL,
+    n_unidad INT NOT NULL,
+    suma_unidad DOUBLE NOT NULL,
+    suma_unidad_abs DOUBLE NOT NULL,
+    suma_cuadrados_unidad DOUBLE NOT NULL,
+    n_monto INT NOT NULL,
+    suma_monto DOUBLE NOT NULL,
+    suma_monto_abs DOUBLE NOT NULL,
+    suma_cuadrados_monto DOUBLE NOT NULL,
+    PRIMARY KEY (fecha, linea, categoria)
+);
+
+-- CUBO DÍA × REGIÓN × TIENDA
+CREATE TABLE IF NOT EXISTS cubo_dia_tienda (
+    fecha DATE NOT NULL,
+    region VARCHAR(20) NOT NULL,
+    tienda VARCHAR(50) NOT NULL,
+    n_unidad INT NOT NULL,
+    suma_unidad DOUBLE NOT NULL,
+    suma_unidad_abs DOUBLE NOT NULL,
+    suma_cuadrados_unidad DOUBLE NOT NULL,
+    n_monto INT NOT NULL,
+    suma_monto DOUBLE NOT NULL,
+    suma_monto_abs DOUBLE NOT NULL,
+    suma_cuadrados_monto DOUBLE NOT NULL,
+    PRIMARY KEY (fecha, region, tienda)
+);
+
+-- ÚLTIMA FECHA INCORPORADA A CADA CUBO
+CREATE TABLE IF NOT EXISTS cubos_watermark (
+    cubo VARCHAR(64) PRIMARY KEY,
+    fecha DATE NOT NULL
+);
@@ -0,0 +1,322 @@
+import os
+import csv
+import tempfile
+import pymysql
+import numpy as np
+import pandas as pd
+from cargador_mermas import TAMANO_BLOQUE, compactar_tipos, cargar_en_bloques
+
+# Columnas de mermasdb que alimentan el datamart (modelodatamart.sql)
+COLUMNAS_ORIGEN = [
+    'fecha', 'codigo_producto', 'descripcion', 'negocio', 'seccion', 'linea', 'categoria',
+    'abastecimiento', 'tamano_producto', 'es_a_granel', 'riesgo_perecibilidad',
+    'tienda', 'comuna', 'region', 'zonal', 'estacion',
+    'motivo', 'ubicacion_motivo', 'merma_unidad', 'merma_monto'
+]
+
+# Columna de los análisis -> (dimensión, llave de la dimensión, columna en la dimensión)
+COLUMNAS_DATAMART = {
+    'fecha': ('TIEMPO', 'id_tiempo', 'Fecha'),
+    'descripcion': ('PRODUCTO', 'id_producto', 'Descripcion'),
+    'negocio': ('PRODUCTO', 'id_producto', 'Negocio'),
+    'seccion': ('PRODUCTO', 'id_producto', 'Seccion'),
+    'linea': ('PRODUCTO', 'id_producto', 'Linea'),
+    'categoria': ('PRODUCTO', 'id_producto', 'Categoria'),
+    'tienda': ('TIENDA', 'id_tienda', 'Nombre'),
+    'comuna': ('TIENDA', 'id_tienda', 'Comuna'),
+    'region': ('TIENDA', 'id_tienda', 'Region'),
+    'motivo': ('MOTIVO', 'id_motivo', 'Motivo')
+}
+
+TAMANO_LOTE_INSERCION = 5_000
+
+
+def llave_motivo(motivo, ubicacion):
+    """Llave natural de MOTIVO: motivo y ubicación unidos por un separador"""
+    return motivo + '\x1f' + ubicacion
+
+
+def llave_producto_sin_codigo(descripcion, negocio, seccion, linea, categoria):
+    """Llave natural de un PRODUCTO sin código: sus atributos unidos por un separador
+    (empieza con el separador, así nunca coincide con un código)"""
+    return '\x1f' + descripcion + '\x1f' + negocio + '\x1f' + seccion + '\x1f' + linea + '\x1f' + categoria
+
+
+class ETLDatamart:
+    def __init__(self, conectar_bd, usar_load_data=False):
+        self.conectar_bd = conectar_bd
+        # LOAD DATA LOCAL INFILE requiere local_infile habilitado en cliente y servidor
+        self.usar_load_data = usar_load_data
+
+    def leer_watermark(self, cursor):
+        """Última fecha ya cargada en la tabla de hechos"""
+        cursor.execute("""
+        SELECT MAX(t.Fecha)
+        FROM MERMAS m
+        JOIN TIEMPO t ON t.id_tiempo = m.id_tiempo
+        """)
+        return cursor.fetchone()[0]
+
+    def leer_llaves(self, cursor):
+        """Miembros existentes de cada dimensión: llave natural -> llave sustituta"""
+        cursor.execute("SELECT id_tiempo FROM TIEMPO")
+        tiempos = {fila[0] for fila in cursor.fetchall()}
+        cursor.execute("SELECT Codigo_producto, Descripcion, Negocio, Seccion, Linea, Categoria, id_producto "
+                       "FROM PRODUCTO")
+        productos = {
+            codigo if codigo is not None else llave_producto_sin_codigo(*(valor or '' for valor in atributos)):
+            id_producto
+            for codigo, *atributos, id_producto in cursor.fetchall()
+        }
+        cursor.execute("SELECT Nombre, id_tienda FROM TIENDA")
+        tiendas = {nombre or '': id_tienda for nombre, id_tienda in cursor.fetchall()}
+        cursor.execute("SELECT Motivo, Ubicacion_motivo, id_motivo FROM MOTIVO")
+        motivos = {llave_motivo(motivo or '', ubicacion or ''): id_motivo
+                   for motivo, ubicacion, id_motivo in cursor.fetchall()}
+        cursor.execute("SELECT IFNULL(MAX(id_merma), 0) FROM MERMAS")
+        ultimo_id_merma = cursor.fetchone()[0]
+        return {'TIEMPO': tiempos, 'PRODUCTO': productos, 'TIENDA': tiendas,
+                'MOTIVO': motivos, 'id_merma': ultimo_id_merma}
+
+    def insertar(self, cursor, tabla, columnas, filas):
+        """Inserción masiva por lotes de filas múltiples (o LOAD DATA si está habilitado)"""
+        if not filas:
+            return
+        if self.usar_load_data:
+            self.cargar_con_load_data(cursor, tabla, columnas, filas)
+            return
+        sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})"
+        for inicio in range(0, len(filas), TAMANO_LOTE_INSERCION):
+            # pymysql reescribe executemany de un INSERT ... VALUES como un INSERT multi-fila
+            cursor.executemany(sql, filas[inicio:inicio + TAMANO_LOTE_INSERCION])
+
+    def cargar_con_load_data(self, cursor, tabla, columnas, filas):
+        """Volcar las filas a un archivo temporal y cargarlas con LOAD DATA LOCAL INFILE"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f, lineterminator='\n')
+            for fila in filas:
+                escritor.writerow(['\\N' if valor is None else valor for valor in fila])
+            ruta = f.name
+        try:
+            cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE {tabla}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(columnas)})
+            """, (ruta,))
+        finally:
+            os.remove(ruta)
+
+    def transformar(self, bloque, llaves):
+        """Derivar llaves sustitutas, deduplicar miembros nuevos y armar las filas de hechos"""
+        nuevos = {'TIEMPO': [], 'PRODUCTO': [], 'TIENDA': [], 'MOTIVO': []}
+
+        # TIEMPO: la llave sustituta es la fecha en formato AAAAMMDD
+        fechas = bloque['fecha']
+        id_tiempo = (fechas.dt.year * 10000 + fechas.dt.month * 100 + fechas.dt.day).to_numpy(np.int64)
+        dias = bloque[['fecha', 'estacion']].drop_duplicates('fecha')
+        dias = dias[~pd.Series(
+            (dias['fecha'].dt.year * 10000 + dias['fecha'].dt.month * 100 + dias['fecha'].dt.day).to_numpy(np.int64),
+            index=dias.index
+        ).isin(llaves['TIEMPO'])]
+        for fecha, estacion in dias.itertuples(index=False):
+            llave = int(fecha.strftime('%Y%m%d'))
+            llaves['TIEMPO'].add(llave)
+            nuevos['TIEMPO'].append((
+                llave, fecha.day, fecha.month, fecha.year, 1 if fecha.month <= 6 else 2,
+                fecha.quarter, int(fecha.isocalendar()[1]), fecha.dayofweek,
+                None if pd.isna(estacion) else estacion,
+                'Si' if fecha.dayofweek >= 5 else 'No', fecha.date()
+            ))
+
+        # PRODUCTO, TIENDA y MOTIVO: un miembro por llave natural, numerados tras el máximo existente
+        def asignar(dimension, naturales, atributos):
+            ids = llaves[dimension]
+            siguiente = max(ids.values(), default=0) + 1
+            unicos = pd.DataFrame({'natural': naturales}).join(atributos).drop_duplicates('natural')
+            unicos = unicos[~unicos['natural'].isin(ids.keys())].astype(object)
+            unicos = unicos.where(unicos.notna(), None)
+            for id_nuevo, (natural, *valores) in enumerate(unicos.itertuples(index=False), start=siguiente):
+                ids[natural] = id_nuevo
+                nuevos[dimension].append((id_nuevo, *valores))
+            return naturales.map(ids).to_numpy(np.int64)
+
+        # Sin código, el producto se identifica por sus atributos (el código queda nulo en la dimensión)
+        codigo = bloque['codigo_producto'].astype('Int64')
+        codigos = codigo.astype(str).where(codigo.notna(), None)
+        productos = codigos.copy()
+        sin_codigo = codigo.isna().to_numpy()
+        if sin_codigo.any():
+            productos[sin_codigo] = llave_producto_sin_codigo(*(
+                bloque.loc[sin_codigo, columna].astype(object).fillna('')
+                for columna in ['descripcion', 'negocio', 'seccion', 'linea', 'categoria']
+            ))
+        id_producto = asignar('PRODUCTO', productos, pd.DataFrame({
+            'Codigo_producto': codigos,
+            'Descripcion': bloque['descripcion'],
+            'Negocio': bloque['negocio'],
+            'Seccion': bloque['seccion'],
+            'Linea': bloque['linea'],
+            'Categoria': bloque['categoria'],
+            'Abastecimiento': bloque['abastecimiento'],
+            'Tipo_empaque': bloque['tamano_producto'],
+            'Perecibilidad': bloque['riesgo_perecibilidad'],
+            'Tipo_producto': np.where(bloque['es_a_granel'] == 1, 'granel', 'unitario')
+        }))
+
+        tiendas = bloque['tienda'].astype(object).fillna('')
+        id_tienda = asignar('TIENDA', tiendas, pd.DataFrame({
+            'Nombre': bloque['tienda'],
+            'Comuna': bloque['comuna'],
+            'Region': bloque['region'],
+            'Ciudad': bloque['comuna'],
+            'Zonal': bloque['zonal']
+        }))
+
+        motivos = llave_motivo(
+            bloque['motivo'].astype(object).fillna(''),
+            bloque['ubicacion_motivo'].astype(object).fillna('')
+        )
+        id_motivo = asignar('MOTIVO', motivos, pd.DataFrame({
+            'Tipo_motivo': bloque['motivo'],
+            'Ubicacion_motivo': bloque['ubicacion_motivo'],
+            'Motivo': bloque['motivo']
+        }))
+
+        # Hechos: id_merma continúa la numeración existente
+        primer_id = llaves['id_merma'] + 1
+        llaves['id_merma'] += len(bloque)
+        hechos = list(zip(
+            range(primer_id, primer_id + len(bloque)),
+            id_tiempo.tolist(), id_producto.tolist(), id_tienda.tolist(), id_motivo.tolist(),
+            [None if pd.isna(v) else float(v) for v in bloque['merma_unidad']],
+            [None if pd.isna(v) else float(v) for v in bloque['merma_monto']]
+        ))
+        return nuevos, hechos
+
+    def cargar_bloque(self, cursor, bloque, llaves):
+        """Transformar un bloque de días completos y escribir dimensiones y hechos"""
+        nuevos, hechos = self.transformar(bloque, llaves)
+        self.insertar(cursor, 'TIEMPO', [
+            'id_tiempo', 'Dia', 'Mes', 'Ano', 'Semestre', 'Trimestre', 'Semana',
+            'Dia_Semana', 'Temporada', 'Fin_de_semana', 'Fecha'
+        ], nuevos['TIEMPO'])
+        self.insertar(cursor, 'PRODUCTO', [
+            'id_producto', 'Codigo_producto', 'Descripcion', 'Negocio', 'Seccion', 'Linea',
+            'Categoria', 'Abastecimiento', 'Tipo_empaque', 'Perecibilidad', 'Tipo_producto'
+        ], nuevos['PRODUCTO'])
+        self.insertar(cursor, 'TIENDA', [
+            'id_tienda', 'Nombre', 'Comuna', 'Region', 'Ciudad', 'Zonal'
+        ], nuevos['TIENDA'])
+        self.insertar(cursor, 'MOTIVO', [
+            'id_motivo', 'Tipo_motivo', 'Ubicacion_motivo', 'Motivo'
+        ], nuevos['MOTIVO'])
+        self.insertar(cursor, 'MERMAS', [
+            'id_merma', 'id_tiempo', 'id_producto', 'id_tienda', 'id_motivo',
+            'Merma_unidad', 'Merma_monto'
+        ], hechos)
+
+    def ejecutar(self, tamano_bloque=TAMANO_BLOQUE):
+        """Cargar en el datamart las fechas de mermasdb posteriores a la última ya cargada"""
+        destino = self.conectar_bd()
+        origen = self.conectar_bd()
+        cursor_destino = destino.cursor()
+
+        watermark = self.leer_watermark(cursor_destino)
+        llaves = self.leer_llaves(cursor_destino)
+
+        query = f"SELECT {', '.join(COLUMNAS_ORIGEN)} FROM mermasdb WHERE fecha IS NOT NULL"
+        params = None
+        if watermark is not None:
+            query += " AND fecha > %s"
+            params = (watermark,)
+        query += " ORDER BY fecha"
+
+        cursor_origen = origen.cursor(pymysql.cursors.SSCursor)
+        cursor_origen.execute(query, params)
+
+        # Cada commit contiene días completos, así el watermark nunca deja un día a medias
+        pendiente = None
+        total = 0
+        while True:
+            filas = cursor_origen.fetchmany(tamano_bloque)
+            if filas:
+                bloque = compactar_tipos(pd.DataFrame.from_records(filas, columns=COLUMNAS_ORIGEN))
+                if pendiente is not None:
+                    bloque = pd.concat([pendiente, bloque], ignore_index=True)
+                ultimo_dia = bloque['fecha'].iloc[-1]
+                pendiente = bloque[bloque['fecha'] == ultimo_dia]
+                bloque = bloque[bloque['fecha'] < ultimo_dia]
+            else:
+                bloque, pendiente = pendiente, None
+
+            if bloque is not None and len(bloque) > 0:
+                self.cargar_bloque(cursor_destino, bloque, llaves)
+                destino.commit()
+                total += len(bloque)
+                print(f"Datamart: {total} hechos cargados (hasta {bloque['fecha'].iloc[-1]:%Y-%m-%d})")
+
+            if not filas:
+                break
+
+        cursor_origen.close()
+        origen.close()
+        cursor_destino.close()
+        destino.close()
+        print(f"ETL finalizado: {total} hechos nuevos")
+        return total
+
+
+def cargar_desde_datamart(connection, columnas, desde=None):
+    """Leer la tabla de hechos por llaves enteras y resolver las columnas desde las dimensiones
+    (con desde, solo los días posteriores a esa fecha)"""
+    dimensiones = {}
+    for columna in columnas:
+        if columna in COLUMNAS_DATAMART:
+            tabla, llave, campo = COLUMNAS_DATAMART[columna]
+            dimensiones.setdefault((tabla, llave), []).append((columna, campo))
+
+    # Solo viajan llaves enteras y medidas; las dimensiones son tablas pequeñas
+    llaves = [llave for _, llave in dimensiones]
+    medidas = [col for col in ['merma_unidad', 'merma_monto'] if col in columnas]
+    # id_tiempo es la fecha en formato AAAAMMDD, así el filtro por fecha no necesita unir TIEMPO
+    condicion, params = '', None
+    if desde is not None:
+        condicion, params = 'WHERE id_tiempo > %s', (int(pd.Timestamp(desde).strftime('%Y%m%d')),)
+    hechos = cargar_en_bloques(connection, f"""
+        SELECT {', '.join(llaves + [f'Merma_{col[6:]} AS {col}' for col in medidas])}
+        FROM MERMAS
+        {condicion}
+        ORDER BY id_tiempo
+    """, params)
+
+    data = pd.DataFrame(index=hechos.index)
+    for (tabla, llave), campos in dimensiones.items():
+        dimension = pd.read_sql(
+            f"SELECT {llave}, {', '.join(campo for _, campo in campos)} FROM {tabla}",
+            connection, index_col=llave
+        )
+        posiciones = dimension.index.get_indexer(hechos[llave])
+        for columna, campo in campos:
+            if columna == 'fecha':
+                data[columna] = pd.to_datetime(dimension[campo]).to_numpy()[posiciones]
+                continue
+            # Se traduce por códigos de category sin materializar strings por fila
+            categorias = dimension[campo].astype('category')
+            codigos = np.where(posiciones >= 0, categorias.cat.codes.to_numpy()[posiciones], -1)
+            data[columna] = pd.Categorical.from_codes(codigos, categorias.cat.categories)
+    for medida in medidas:
+        data[medida] = hechos[medida]
+
+    return compactar_tipos(data[columnas])
+
+
+if __name__ == "__main__":
+    etl = ETLDatamart(lambda: pymysql.connect(
+        host='127.0.0.1',
+        user='root',
+        password='',
+        database='mermas'
+    ))
+    etl.ejecutar()
@@ -1,10 +1,18 @@
+import os
+import copy
+import time
+import argparse
 import pymysql
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.svm import SVR
+from sklearn.svm import SVR, LinearSVR
+from sklearn.kernel_approximation import Nystroem
+from sklearn.pipeline import Pipeline
 from catboost import CatBoostRegressor
 from xgboost import XGBRegressor
 from sklearn.preprocessing import StandardScaler, LabelEncoder, RobustScaler
@@ -13,6 +21,16 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from snapshot_mermas import SnapshotMermas
+from cubos_mermas import CubosMermas
+from etl_datamart import cargar_desde_datamart
+from cargador_mermas import cargar_en_bloques, leer_en_bloques, TAMANO_BLOQUE
+from almacen_modelos import AlmacenModelos, DIRECTORIO_MODELOS, huella_datos
+from busqueda_hiperparametros import BusquedaHiperparametros, DIRECTORIO_BUSQUEDA
+from motor_rezagos import MotorRezagos
+from perfil_memoria import PerfilMemoria
+from agregacion_bloques import AgregacionBloques, cuantiles_exactos
 
 warnings.filterwarnings('ignore')
 
@@ -20,12 +38,445 @@ warnings.filterwarnings('ignore')
 plt.rcParams['font.size'] = 10
 plt.style.use('seaborn-v0_8')
 
+# Características de entrada de los modelos
+CARACTERISTICAS = [
+    'año', 'mes', 'dia_semana', 'dia_mes', 'trimestre', 'semana_año',
+    'es_fin_semana', 'es_inicio_mes', 'es_fin_mes',
+    'linea_encoded', 'categoria_encoded', 'seccion_encoded',
+    'motivo_encoded', 'negocio_encoded', 'merma_por_monto'
+]
+
+# Columnas que se leen del snapshot o de la base de datos
+COLUMNAS_CARGA = ['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'negocio', 'comuna', 'region',
+                  'descripcion', 'merma_unidad', 'merma_monto', 'mes', 'año', 'semestre']
+
+# Columnas de la carga que usa el preprocesamiento
+COLUMNAS_PREPROCESO = ['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'negocio', 'comuna', 'region']
+
+# Modelos a entrenar, en el orden en que se reportan
+MODELOS = ['Random Forest', 'Gradient Boosting', 'SVR', 'Regresión Lineal', 'CatBoost', 'XGBoost']
+
+# Filas de entrenamiento a partir de las cuales SVR exacto se reemplaza por una aproximación del kernel
+UMBRAL_SVR = 200_000
+
+# Tamaño de la submuestra para comparar SVR exacto con la aproximación
+MUESTRA_COMPARACION_SVR = 20_000
+
+# Rondas sin mejora en validación antes de detener el boosting
+RONDAS_SIN_MEJORA = 10
+
+# Fracción final (más reciente) del entrenamiento usada como validación para la parada temprana
+FRACCION_VALIDACION = 0.1
+
+# Modelos de boosting que admiten parada temprana
+MODELOS_BOOSTING = ['Gradient Boosting', 'CatBoost', 'XGBoost']
+
+# Modelos que admiten entrenamiento incremental (actualizar_modelo); SVR y la regresión lineal,
+# junto con sus escaladores, solo se renuevan en un entrenamiento completo
+MODELOS_INCREMENTALES = ['Random Forest', 'Gradient Boosting', 'CatBoost', 'XGBoost']
+
+# Rondas de boosting y árboles de Random Forest que agrega cada actualización incremental
+RONDAS_INCREMENTALES = 20
+ARBOLES_INCREMENTALES = 20
+
+# Modelos que solo usan un hilo al entrenar
+MODELOS_UN_HILO = ['Gradient Boosting', 'SVR', 'Regresión Lineal']
+
+
+def caracteristicas_calendario(fechas):
+    """Características temporales y de estacionalidad de una serie de fechas"""
+    fechas = pd.Series(pd.to_datetime(fechas))
+    calendario = pd.DataFrame({
+        'año': fechas.dt.year.astype(np.int16),
+        'mes': fechas.dt.month.astype(np.int8),
+        'dia_semana': fechas.dt.dayofweek.astype(np.int8),
+        'dia_mes': fechas.dt.day.astype(np.int8),
+        'trimestre': fechas.dt.quarter.astype(np.int8),
+        'semana_año': fechas.dt.isocalendar().week.astype(np.int8)
+    }, index=fechas.index)
+    calendario['es_fin_semana'] = (calendario['dia_semana'] >= 5).astype(np.int8)
+    calendario['es_inicio_mes'] = (calendario['dia_mes'] <= 5).astype(np.int8)
+    calendario['es_fin_mes'] = (calendario['dia_mes'] >= 25).astype(np.int8)
+    return calendario
+
+
+def dividir_por_fecha(fechas, fraccion_test=0.2):
+    """Máscara de entrenamiento: las fechas más recientes quedan para prueba"""
+    unicas = np.sort(pd.unique(fechas))
+    corte = unicas[min(int(len(unicas) * (1 - fraccion_test)), len(unicas) - 1)]
+    return (fechas < corte).to_numpy()
+
+
+def pliegues_temporales(fechas, n_pliegues):
+    """Pliegues de validación cruzada encadenada hacia adelante: cada uno entrena con todo lo anterior"""
+    unicas = np.sort(pd.unique(fechas))
+    bloques = np.array_split(unicas, n_pliegues + 1)
+    for bloque in bloques[1:]:
+        yield (fechas < bloque[0]).to_numpy(), fechas.isin(bloque).to_numpy()
+
+
+def codificar(encoder, valores):
+    """Transformar valores con un LabelEncoder ya ajustado, con error claro si hay valores nuevos"""
+    valores = np.asarray(valores, dtype=object)
+    posiciones = np.searchsorted(encoder.classes_, valores)
+    posiciones = np.minimum(posiciones, len(encoder.classes_) - 1)
+    desconocidos = encoder.classes_[posiciones] != valores
+    if desconocidos.any():
+        raise ValueError(f"Valores no vistos en el entrenamiento: {sorted(set(valores[desconocidos]))}")
+    return posiciones
+
+
+def codificar_categoria(serie, encoder=None):
+    """Códigos de LabelEncoder calculados sobre las categorías y no fila a fila (nulos como 'Unknown')"""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    codigos = serie.cat.codes.to_numpy()
+    nulos = codigos < 0
+    usados = np.unique(codigos[~nulos])
+    valores = serie.cat.categories.to_numpy(dtype=object)[usados]
+
+    # Mismas clases que LabelEncoder.fit sobre los valores observados
+    if encoder is None:
+        encoder = LabelEncoder()
+        encoder.classes_ = np.array(sorted(set(valores) | ({'Unknown'} if nulos.any() else set())), dtype=object)
+
+    # Tabla código de category -> código del encoder; la última posición corresponde a los nulos
+    tabla = np.zeros(len(serie.cat.categories) + 1, dtype=np.int64)
+    tabla[usados] = codificar(encoder, valores)
+    if nulos.any():
+        tabla[-1] = codificar(encoder, ['Unknown'])[0]
+    return pd.to_numeric(tabla, downcast='integer')[codigos], encoder
+
+
+def repartir_nucleos(n_nucleos):
+    """Un núcleo para cada modelo de un hilo y el resto repartido entre los multihilo, sin pasar de
+    n_nucleos en total; con menos núcleos que modelos cada uno usa un hilo y el pool de procesos
+    (como máximo n_nucleos) limita cuántos corren a la vez"""
+    if n_nucleos < len(MODELOS):
+        # Cada modelo necesita al menos un hilo: los hilos suman más que n_nucleos
+        print(f"Aviso: {n_nucleos} núcleos para {len(MODELOS)} modelos; cada modelo usa un hilo y "
+              f"el pool de procesos limita cuántos corren a la vez")
+    multihilo = [nombre for nombre in MODELOS if nombre not in MODELOS_UN_HILO]
+    libres = max(n_nucleos - len(MODELOS_UN_HILO), 0)
+    hilos = {nombre: 1 for nombre in MODELOS_UN_HILO}
+    for i, nombre in enumerate(multihilo):
+        hilos[nombre] = max(libres // len(multihilo) + (1 if i < libres % len(multihilo) else 0), 1)
+    return hilos
+
+
+def crear_modelo(nombre, n_hilos, n_filas=0, umbral_svr=UMBRAL_SVR, parada_temprana=False, parametros=None):
+    """Instanciar un modelo con sus hiperparámetros (o los encontrados en la búsqueda) y sus hilos"""
+    modelo = modelo_base(nombre, n_hilos, n_filas, umbral_svr, parada_temprana)
+    if not parametros:
+        return modelo
+    if isinstance(modelo, Pipeline):
+        # La aproximación de SVR recibe C y epsilon en el regresor y gamma en Nystroem
+        parametros = dict(parametros)
+        gamma = parametros.pop('gamma', 'scale')
+        parametros = {f'svr__{k}': v for k, v in parametros.items()}
+        if gamma != 'scale':
+            parametros['nystroem__gamma'] = gamma
+    return modelo.set_params(**parametros)
+
+
+def modelo_base(nombre, n_hilos, n_filas=0, umbral_svr=UMBRAL_SVR, parada_temprana=False):
+    """Modelo con los hiperparámetros por defecto y el número de hilos asignado"""
+    if nombre == 'Random Forest':
+        return RandomForestRegressor(
+            n_estimators=200,
+            max_depth=15,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42,
+            n_jobs=n_hilos
+        )
+    if nombre == 'Gradient Boosting':
+        return GradientBoostingRegressor(
+            n_estimators=150,
+            learning_rate=0.1,
+            max_depth=6,
+            random_state=42
+        )
+    if nombre == 'SVR':
+        if n_filas > umbral_svr:
+            return crear_svr_aproximado()
+        return SVR(kernel='rbf', C=10, gamma='scale', epsilon=0.1)
+    if nombre == 'Regresión Lineal':
+        return LinearRegression()
+    if nombre == 'CatBoost':
+        return CatBoostRegressor(
+            iterations=200,
+            learning_rate=0.1,
+            depth=6,
+            random_seed=42,
+            verbose=False,
+            thread_count=n_hilos,
+            early_stopping_rounds=RONDAS_SIN_MEJORA if parada_temprana else None
+        )
+    if nombre == 'XGBoost':
+        return XGBRegressor(
+            n_estimators=150,
+            learning_rate=0.1,
+            max_depth=6,
+            random_state=42,
+            verbosity=0,
+            n_jobs=n_hilos,
+            early_stopping_rounds=RONDAS_SIN_MEJORA if parada_temprana else None
+        )
+    raise ValueError(f"Modelo desconocido: {nombre}")
+
+
+def crear_svr_aproximado():
+    """SVR con kernel RBF aproximado: características de Nystroem más un regresor lineal epsilon-insensible"""
+    return Pipeline([
+        ('nystroem', Nystroem(kernel='rbf', n_components=1000, random_state=42)),
+        ('svr', LinearSVR(C=10, epsilon=0.1, loss='epsilon_insensitive', dual=True,
+                          max_iter=20000, random_state=42))
+    ])
+
+
+def gamma_escala(X):
+    """Valor de gamma='scale' de SVR, para usarlo en la aproximación de Nystroem"""
+    varianza = np.asarray(X, dtype=np.float64).var()
+    return 1.0 / (X.shape[1] * varianza) if varianza > 0 else 1.0
+
+
+def ajustar_modelo(modelo, X, y, parada_temprana=False):
+    """Entrenar un modelo y devolverlo; la aproximación de SVR recibe antes el gamma equivalente a 'scale'"""
+    if isinstance(modelo, Pipeline) and modelo.named_steps['nystroem'].gamma is None:
+        modelo.set_params(nystroem__gamma=gamma_escala(X))
+
+    # El boosting con parada temprana elige sus rondas validando sobre el tramo final (más reciente)
+    # y luego se reentrena con todo el entrenamiento usando esas rondas
+    if parada_temprana and isinstance(modelo, (GradientBoostingRegressor, XGBRegressor, CatBoostRegressor)):
+        return reajustar_con_rondas(modelo, elegir_rondas(modelo, X, y), X, y)
+    return modelo.fit(X, y)
+
+
+def elegir_rondas(modelo, X, y):
+    """Rondas de boosting con menor error sobre el último FRACCION_VALIDACION del entrenamiento"""
+    corte = int(len(X) * (1 - FRACCION_VALIDACION))
+    X_ajuste, X_validacion = X[:corte], X[corte:]
+    y_ajuste, y_validacion = y[:corte], y[corte:]
+    if isinstance(modelo, XGBRegressor):
+        modelo.fit(X_ajuste, y_ajuste, eval_set=[(X_validacion, y_validacion)], verbose=False)
+        return rondas_usadas(modelo)
+    if isinstance(modelo, CatBoostRegressor):
+        modelo.fit(X_ajuste, y_ajuste, eval_set=(X_validacion, y_validacion), use_best_model=True)
+        return rondas_usadas(modelo)
+
+    # Gradient Boosting: error de validación después de cada ronda, cortando tras RONDAS_SIN_MEJORA sin mejora
+    modelo.fit(X_ajuste, y_ajuste)
+    mejor_error, mejor_ronda = np.inf, 0
+    for ronda, y_pred in enumerate(modelo.staged_predict(X_validacion), 1):
+        error = mean_squared_error(y_validacion, y_pred)
+        if error < mejor_error:
+            mejor_error, mejor_ronda = error, ronda
+        elif ronda - mejor_ronda >= RONDAS_SIN_MEJORA:
+            break
+    return mejor_ronda
+
+
+def reajustar_con_rondas(modelo, rondas, X, y):
+    """Modelo de boosting nuevo, sin parada temprana, entrenado con todas las filas y las rondas indicadas"""
+    if isinstance(modelo, XGBRegressor):
+        nuevo = XGBRegressor(**{**modelo.get_params(), 'n_estimators': rondas, 'early_stopping_rounds': None})
+        return nuevo.fit(X, y, verbose=False)
+    if isinstance(modelo, CatBoostRegressor):
+        parametros = {**modelo.get_params(), 'iterations': rondas}
+        parametros.pop('early_stopping_rounds', None)
+        return CatBoostRegressor(**parametros).fit(X, y)
+    return GradientBoostingRegressor(**{**modelo.get_params(), 'n_estimators': rondas}).fit(X, y)
+
+
+def rondas_usadas(modelo):
+    """Rondas de boosting efectivamente usadas (None si el modelo no es de boosting)"""
+    if isinstance(modelo, GradientBoostingRegressor):
+        return int(modelo.n_estimators_)
+    if isinstance(modelo, XGBRegressor):
+        mejor = getattr(modelo, 'best_iteration', None)
+        return int(mejor) + 1 if mejor is not None else modelo.get_booster().num_boosted_rounds()
+    if isinstance(modelo, CatBoostRegressor):
+        return int(modelo.tree_count_)
+    return None
+
+
+def comparar_svr(X, y, tamano=MUESTRA_COMPARACION_SVR):
+    """R² de SVR exacto y de la aproximación entrenados y evaluados sobre la misma submuestra"""
+    rng = np.random.default_rng(42)
+    indices = rng.choice(len(X), size=min(tamano, len(X)), replace=False)
+    corte = int(len(indices) * 0.8)
+    entrenamiento, validacion = indices[:corte], indices[corte:]
+    y = np.asarray(y)
+
+    resultados = {}
+    for tipo, modelo in [('exacto', SVR(kernel='rbf', C=10, gamma='scale', epsilon=0.1)),
+                         ('aproximado', crear_svr_aproximado())]:
+        ajustar_modelo(modelo, X[entrenamiento], y[entrenamiento])
+        resultados[tipo] = r2_score(y[validacion], modelo.predict(X[validacion]))
+    resultados['diferencia'] = resultados['aproximado'] - resultados['exacto']
+    return resultados
+
+
+def crear_scaler(nombre):
+    """Escalador requerido por el modelo (None si entrena sobre los datos originales)"""
+    if nombre == 'SVR':
+        return RobustScaler()
+    if nombre == 'Regresión Lineal':
+        return StandardScaler()
+    return None
+
+
+def _evaluar_configuracion(nombre, parametros, X_ajuste, y_ajuste, X_validacion, y_validacion):
+    """R² de validación de una configuración de hiperparámetros (usada por la búsqueda)"""
+    modelo = crear_modelo(nombre, 1, len(X_ajuste), parametros=parametros)
+    scaler = crear_scaler(nombre)
+    if scaler is not None:
+        X_ajuste = scaler.fit_transform(X_ajuste)
+        X_validacion = scaler.transform(X_validacion)
+    ajustar_modelo(modelo, X_ajuste, np.asarray(y_ajuste))
+    return r2_score(y_validacion, modelo.predict(X_validacion))
+
+
+def _entrenar_modelo(nombre, n_hilos, X_train, X_test, y_train, umbral_svr=UMBRAL_SVR, parada_temprana=False,
+                     parametros=None, comparar_aproximacion=False):
+    """Entrenar un modelo en un proceso del pool y devolver sus predicciones sobre test"""
+    inicio = time.perf_counter()
+    modelo = crear_modelo(nombre, n_hilos, len(X_train), umbral_svr, parada_temprana, parametros)
+    scaler = crear_scaler(nombre)
+    if scaler is not None:
+        X_train = scaler.fit_transform(X_train)
+        X_test = scaler.transform(X_test)
+    modelo = ajustar_modelo(modelo, X_train, np.asarray(y_train), parada_temprana)
+    segundos_entrenamiento = time.perf_counter() - inicio
+    inicio_prediccion = time.perf_counter()
+    y_pred = modelo.predict(X_test)
+    segundos_prediccion = time.perf_counter() - inicio_prediccion
+
+    # Si SVR se aproximó, se mide cuánto se pierde frente al exacto en una submuestra
+    # (solo en el entrenamiento principal, no en cada pliegue de la validación)
+    comparacion = None
+    if comparar_aproximacion and isinstance(modelo, Pipeline):
+        comparacion = comparar_svr(X_train, y_train)
+    return {
+        'modelo': modelo,
+        'scaler': scaler,
+        'y_pred': y_pred,
+        'segundos': segundos_entrenamiento,
+        'segundos_prediccion': segundos_prediccion,
+        'comparacion': comparacion,
+        'rondas': rondas_usadas(modelo)
+    }
+
+
+def actualizar_modelo(modelo, X_nuevo, y_nuevo):
+    """Continuar el entrenamiento de un modelo con filas nuevas (None si el modelo no lo admite)"""
+    if isinstance(modelo, XGBRegressor):
+        # Rondas adicionales sobre el booster existente
+        continuacion = XGBRegressor(**{**modelo.get_params(), 'n_estimators': RONDAS_INCREMENTALES,
+                                       'early_stopping_rounds': None})
+        return continuacion.fit(X_nuevo, y_nuevo, xgb_model=modelo.get_booster())
+    if isinstance(modelo, CatBoostRegressor):
+        parametros = {**modelo.get_params(), 'iterations': RONDAS_INCREMENTALES}
+        parametros.pop('early_stopping_rounds', None)
+        return CatBoostRegressor(**parametros).fit(X_nuevo, y_nuevo, init_model=modelo)
+    if isinstance(modelo, (RandomForestRegressor, GradientBoostingRegressor)):
+        # warm_start conserva los árboles existentes y agrega los nuevos entrenados con las filas nuevas
+        incremento = ARBOLES_INCREMENTALES if isinstance(modelo, RandomForestRegressor) else RONDAS_INCREMENTALES
+        parametros = {'warm_start': True, 'n_estimators': modelo.n_estimators + incremento}
+        if isinstance(modelo, GradientBoostingRegressor):
+            parametros['n_estimators'] = modelo.n_estimators_ + incremento
+            parametros['n_iter_no_change'] = None
+        return modelo.set_params(**parametros).fit(X_nuevo, y_nuevo)
+    return None
+
+
+def _agregar_bloque(bloque, limites_iqr):
+    """Sumas parciales por (fecha, línea, categoría) de un bloque, menor valor de sus atributos y valores vistos"""
+    merma_unidad_abs = np.abs(bloque['merma_unidad'].to_numpy(np.float32))
+    inferior, superior = limites_iqr
+    mascara = (merma_unidad_abs >= inferior) & (merma_unidad_abs <= superior)
+    parcial = pd.DataFrame({
+        'fecha': pd.to_datetime(bloque['fecha']).to_numpy()[mascara],
+        'merma_unidad_abs': merma_unidad_abs[mascara].astype(np.float64),
+        'merma_monto_abs': np.abs(bloque['merma_monto'].to_numpy(np.float32))[mascara].astype(np.float64)
+    })
+
+    # Valores de cada dimensión (nulos como 'Unknown', igual que codificar_categoria) para ajustar los encoders
+    vistos = {}
+    for col in COLUMNAS_PREPROCESO[1:]:
+        if col in bloque.columns:
+            valores = bloque[col].to_numpy(dtype=object)[mascara]
+            valores = np.where(pd.isna(valores), 'Unknown', valores)
+            vistos[col] = set(pd.unique(valores))
+            if col in ['linea', 'categoria', 'seccion', 'motivo', 'negocio']:
+                parcial[col] = valores
+
+    agregaciones = {
+        'merma_unidad_abs': ('merma_unidad_abs', 'sum'),
+        'merma_monto_abs': ('merma_monto_abs', 'sum')
+    }
+    for col in ['seccion', 'motivo', 'negocio']:
+        if col in parcial.columns:
+            agregaciones[col] = (col, 'min')
+    parcial = parcial.groupby(['fecha', 'linea', 'categoria'], sort=False).agg(**agregaciones).reset_index()
+    return parcial, vistos
+
+
 class PredictorMermas:
-    def __init__(self):
+    def __init__(self, fuente='snapshot', n_nucleos=None, directorio_modelos=DIRECTORIO_MODELOS,
+                 reutilizar_modelos=True, umbral_svr=UMBRAL_SVR, validacion='aleatoria', n_pliegues=0,
+                 buscar_hiperparametros=False, directorio_busqueda=DIRECTORIO_BUSQUEDA,
+                 dias_reentrenamiento=30, umbral_deriva=0.25, rezagos=False, perfil_memoria=False,
+                 fuera_de_memoria=False, tamano_bloque=TAMANO_BLOQUE):
+        # fuente: 'snapshot' (copia local columnar), 'cubo' (agregados diarios),
+        # 'datamart' (esquema estrella), 'bd' (consulta completa) o 'bd_agregada'
+        # (filtro IQR y agregación por fecha, línea y categoría calculados en MariaDB)
+        self.fuente = fuente
+        # fuera_de_memoria: leer las filas en bloques por fecha y agregarlas en paralelo sin cargarlas
+        # completas (solo con las fuentes de filas originales: 'snapshot' o 'bd')
+        if fuera_de_memoria and fuente not in ('snapshot', 'bd'):
+            raise ValueError(f"El modo fuera de memoria requiere fuente 'snapshot' o 'bd', no '{fuente}'")
+        self.fuera_de_memoria = fuera_de_memoria
+        self.tamano_bloque = tamano_bloque
+        # n_nucleos: presupuesto de núcleos repartido entre los modelos que se entrenan en paralelo
+        self.n_nucleos = n_nucleos or os.cpu_count()
+        # Modelos entrenados guardados en disco; se reutilizan si los datos no cambiaron
+        self.almacen = AlmacenModelos(directorio_modelos)
+        self.reutilizar_modelos = reutilizar_modelos
+        # umbral_svr: sobre esta cantidad de filas SVR usa la aproximación de Nystroem
+        self.umbral_svr = umbral_svr
+        self.comparacion_svr = None
+        # validacion: 'aleatoria' (train_test_split) o 'temporal' (prueba con las fechas más recientes,
+        # parada temprana del boosting y, si n_pliegues > 0, validación cruzada encadenada)
+        self.validacion = validacion
+        self.n_pliegues = n_pliegues
+        self.rondas = {}
+        self.validacion_cruzada = None
+        # Predicciones fuera de muestra, residuos y tiempos de cada modelo, calculados una sola vez
+        self.evaluaciones = {}
+        # Búsqueda de hiperparámetros por successive halving; sus evaluaciones se guardan en disco
+        self.buscar = buscar_hiperparametros
+        self.busqueda = BusquedaHiperparametros(_evaluar_configuracion, directorio_busqueda, self.n_nucleos)
+        self.hiperparametros = {}
+        # Actualización incremental: reentrenamiento completo cada dias_reentrenamiento días o si el
+        # RMSE del mejor modelo sobre los días nuevos supera en umbral_deriva al de la prueba del último
+        # entrenamiento completo
+        self.dias_reentrenamiento = dias_reentrenamiento
+        self.umbral_deriva = umbral_deriva
+        # rezagos: agregar merma de ayer, de hace 7 días y promedios de 7 y 28 días por (línea, categoría)
+        self.motor_rezagos = MotorRezagos() if rezagos else None
+        # perfil_memoria: reporte de memoria (tracemalloc) por etapa de carga y preprocesamiento
+        self.perfil_memoria = PerfilMemoria(perfil_memoria)
+        self.agregacion = AgregacionBloques(self.n_nucleos)
+        self.snapshot = SnapshotMermas(self.conectar_bd)
+        self.cubos = CubosMermas(self.conectar_bd)
         self.modelos = {}
         self.scalers = {}
         self.encoders = {}
         self.feature_names = []
+        self.perfil_pares = None
+        self.limites_iqr = None
         self.mejor_modelo = None
         self.metricas_df = None
 
@@ -67,104 +518,337 @@ class PredictorMermas:
             print(f"Error calculando métricas para {nombre_modelo}: {e}")
             return None
 
-    def cargar_datos(self):
-        """Cargar y procesar datos desde la base de datos"""
+    def cargar_datos(self, desde=None):
+        """Cargar datos desde el snapshot local o desde la base de datos (si se indica, solo fechas posteriores a desde)"""
+        if self.fuente == 'snapshot':
+            return self.cargar_datos_snapshot(desde)
+        if self.fuente == 'cubo':
+            return self.cargar_datos_cubo(desde)
+        if self.fuente == 'datamart':
+            return self.cargar_datos_datamart(desde)
+        return self.cargar_datos_bd(desde)
+
+    def filtro_snapshot(self, desde=None):
+        """Filtro de filas válidas del snapshot (si se indica, solo fechas posteriores a desde)"""
+        filtro = (
+            pc.field('merma_unidad').is_valid() &
+            pc.field('merma_monto').is_valid() &
+            pc.field('linea').is_valid() &
+            pc.field('categoria').is_valid()
+        )
+        if desde is not None:
+            filtro = filtro & (pc.field('fecha') > pa.scalar(pd.Timestamp(desde), type=pa.timestamp('ns')))
+        return filtro
+
+    def cargar_datos_snapshot(self, desde=None):
+        """Cargar datos desde el snapshot local, trayendo solo las fechas nuevas"""
+        data = self.snapshot.cargar(columnas=COLUMNAS_CARGA, filtro=self.filtro_snapshot(desde))
+
+        print(f"Datos cargados: {len(data)} registros")
+        return data
+
+    def cargar_datos_cubo(self, desde=None):
+        """Cargar celdas diarias desde el cubo agregado en vez de las filas originales"""
+        condicion = f"fecha > '{pd.Timestamp(desde).date()}'" if desde is not None else None
+        data = self.cubos.cargar('cubo_dia_detalle', condicion=condicion)
+        data = data[(data['n_unidad'] > 0) & (data['n_monto'] > 0)]
+        data = data.dropna(subset=['linea', 'categoria'])
+
+        # Cada fila es el total de una celda día × dimensiones, por lo que el filtro de
+        # outliers de preprocesar_datos se aplica sobre celdas y no sobre movimientos
+        data['merma_unidad'] = data['suma_unidad_abs']
+        data['merma_monto'] = data['suma_monto_abs']
+        data = data[['fecha', 'linea', 'categoria', 'seccion', 'motivo', 'negocio',
+                     'merma_unidad', 'merma_monto']]
+
+        print(f"Datos cargados: {len(data)} celdas del cubo")
+        return data
+
+    def cargar_datos_datamart(self, desde=None):
+        """Cargar datos desde la tabla de hechos MERMAS del datamart (llaves enteras)"""
         connection = self.conectar_bd()
+        data = cargar_desde_datamart(connection, [
+            'fecha', 'linea', 'categoria', 'seccion', 'motivo', 'negocio',
+            'comuna', 'region', 'descripcion', 'merma_unidad', 'merma_monto'
+        ], desde)
+        connection.close()
+        data = data.dropna(subset=['merma_unidad', 'merma_monto', 'linea', 'categoria']).reset_index(drop=True)
 
-        # Query optimizada para manejar diferentes tipos de unidades
-        query = """
-        SELECT 
-            fecha,
-            linea,
-            categoria,
-            seccion,
-            motivo,
-            negocio,
-            comuna,
-            region,
-            descripcion,
-            merma_unidad,
-            merma_monto,
-            mes,
-            año,
-            semestre
-        FROM mermasdb 
+        print(f"Datos cargados: {len(data)} registros")
+        return data
+
+    def condicion_bd(self, desde=None):
+        """Condición WHERE de las filas válidas (si se indica, solo fechas posteriores a desde) y sus parámetros"""
+        condicion = """
         WHERE merma_unidad IS NOT NULL 
         AND merma_monto IS NOT NULL
         AND fecha IS NOT NULL
         AND linea IS NOT NULL
         AND categoria IS NOT NULL
-        ORDER BY fecha
         """
+        params = ()
+        if desde is not None:
+            condicion += " AND fecha > %s"
+            params = (pd.Timestamp(desde).date(),)
+        return condicion, params
+
+    def consulta_bd(self, desde=None, columnas=COLUMNAS_CARGA):
+        """Consulta de filas válidas ordenadas por fecha y sus parámetros"""
+        condicion, params = self.condicion_bd(desde)
+        query = f"""
+        SELECT 
+            {', '.join(columnas)}
+        FROM mermasdb {condicion} ORDER BY fecha"""
+        return query, params or None
 
-        data = pd.read_sql(query, connection)
+    def cargar_datos_bd(self, desde=None):
+        """Cargar y procesar datos desde la base de datos"""
+        connection = self.conectar_bd()
+        query, params = self.consulta_bd(desde)
+        data = cargar_en_bloques(connection, query, params)
         connection.close()
 
         print(f"Datos cargados: {len(data)} registros")
         return data
 
-    def preprocesar_datos(self, data):
-        """Preprocesamiento avanzado de datos"""
+    def bloques_datos(self, columnas, desde=None):
+        """Recorrer las filas válidas en bloques ordenados por fecha, desde el snapshot o la base de datos"""
+        if self.fuente == 'snapshot':
+            yield from self.snapshot.bloques(columnas, self.filtro_snapshot(desde), self.tamano_bloque)
+            return
+        connection = self.conectar_bd()
+        try:
+            query, params = self.consulta_bd(desde, columnas)
+            yield from leer_en_bloques(connection, query, params, self.tamano_bloque)
+        finally:
+            connection.close()
+
+    def refrescar_fuente(self):
+        """Incorporar a la fuente local las filas nuevas de mermasdb antes de leerla"""
+        if self.fuente == 'snapshot':
+            self.snapshot.actualizar()
+        if self.fuente == 'cubo':
+            self.cubos.actualizar()
+
+    def datos_procesados(self, desde=None, ajustar=True):
+        """Datos agregados y con características: en MariaDB, por bloques o cargando todo y preprocesando"""
+        self.refrescar_fuente()
+        if self.fuente == 'bd_agregada':
+            return self.preprocesar_en_servidor(desde, ajustar)
+        if self.fuera_de_memoria:
+            return self.preprocesar_en_bloques(desde, ajustar)
+        data = self.cargar_datos(desde)
+        self.perfil_memoria.etapa('Carga', data)
+        if len(data) == 0 and not ajustar:
+            return data
+        return self.preprocesar_datos(data, ajustar)
+
+    def preprocesar_datos(self, data, ajustar=True):
+        """Preprocesamiento avanzado de datos (ajustar=False reutiliza límites IQR y encoders ya ajustados)"""
         print("Preprocesando datos...")
 
         # Manejar valores de merma_unidad (pueden ser negativos, decimales, etc.)
-        data['merma_unidad_abs'] = np.abs(data['merma_unidad'])
-        data['merma_monto_abs'] = np.abs(data['merma_monto'])
+        merma_unidad_abs = np.abs(data['merma_unidad'].to_numpy(np.float32))
 
         # Filtrar valores extremos (outliers)
-        q1_unidad = data['merma_unidad_abs'].quantile(0.25)
-        q3_unidad = data['merma_unidad_abs'].quantile(0.75)
-        iqr_unidad = q3_unidad - q1_unidad
-
-        # Mantener valores dentro de 1.5 * IQR
-        data = data[
-            (data['merma_unidad_abs'] >= q1_unidad - 1.5 * iqr_unidad) &
-            (data['merma_unidad_abs'] <= q3_unidad + 1.5 * iqr_unidad)
-            ]
-
-        # Convertir fecha
+        if ajustar:
+            q1_unidad, q3_unidad = np.nanquantile(merma_unidad_abs.astype(np.float64), [0.25, 0.75])
+            iqr_unidad = q3_unidad - q1_unidad
+            self.limites_iqr = (q1_unidad - 1.5 * iqr_unidad, q3_unidad + 1.5 * iqr_unidad)
+
+        # Mantener valores dentro de 1.5 * IQR, copiando solo las columnas que se usan
+        inferior, superior = self.limites_iqr
+        mascara = (merma_unidad_abs >= inferior) & (merma_unidad_abs <= superior)
+        columnas = [col for col in COLUMNAS_PREPROCESO if col in data.columns]
+        merma_monto_abs = np.abs(data['merma_monto'].to_numpy(np.float32)[mascara])
+        data = data.loc[mascara, columnas]
+        data['merma_unidad_abs'] = merma_unidad_abs[mascara]
+        data['merma_monto_abs'] = merma_monto_abs
         data['fecha'] = pd.to_datetime(data['fecha'])
+        self.perfil_memoria.etapa('Filtro IQR', data)
 
-        # Características temporales
-        data['año'] = data['fecha'].dt.year
-        data['mes'] = data['fecha'].dt.month
-        data['dia_semana'] = data['fecha'].dt.dayofweek
-        data['dia_mes'] = data['fecha'].dt.day
-        data['trimestre'] = data['fecha'].dt.quarter
-        data['semana_año'] = data['fecha'].dt.isocalendar().week
-
-        # Características de estacionalidad
-        data['es_fin_semana'] = (data['dia_semana'] >= 5).astype(int)
-        data['es_inicio_mes'] = (data['dia_mes'] <= 5).astype(int)
-        data['es_fin_mes'] = (data['dia_mes'] >= 25).astype(int)
-
-        # Codificar variables categóricas
+        # Codificar variables categóricas desde los códigos de category
         categorical_columns = ['linea', 'categoria', 'seccion', 'motivo', 'negocio', 'comuna', 'region']
 
         for col in categorical_columns:
-            le = LabelEncoder()
-            data[f'{col}_encoded'] = le.fit_transform(data[col].fillna('Unknown'))
-            self.encoders[col] = le
-
-        # Agregar por línea y categoría para reducir dimensionalidad
-        data_agg = data.groupby(['fecha', 'linea', 'categoria']).agg({
-            'merma_unidad_abs': 'sum',
-            'merma_monto_abs': 'sum',
-            'año': 'first',
-            'mes': 'first',
-            'dia_semana': 'first',
-            'dia_mes': 'first',
-            'trimestre': 'first',
-            'semana_año': 'first',
-            'es_fin_semana': 'first',
-            'es_inicio_mes': 'first',
-            'es_fin_mes': 'first',
-            'linea_encoded': 'first',
-            'categoria_encoded': 'first',
-            'seccion_encoded': 'first',
-            'motivo_encoded': 'first',
-            'negocio_encoded': 'first'
-        }).reset_index()
+            if col not in data.columns:
+                continue
+            codigos, encoder = codificar_categoria(data[col], None if ajustar else self.encoders[col])
+            self.encoders[col] = encoder
+            if col in ['seccion', 'motivo', 'negocio']:
+                data[f'{col}_encoded'] = codigos
+        self.perfil_memoria.etapa('Codificación', data)
+
+        # Agregar por línea y categoría para reducir dimensionalidad; sección, motivo y negocio toman el
+        # menor código del grupo (el menor valor en el orden del encoder, igual en los tres caminos)
+        agregaciones = {
+            'merma_unidad_abs': ('merma_unidad_abs', 'sum'),
+            'merma_monto_abs': ('merma_monto_abs', 'sum')
+        }
+        for col in ['seccion_encoded', 'motivo_encoded', 'negocio_encoded']:
+            if col in data.columns:
+                agregaciones[col] = (col, 'min')
+        data_agg = data.groupby(['fecha', 'linea', 'categoria'], observed=True).agg(**agregaciones).reset_index()
+        del data
+        return self.completar_agregados(data_agg, ajustar)
+
+    def preprocesar_en_bloques(self, desde=None, ajustar=True):
+        """Mismo resultado que cargar_datos + preprocesar_datos, leyendo y agregando las filas por bloques"""
+        print("Preprocesando datos por bloques...")
+
+        # Primera pasada: conteo exacto de cada valor de merma_unidad para obtener los cuartiles
+        if ajustar:
+            conteos = self.agregacion.conteos(self.bloques_datos(['merma_unidad'], desde), 'merma_unidad')
+            if len(conteos) == 0:
+                raise ValueError("No hay datos para preprocesar")
+            q1_unidad, q3_unidad = cuantiles_exactos(conteos, [0.25, 0.75])
+            iqr_unidad = q3_unidad - q1_unidad
+            self.limites_iqr = (q1_unidad - 1.5 * iqr_unidad, q3_unidad + 1.5 * iqr_unidad)
+            print(f"Cuartiles calculados sobre {int(conteos.sum())} registros")
+            self.perfil_memoria.etapa('Cuartiles por bloques')
+
+        # Segunda pasada: sumas parciales y menores valores por bloque en paralelo, que se combinan sin
+        # depender del orden de los bloques
+        columnas = COLUMNAS_PREPROCESO + ['merma_unidad', 'merma_monto']
+        parciales, vistos = [], {}
+        for parcial, vistos_bloque in self.agregacion.procesar(self.bloques_datos(columnas, desde),
+                                                                _agregar_bloque, self.limites_iqr):
+            parciales.append(parcial)
+            for col, valores in vistos_bloque.items():
+                vistos.setdefault(col, set()).update(valores)
+        if not parciales:
+            print("Datos después del preprocesamiento: 0 registros")
+            return pd.DataFrame()
+
+        agregaciones = {
+            'merma_unidad_abs': ('merma_unidad_abs', 'sum'),
+            'merma_monto_abs': ('merma_monto_abs', 'sum')
+        }
+        primeros = [col for col in ['seccion', 'motivo', 'negocio'] if col in parciales[0].columns]
+        for col in primeros:
+            agregaciones[col] = (col, 'min')
+        data_agg = pd.concat(parciales, ignore_index=True).groupby(
+            ['fecha', 'linea', 'categoria']).agg(**agregaciones).reset_index()
+        del parciales
+        data_agg = self.codificar_agregados(data_agg, vistos, primeros, ajustar)
+        self.perfil_memoria.etapa('Agregación por bloques', data_agg)
+
+        return self.completar_agregados(data_agg, ajustar)
+
+    def consulta_cuartiles_bd(self, desde=None):
+        """Consulta de los cuartiles de |merma_unidad| (con interpolación lineal, los mismos de np.nanquantile)"""
+        condicion, params = self.condicion_bd(desde)
+        query = f"""
+        SELECT
+            PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY ABS(merma_unidad)) OVER (),
+            PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY ABS(merma_unidad)) OVER ()
+        FROM mermasdb {condicion}
+        LIMIT 1"""
+        return query, params
+
+    def condicion_iqr_bd(self, desde=None):
+        """Condición de filas válidas dentro de los límites IQR ya calculados y sus parámetros"""
+        condicion, params = self.condicion_bd(desde)
+        condicion += " AND ABS(merma_unidad) BETWEEN %s AND %s"
+        return condicion, params + tuple(float(limite) for limite in self.limites_iqr)
+
+    def consulta_dimensiones_bd(self, desde=None):
+        """Consulta de las combinaciones de dimensiones dentro del filtro IQR"""
+        condicion, params = self.condicion_iqr_bd(desde)
+        return f"SELECT DISTINCT {', '.join(COLUMNAS_PREPROCESO[1:])} FROM mermasdb {condicion}", params
+
+    def consulta_agregada_bd(self, desde=None):
+        """Consulta de las sumas por (fecha, línea, categoría) dentro del filtro IQR"""
+        condicion, params = self.condicion_iqr_bd(desde)
+        # Sección, motivo y negocio toman el menor valor del grupo con nulos como 'Unknown'; la comparación
+        # binaria sigue el orden de los puntos de código, el mismo de los encoders y de min() en pandas
+        menores = ', '.join(
+            f"CONVERT(MIN(CAST(IFNULL({col}, 'Unknown') AS BINARY)) USING utf8mb4) AS {col}"
+            for col in ['seccion', 'motivo', 'negocio']
+        )
+        query = f"""
+        SELECT
+            fecha,
+            linea,
+            categoria,
+            SUM(ABS(merma_unidad)) AS merma_unidad_abs,
+            SUM(ABS(merma_monto)) AS merma_monto_abs,
+            {menores}
+        FROM mermasdb {condicion}
+        GROUP BY fecha, linea, categoria
+        ORDER BY fecha"""
+        return query, params
+
+    def preprocesar_en_servidor(self, desde=None, ajustar=True):
+        """Mismo resultado que cargar_datos_bd + preprocesar_datos, con el filtro IQR y la agregación en MariaDB"""
+        print("Preprocesando datos en la base de datos...")
+        connection = self.conectar_bd()
+        cursor = connection.cursor()
+
+        if ajustar:
+            cursor.execute(*self.consulta_cuartiles_bd(desde))
+            cuartiles = cursor.fetchone()
+            if cuartiles is None:
+                connection.close()
+                raise ValueError("No hay datos para preprocesar")
+            q1_unidad, q3_unidad = float(cuartiles[0]), float(cuartiles[1])
+            iqr_unidad = q3_unidad - q1_unidad
+            self.limites_iqr = (q1_unidad - 1.5 * iqr_unidad, q3_unidad + 1.5 * iqr_unidad)
+
+        # Valores de cada dimensión dentro del filtro, para ajustar (o validar) los encoders
+        dimensiones = COLUMNAS_PREPROCESO[1:]
+        cursor.execute(*self.consulta_dimensiones_bd(desde))
+        combinaciones = pd.DataFrame.from_records(cursor.fetchall(), columns=dimensiones)
+        vistos = {col: set(combinaciones[col].fillna('Unknown')) for col in dimensiones}
+        cursor.close()
+
+        # Una fila por (fecha, línea, categoría)
+        primeros = ['seccion', 'motivo', 'negocio']
+        query, params = self.consulta_agregada_bd(desde)
+        data_agg = cargar_en_bloques(connection, query, params)
+        connection.close()
+        print(f"Datos cargados: {len(data_agg)} filas agregadas en el servidor")
+        if len(data_agg) == 0:
+            return data_agg
+
+        data_agg = data_agg.sort_values(['fecha', 'linea', 'categoria'], kind='stable', ignore_index=True)
+        for col in primeros:
+            data_agg[col] = data_agg[col].astype(object)
+        data_agg = self.codificar_agregados(data_agg, vistos, primeros, ajustar)
+        self.perfil_memoria.etapa('Agregación en el servidor', data_agg)
+
+        return self.completar_agregados(data_agg, ajustar)
+
+    def codificar_agregados(self, data_agg, vistos, primeros, ajustar=True):
+        """Ajustar los encoders con los valores vistos y codificar los atributos de las filas agregadas"""
+        data_agg['merma_unidad_abs'] = data_agg['merma_unidad_abs'].astype(np.float32)
+        data_agg['merma_monto_abs'] = data_agg['merma_monto_abs'].astype(np.float32)
+        for col in ['linea', 'categoria']:
+            data_agg[col] = data_agg[col].astype(object).astype(pd.CategoricalDtype(sorted(vistos[col])))
+
+        # Encoders con todos los valores vistos (con ajustar=False, error si aparece uno nuevo)
+        for col, valores in vistos.items():
+            valores = np.array(sorted(valores), dtype=object)
+            if ajustar:
+                self.encoders[col] = LabelEncoder()
+                self.encoders[col].classes_ = valores
+            else:
+                codificar(self.encoders[col], valores)
+        for col in primeros:
+            codigos = codificar(self.encoders[col], data_agg.pop(col).to_numpy(dtype=object))
+            data_agg[f'{col}_encoded'] = pd.to_numeric(codigos, downcast='integer')
+        return data_agg
+
+    def completar_agregados(self, data_agg, ajustar=True):
+        """Características de las filas ya agregadas por (fecha, línea, categoría)"""
+        data_agg['linea_encoded'] = codificar_categoria(data_agg['linea'], self.encoders['linea'])[0]
+        data_agg['categoria_encoded'] = codificar_categoria(data_agg['categoria'], self.encoders['categoria'])[0]
+
+        # Características temporales y de estacionalidad, una vez por fila agregada
+        calendario = caracteristicas_calendario(data_agg['fecha'])
+        for col in calendario.columns:
+            data_agg[col] = calendario[col].to_numpy()
+        self.perfil_memoria.etapa('Agregación y calendario', data_agg)
 
         # Normalizar variable objetivo con transformación robusta
         # Usar log1p para valores positivos y manejar la escala
@@ -173,109 +857,258 @@ class PredictorMermas:
         # Crear características adicionales
         data_agg['merma_por_monto'] = data_agg['merma_unidad_abs'] / np.maximum(data_agg['merma_monto_abs'], 1)
 
+        # Historia de cada serie (línea, categoría): rezagos y promedios móviles
+        if self.motor_rezagos is not None:
+            if ajustar:
+                self.motor_rezagos.calcular(data_agg, 'merma_unidad_normalizada')
+            else:
+                self.motor_rezagos.extender(data_agg, 'merma_unidad_normalizada')
+
+        # Perfil de cada par (línea, categoría) para construir características de fechas futuras
+        perfil = data_agg.sort_values('fecha', kind='stable').groupby(['linea', 'categoria'], observed=True).agg(
+            seccion_encoded=('seccion_encoded', 'last'),
+            motivo_encoded=('motivo_encoded', 'last'),
+            negocio_encoded=('negocio_encoded', 'last'),
+            merma_por_monto=('merma_por_monto', 'median')
+        ).reset_index()
+        perfil['linea'] = perfil['linea'].astype(object)
+        perfil['categoria'] = perfil['categoria'].astype(object)
+        if not ajustar and self.perfil_pares is not None:
+            # Los pares con datos nuevos reemplazan su perfil anterior
+            perfil = pd.concat([self.perfil_pares, perfil]).drop_duplicates(
+                subset=['linea', 'categoria'], keep='last').reset_index(drop=True)
+        self.perfil_pares = perfil
+        self.perfil_memoria.etapa('Rezagos y perfil de pares', data_agg)
+
         print(f"Datos después del preprocesamiento: {len(data_agg)} registros")
         return data_agg
 
     def entrenar_modelos(self, X_train, X_test, y_train, y_test):
-        """Entrenar múltiples modelos de ML"""
-        print("Entrenando modelos de Machine Learning...")
-        resultados = []
-
-        # 1. Random Forest (optimizado)
-        print("- Entrenando Random Forest...")
-        rf = RandomForestRegressor(
-            n_estimators=200,
-            max_depth=15,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            n_jobs=-1
+        """Entrenar múltiples modelos de ML en paralelo, reutilizando los ya entrenados con los mismos datos"""
+        hilos = repartir_nucleos(self.n_nucleos)
+        parada_temprana = self.validacion == 'temporal'
+        huella = huella_datos(X_train, X_test, y_train, y_test)
+        entrenados = {}
+        claves = {}
+
+        # Modelos guardados cuya clave (datos + hiperparámetros) coincide no se reentrenan
+        for nombre in MODELOS:
+            modelo = crear_modelo(nombre, hilos[nombre], len(X_train), self.umbral_svr, parada_temprana,
+                                  self.hiperparametros.get(nombre))
+            claves[nombre] = self.almacen.clave(huella, modelo, crear_scaler(nombre))
+            paquete = self.almacen.cargar(nombre, claves[nombre]) if self.reutilizar_modelos else None
+            if paquete is not None:
+                print(f"- {nombre}: datos sin cambios, se usa el modelo guardado")
+                self.modelos[nombre] = paquete['modelo']
+                if paquete['scaler'] is not None:
+                    self.scalers[nombre] = paquete['scaler']
+                entrenados[nombre] = paquete['metricas']
+                self.rondas[nombre] = rondas_usadas(paquete['modelo'])
+                if paquete.get('evaluacion') is not None:
+                    self.evaluaciones[nombre] = paquete['evaluacion']
+
+        pendientes = [nombre for nombre in MODELOS if nombre not in entrenados]
+        if pendientes:
+            print(f"Entrenando modelos de Machine Learning ({self.n_nucleos} núcleos)...")
+            with ProcessPoolExecutor(max_workers=min(len(pendientes), self.n_nucleos)) as pool:
+                futuros = {
+                    pool.submit(_entrenar_modelo, nombre, hilos[nombre], X_train, X_test, y_train,
+                                self.umbral_svr, parada_temprana, self.hiperparametros.get(nombre), True): nombre
+                    for nombre in pendientes
+                }
+                # Las métricas se calculan a medida que termina cada modelo
+                for futuro in as_completed(futuros):
+                    nombre = futuros[futuro]
+                    try:
+                        resultado = futuro.result()
+                    except Exception as e:
+                        print(f"- Error entrenando {nombre}: {e}")
+                        continue
+                    modelo, scaler, comparacion = resultado['modelo'], resultado['scaler'], resultado['comparacion']
+                    self.rondas[nombre] = resultado['rondas']
+                    rondas = f", {resultado['rondas']} rondas" if resultado['rondas'] is not None else ''
+                    print(f"- {nombre} entrenado en {resultado['segundos']:.1f} s ({hilos[nombre]} hilos{rondas})")
+                    if comparacion is not None:
+                        self.comparacion_svr = comparacion
+                        print(f"  SVR aproximado (Nystroem) sobre {len(X_train)} filas; en submuestra "
+                              f"R² exacto = {comparacion['exacto']:.4f}, aproximado = {comparacion['aproximado']:.4f} "
+                              f"(diferencia {comparacion['diferencia']:+.4f})")
+                    self.modelos[nombre] = modelo
+                    if scaler is not None:
+                        self.scalers[nombre] = scaler
+                    entrenados[nombre] = self.calcular_metricas(y_test, resultado['y_pred'], nombre)
+                    evaluacion = self.registrar_evaluacion(nombre, y_test, resultado['y_pred'],
+                                                           resultado['segundos'], resultado['segundos_prediccion'])
+                    if entrenados[nombre]:
+                        self.almacen.guardar(nombre, claves[nombre], modelo, scaler, self.encoders,
+                                             X_train.columns, entrenados[nombre], self.perfil_pares, evaluacion,
+                                             self.motor_rezagos)
+
+        # Se conserva el orden original de los modelos en los resultados
+        return [entrenados[nombre] for nombre in MODELOS if entrenados.get(nombre)]
+
+    def registrar_evaluacion(self, nombre, y_test, y_pred, segundos_entrenamiento, segundos_prediccion):
+        """Guardar predicciones de prueba, residuos y tiempos de un modelo para reutilizarlos"""
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        self.evaluaciones[nombre] = {
+            'y_pred': y_pred,
+            'residuos': np.asarray(y_test, dtype=np.float64) - y_pred,
+            'segundos_entrenamiento': segundos_entrenamiento,
+            'segundos_prediccion': segundos_prediccion
+        }
+        return self.evaluaciones[nombre]
+
+    def obtener_evaluacion(self, nombre, X_test, y_test):
+        """Evaluación guardada de un modelo; solo se predice si no existe (por ejemplo, paquetes antiguos)"""
+        if nombre not in self.evaluaciones:
+            inicio = time.perf_counter()
+            X = self.scalers[nombre].transform(X_test) if nombre in self.scalers else X_test
+            y_pred = self.modelos[nombre].predict(X)
+            self.registrar_evaluacion(nombre, y_test, y_pred, float('nan'), time.perf_counter() - inicio)
+        return self.evaluaciones[nombre]
+
+    def predicciones_prueba(self, y_test):
+        """Predicciones de prueba de todos los modelos evaluados, alineadas con y_test (por ejemplo para ensambles)"""
+        return pd.DataFrame(
+            {nombre: self.evaluaciones[nombre]['y_pred'] for nombre in MODELOS if nombre in self.evaluaciones},
+            index=y_test.index
         )
-        rf.fit(X_train, y_train)
-        y_pred_rf = rf.predict(X_test)
-        self.modelos['Random Forest'] = rf
-        metricas_rf = self.calcular_metricas(y_test, y_pred_rf, 'Random Forest')
-        if metricas_rf:
-            resultados.append(metricas_rf)
-
-        # 2. Gradient Boosting (optimizado)
-        print("- Entrenando Gradient Boosting...")
-        gb = GradientBoostingRegressor(
-            n_estimators=150,
-            learning_rate=0.1,
-            max_depth=6,
-            random_state=42
-        )
-        gb.fit(X_train, y_train)
-        y_pred_gb = gb.predict(X_test)
-        self.modelos['Gradient Boosting'] = gb
-        metricas_gb = self.calcular_metricas(y_test, y_pred_gb, 'Gradient Boosting')
-        if metricas_gb:
-            resultados.append(metricas_gb)
-
-        # 3. SVR (Support Vector Regression) - Nuevo modelo
-        print("- Entrenando Support Vector Regression...")
-        scaler_svr = RobustScaler()
-        X_train_scaled = scaler_svr.fit_transform(X_train)
-        X_test_scaled = scaler_svr.transform(X_test)
-
-        svr = SVR(kernel='rbf', C=10, gamma='scale', epsilon=0.1)
-        svr.fit(X_train_scaled, y_train)
-        y_pred_svr = svr.predict(X_test_scaled)
-        self.modelos['SVR'] = svr
-        self.scalers['SVR'] = scaler_svr
-        metricas_svr = self.calcular_metricas(y_test, y_pred_svr, 'SVR')
-        if metricas_svr:
-            resultados.append(metricas_svr)
-
-        # 4. Regresión Lineal con regularización
-        print("- Entrenando Regresión Lineal...")
-        scaler_lr = StandardScaler()
-        X_train_scaled_lr = scaler_lr.fit_transform(X_train)
-        X_test_scaled_lr = scaler_lr.transform(X_test)
-
-        lr = LinearRegression()
-        lr.fit(X_train_scaled_lr, y_train)
-        y_pred_lr = lr.predict(X_test_scaled_lr)
-        self.modelos['Regresión Lineal'] = lr
-        self.scalers['Regresión Lineal'] = scaler_lr
-        metricas_lr = self.calcular_metricas(y_test, y_pred_lr, 'Regresión Lineal')
-        if metricas_lr:
-            resultados.append(metricas_lr)
-
-        # 5. CatBoost
-        print("- Entrenando CatBoost...")
-        catboost = CatBoostRegressor(
-            iterations=200,
-            learning_rate=0.1,
-            depth=6,
-            random_seed=42,
-            verbose=False
-        )
-        catboost.fit(X_train, y_train)
-        y_pred_catboost = catboost.predict(X_test)
-        self.modelos['CatBoost'] = catboost
-        metricas_catboost = self.calcular_metricas(y_test, y_pred_catboost, 'CatBoost')
-        if metricas_catboost:
-            resultados.append(metricas_catboost)
-
-        # 6. XGBoost
-        print("- Entrenando XGBoost...")
-        xgboost = XGBRegressor(
-            n_estimators=150,
-            learning_rate=0.1,
-            max_depth=6,
-            random_state=42,
-            verbosity=0
-        )
-        xgboost.fit(X_train, y_train)
-        y_pred_xgboost = xgboost.predict(X_test)
-        self.modelos['XGBoost'] = xgboost
-        metricas_xgboost = self.calcular_metricas(y_test, y_pred_xgboost, 'XGBoost')
-        if metricas_xgboost:
-            resultados.append(metricas_xgboost)
 
-        return resultados
+    def buscar_hiperparametros(self, X_train, y_train):
+        """Buscar hiperparámetros de cada modelo validando sobre el último 20% del entrenamiento"""
+        print("Buscando hiperparámetros (successive halving)...")
+        corte = int(len(X_train) * 0.8)
+        X_ajuste, X_validacion = X_train.iloc[:corte], X_train.iloc[corte:]
+        y_ajuste, y_validacion = y_train.iloc[:corte], y_train.iloc[corte:]
+        huella = huella_datos(X_ajuste, X_validacion, y_ajuste, y_validacion)
+        self.hiperparametros = self.busqueda.buscar(MODELOS, X_ajuste, y_ajuste, X_validacion, y_validacion, huella)
+        return self.hiperparametros
+
+    def validar_temporal(self, data_processed):
+        """Validación cruzada encadenada hacia adelante por fecha, con parada temprana en el boosting"""
+        X = data_processed[self.feature_names]
+        y = data_processed['merma_unidad_normalizada']
+        pliegues = list(pliegues_temporales(data_processed['fecha'], self.n_pliegues))
+        # Los pliegues corren a la vez: cada uno recibe su parte de los núcleos
+        hilos = repartir_nucleos(max(self.n_nucleos // len(pliegues), 1))
+        print(f"Validación cruzada temporal: {len(pliegues)} pliegues x {len(MODELOS)} modelos...")
+
+        filas = []
+        with ProcessPoolExecutor(max_workers=min(len(MODELOS) * len(pliegues), self.n_nucleos)) as pool:
+            futuros = {
+                pool.submit(_entrenar_modelo, nombre, hilos[nombre], X[entrenamiento], X[prueba],
+                            y[entrenamiento], self.umbral_svr, True,
+                            self.hiperparametros.get(nombre)): (nombre, i, prueba)
+                for i, (entrenamiento, prueba) in enumerate(pliegues, 1)
+                for nombre in MODELOS
+            }
+            for futuro in as_completed(futuros):
+                nombre, i, prueba = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    print(f"- Error en {nombre}, pliegue {i}: {e}")
+                    continue
+                metricas = self.calcular_metricas(y[prueba].to_numpy(), resultado['y_pred'], nombre)
+                if metricas:
+                    metricas['Pliegue'] = i
+                    metricas['Rondas'] = resultado['rondas']
+                    filas.append(metricas)
+
+        detalle = pd.DataFrame(filas)
+        self.validacion_cruzada = detalle.groupby('Modelo', sort=False).agg(
+            R2_medio=('R²', 'mean'),
+            R2_desv=('R²', 'std'),
+            MAE_medio=('MAE', 'mean'),
+            Rondas_medias=('Rondas', 'mean')
+        ).reindex([nombre for nombre in MODELOS if nombre in set(detalle['Modelo'])])
+
+        print("\nVALIDACIÓN CRUZADA TEMPORAL")
+        print(self.validacion_cruzada.round(4).to_string())
+        return self.validacion_cruzada
+
+    def predecir_lote(self, fecha_inicio, fecha_fin, pares=None, nombre_modelo=None):
+        """Pronóstico de merma diaria para cada fecha del rango y cada par (línea, categoría)
+
+        Con rezagos, cada fecha se predice a partir de la historia guardada y de las predicciones de
+        los días anteriores; los días sin registro de un par cuentan como 0 en rezagos y promedios, y
+        cada día reordena solo la cola de historia (O(m log m) en su largo, no en el historial completo).
+        El rango debe empezar después de la última fecha de la historia."""
+        nombre_modelo = nombre_modelo or self.mejor_modelo or self.almacen.mejor()
+        if nombre_modelo is None:
+            raise ValueError("No hay modelos entrenados ni guardados para predecir")
+
+        # Modelo en memoria o, si no se entrenó en esta sesión, el guardado en disco
+        if nombre_modelo in self.modelos and self.perfil_pares is not None:
+            modelo = self.modelos[nombre_modelo]
+            scaler = self.scalers.get(nombre_modelo)
+            encoders = self.encoders
+            feature_names = self.feature_names or CARACTERISTICAS
+            perfil = self.perfil_pares
+            motor = self.motor_rezagos
+        else:
+            paquete = self.almacen.cargar(nombre_modelo)
+            if paquete is None or paquete.get('perfil') is None:
+                raise ValueError(f"No hay un modelo guardado utilizable para {nombre_modelo}")
+            modelo, scaler, encoders = paquete['modelo'], paquete['scaler'], paquete['encoders']
+            feature_names, perfil = paquete['feature_names'], paquete['perfil']
+            motor = paquete.get('motor_rezagos')
+
+        if pares is not None:
+            pares = pd.DataFrame(list(pares), columns=['linea', 'categoria'])
+            faltantes = pares.merge(perfil, on=['linea', 'categoria'], how='left', indicator=True)
+            faltantes = faltantes[faltantes['_merge'] == 'left_only']
+            if len(faltantes) > 0:
+                raise ValueError(f"Pares sin historial: {list(faltantes[['linea', 'categoria']].itertuples(index=False, name=None))}")
+            perfil = pares.merge(perfil, on=['linea', 'categoria'], how='left')
+
+        # Grilla fecha × par: el calendario se calcula una vez por fecha y se repite por par
+        fechas = pd.date_range(fecha_inicio, fecha_fin, freq='D')
+        n_fechas, n_pares = len(fechas), len(perfil)
+        calendario = caracteristicas_calendario(fechas)
+        indice_fecha = np.repeat(np.arange(n_fechas), n_pares)
+        indice_par = np.tile(np.arange(n_pares), n_fechas)
+
+        grilla = calendario.iloc[indice_fecha].reset_index(drop=True)
+        grilla['linea_encoded'] = codificar(encoders['linea'], perfil['linea'])[indice_par]
+        grilla['categoria_encoded'] = codificar(encoders['categoria'], perfil['categoria'])[indice_par]
+        for col in ['seccion_encoded', 'motivo_encoded', 'negocio_encoded', 'merma_por_monto']:
+            grilla[col] = perfil[col].to_numpy()[indice_par]
+
+        if motor is not None and any(col in feature_names for col in motor.columnas):
+            # Una fecha ya presente en la historia se sobrescribiría con el valor provisorio 0
+            ultima = motor.ultima_fecha()
+            if ultima is not None and fechas[0] <= ultima:
+                raise ValueError(f"El pronóstico debe empezar después de la última fecha con historia ({ultima.date()})")
+
+            # Con rezagos, cada fecha depende de las anteriores: se predice fecha a fecha (todos los
+            # pares juntos) y cada predicción se incorpora a la historia de su serie
+            motor = copy.deepcopy(motor)
+            prediccion = np.empty(len(grilla))
+            for i in range(n_fechas):
+                filas = slice(i * n_pares, (i + 1) * n_pares)
+                dia = pd.DataFrame({'fecha': fechas[i], 'linea': perfil['linea'].to_numpy(),
+                                    'categoria': perfil['categoria'].to_numpy(), 'valor': 0.0})
+                motor.extender(dia, 'valor')
+                for col in motor.columnas:
+                    grilla.loc[grilla.index[filas], col] = dia[col].to_numpy()
+                X = grilla.iloc[filas][feature_names]
+                prediccion[filas] = modelo.predict(scaler.transform(X) if scaler is not None else X)
+                motor.fijar_ultimos(prediccion[filas])
+            prediccion = np.expm1(prediccion)
+        else:
+            # Una sola llamada al modelo para toda la grilla
+            X = grilla[feature_names]
+            if scaler is not None:
+                X = scaler.transform(X)
+            prediccion = np.expm1(modelo.predict(X))
+
+        return pd.DataFrame({
+            'fecha': fechas[indice_fecha],
+            'linea': perfil['linea'].to_numpy()[indice_par],
+            'categoria': perfil['categoria'].to_numpy()[indice_par],
+            'merma_unidad_predicha': np.maximum(prediccion, 0)
+        })
 
     def visualizar_resultados(self, X_test, y_test, resultados):
         """Visualizar resultados con métricas claras"""
@@ -344,12 +1177,9 @@ class PredictorMermas:
         # Gráfico 2: Predicciones vs Reales (mejor modelo)
         ax2 = axes[0, 1]
         if self.mejor_modelo:
-            # Obtener predicciones del mejor modelo
-            if self.mejor_modelo in self.scalers:
-                X_test_scaled = self.scalers[self.mejor_modelo].transform(X_test)
-                y_pred_mejor = self.modelos[self.mejor_modelo].predict(X_test_scaled)
-            else:
-                y_pred_mejor = self.modelos[self.mejor_modelo].predict(X_test)
+            # Predicciones del mejor modelo ya calculadas al entrenarlo
+            evaluacion_mejor = self.obtener_evaluacion(self.mejor_modelo, X_test, y_test)
+            y_pred_mejor = evaluacion_mejor['y_pred']
 
             # Scatter plot
             ax2.scatter(y_test, y_pred_mejor, alpha=0.6, color='blue', s=30)
@@ -408,7 +1238,7 @@ class PredictorMermas:
         # Gráfico 4: Distribución de errores con estadísticas
         ax4 = axes[1, 1]
         if self.mejor_modelo:
-            errores = y_test - y_pred_mejor
+            errores = pd.Series(evaluacion_mejor['residuos'])
 
             # Histograma
             n, bins, patches = ax4.hist(errores, bins=30, alpha=0.7, color='green',
@@ -467,6 +1297,16 @@ class PredictorMermas:
             for _, row in self.metricas_df.iterrows():
                 print(f"   {row['Modelo']:20} | R²: {row['R²']:6.4f} | Error: {row['Error % Medio']:6.2f}%")
 
+            if self.evaluaciones:
+                print(f"\nTIEMPOS Y RESIDUOS EN PRUEBA:")
+                for nombre in MODELOS:
+                    if nombre not in self.evaluaciones:
+                        continue
+                    evaluacion = self.evaluaciones[nombre]
+                    print(f"   {nombre:20} | Entrenamiento: {evaluacion['segundos_entrenamiento']:7.2f} s"
+                          f" | Predicción: {evaluacion['segundos_prediccion']:6.3f} s"
+                          f" | Residuo medio: {evaluacion['residuos'].mean():+.4f}")
+
             print(f"\nCOMPARACIÓN DE FAMILIAS DE MODELOS:")
 
             # Agrupar por tipo de modelo
@@ -497,6 +1337,144 @@ class PredictorMermas:
                 print(f"   XGBoost Performance:")
                 print(f"     R²: {xgboost_metrics['R²']:.4f} | Error: {xgboost_metrics['Error % Medio']:.2f}%")
 
+    def entrenar_completo(self):
+        """Cargar todo el historial, preprocesar, dividir y entrenar todos los modelos"""
+        # 1-2. Cargar y preprocesar
+        self.perfil_memoria.iniciar()
+        data_processed = self.datos_procesados()
+        self.perfil_memoria.reporte()
+
+        # 3. Preparar características
+        self.feature_names = list(CARACTERISTICAS)
+        if self.motor_rezagos is not None:
+            self.feature_names += self.motor_rezagos.columnas
+
+        X = data_processed[self.feature_names]
+        y = data_processed['merma_unidad_normalizada']
+
+        print(f"Características utilizadas: {len(self.feature_names)}")
+        print(f"Registros para entrenamiento: {len(X)}")
+
+        # 4. Dividir datos (al azar, o por fecha para no entrenar con el futuro)
+        if self.validacion == 'temporal':
+            entrenamiento = dividir_por_fecha(data_processed['fecha'])
+            X_train, X_test = X[entrenamiento], X[~entrenamiento]
+            y_train, y_test = y[entrenamiento], y[~entrenamiento]
+            print(f"División temporal: prueba desde {data_processed['fecha'][~entrenamiento].min().date()}")
+            if self.n_pliegues > 0:
+                self.validar_temporal(data_processed)
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42, stratify=None
+            )
+
+        # 5. Entrenar modelos (opcionalmente con hiperparámetros buscados)
+        if self.buscar:
+            self.buscar_hiperparametros(X_train, y_train)
+        resultados = self.entrenar_modelos(X_train, X_test, y_train, y_test)
+
+        # Punto de partida de las actualizaciones incrementales
+        self.almacen.guardar_estado({
+            'watermark': str(data_processed['fecha'].max().date()),
+            'ultimo_completo': str(datetime.now().date()),
+            'limites_iqr': [float(limite) for limite in self.limites_iqr]
+        })
+        return X_test, y_test, resultados
+
+    def actualizar_incremental(self):
+        """Incorporar a los modelos guardados solo los días posteriores al último entrenamiento"""
+        estado = self.almacen.leer_estado()
+        if estado['watermark'] is None:
+            print("No hay un entrenamiento previo: se entrena con todo el historial")
+            return self.entrenar_completo()
+
+        dias = (datetime.now() - datetime.fromisoformat(estado['ultimo_completo'])).days
+        if dias >= self.dias_reentrenamiento:
+            print(f"Último entrenamiento completo hace {dias} días: se reentrena con todo el historial")
+            return self.entrenar_completo()
+
+        # Modelos, encoders y límites del último entrenamiento
+        paquetes = {nombre: self.almacen.cargar(nombre) for nombre in MODELOS}
+        if any(paquete is None for paquete in paquetes.values()):
+            print("Faltan modelos guardados: se entrena con todo el historial")
+            return self.entrenar_completo()
+        referencia = next(iter(paquetes.values()))
+        self.encoders = referencia['encoders']
+        self.feature_names = referencia['feature_names']
+        self.perfil_pares = referencia['perfil']
+        self.motor_rezagos = referencia.get('motor_rezagos')
+        self.limites_iqr = tuple(estado['limites_iqr'])
+
+        # El mejor modelo según la prueba del último entrenamiento completo; si no admite entrenamiento
+        # incremental, los días nuevos solo se incorporan con un reentrenamiento completo
+        mejor = max(paquetes, key=lambda nombre: paquetes[nombre]['metricas']['R²'])
+        if mejor not in MODELOS_INCREMENTALES:
+            print(f"El mejor modelo ({mejor}) no admite entrenamiento incremental: se reentrena con todo el historial")
+            return self.entrenar_completo()
+
+        try:
+            data_nueva = self.datos_procesados(desde=estado['watermark'], ajustar=False)
+        except ValueError as e:
+            print(f"{e}: se reentrena con todo el historial")
+            return self.entrenar_completo()
+        if len(data_nueva) == 0:
+            print(f"Sin datos válidos posteriores a {estado['watermark']}")
+            return None
+
+        X_nuevo = data_nueva[self.feature_names]
+        y_nuevo = data_nueva['merma_unidad_normalizada']
+
+        # Cada modelo se evalúa sobre los días nuevos antes de incorporarlos (datos que no vio). Estas
+        # métricas se guardan aparte: 'metricas' sigue siendo la prueba del último entrenamiento completo
+        metricas_incrementales = {}
+        predicciones = {}
+        for nombre, paquete in paquetes.items():
+            X_evaluacion = X_nuevo if paquete['scaler'] is None else paquete['scaler'].transform(X_nuevo)
+            predicciones[nombre] = paquete['modelo'].predict(X_evaluacion)
+            metricas = self.calcular_metricas(y_nuevo.to_numpy(), predicciones[nombre], nombre)
+            if metricas:
+                metricas['Evaluación'] = f"días posteriores a {estado['watermark']}"
+            metricas_incrementales[nombre] = metricas
+
+        # Deriva: error del mejor modelo sobre los días nuevos frente a la prueba del último entrenamiento
+        # completo, una base fija para que una deriva lenta también se detecte
+        rmse_nuevo = np.sqrt(mean_squared_error(y_nuevo, predicciones[mejor]))
+        rmse_base = paquetes[mejor]['metricas']['RMSE']
+        print(f"{mejor}: RMSE en días nuevos = {rmse_nuevo:.4f} (prueba del último entrenamiento completo: "
+              f"{rmse_base:.4f})")
+        if rmse_nuevo > rmse_base * (1 + self.umbral_deriva):
+            print("Deriva detectada: se reentrena con todo el historial")
+            return self.entrenar_completo()
+
+        watermark = str(data_nueva['fecha'].max().date())
+        for nombre, paquete in paquetes.items():
+            self.modelos[nombre] = paquete['modelo']
+            if paquete['scaler'] is not None:
+                self.scalers[nombre] = paquete['scaler']
+
+            # SVR y la regresión lineal no se actualizan: sus escaladores están ligados a los coeficientes,
+            # renovar solo el escalador los descalibraría. Se guardan con su clave original (el modelo es el
+            # del último entrenamiento completo) y solo cambian el historial de rezagos y la evaluación nueva
+            if nombre not in MODELOS_INCREMENTALES:
+                print(f"- {nombre}: sin entrenamiento incremental, queda como en el último entrenamiento completo")
+                self.almacen.guardar(nombre, paquete['clave'], paquete['modelo'], paquete['scaler'],
+                                     self.encoders, self.feature_names, paquete['metricas'], self.perfil_pares,
+                                     paquete.get('evaluacion'), self.motor_rezagos, metricas_incrementales[nombre])
+                continue
+
+            inicio = time.perf_counter()
+            self.modelos[nombre] = actualizar_modelo(paquete['modelo'], X_nuevo, y_nuevo)
+            print(f"- {nombre}: actualizado con {len(X_nuevo)} filas en {time.perf_counter() - inicio:.1f} s")
+            self.almacen.guardar(nombre, f"incremental:{watermark}", self.modelos[nombre], paquete['scaler'],
+                                 self.encoders, self.feature_names, paquete['metricas'], self.perfil_pares,
+                                 motor_rezagos=self.motor_rezagos,
+                                 metricas_incrementales=metricas_incrementales[nombre])
+
+        estado['watermark'] = watermark
+        self.almacen.guardar_estado(estado)
+        print(f"Modelos actualizados hasta {watermark}")
+        return None
+
     def ejecutar_analisis_completo(self):
         """Ejecutar análisis completo de principio a fin"""
         print("")
@@ -504,33 +1482,8 @@ class PredictorMermas:
         print("")
 
         try:
-            # 1. Cargar datos
-            data = self.cargar_datos()
-
-            # 2. Preprocesar
-            data_processed = self.preprocesar_datos(data)
-
-            # 3. Preparar características
-            self.feature_names = [
-                'año', 'mes', 'dia_semana', 'dia_mes', 'trimestre', 'semana_año',
-                'es_fin_semana', 'es_inicio_mes', 'es_fin_mes',
-                'linea_encoded', 'categoria_encoded', 'seccion_encoded',
-                'motivo_encoded', 'negocio_encoded', 'merma_por_monto'
-            ]
-
-            X = data_processed[self.feature_names]
-            y = data_processed['merma_unidad_normalizada']
-
-            print(f"Características utilizadas: {len(self.feature_names)}")
-            print(f"Registros para entrenamiento: {len(X)}")
-
-            # 4. Dividir datos
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=None
-            )
-
-            # 5. Entrenar modelos
-            resultados = self.entrenar_modelos(X_train, X_test, y_train, y_test)
+            # 1-5. Cargar, preprocesar, dividir y entrenar
+            X_test, y_test, resultados = self.entrenar_completo()
 
             # 6. Visualizar resultados
             self.visualizar_resultados(X_test, y_test, resultados)
@@ -548,5 +1501,27 @@ class PredictorMermas:
 
 # Ejecutar análisis
 if __name__ == "__main__":
-    predictor = PredictorMermas()
-    predictor.ejecutar_analisis_completo()
+    parser = argparse.ArgumentParser(description='Predicción de mermas')
+    parser.add_argument('--fuente', default='snapshot', choices=['snapshot', 'cubo', 'datamart', 'bd', 'bd_agregada'])
+    parser.add_argument('--nucleos', type=int, default=None, help='Núcleos para entrenar en paralelo')
+    parser.add_argument('--validacion', default='aleatoria', choices=['aleatoria', 'temporal'],
+                        help='División aleatoria o por fecha con parada temprana del boosting')
+    parser.add_argument('--pliegues', type=int, default=0,
+                        help='Pliegues de validación cruzada temporal (solo con --validacion temporal)')
+    parser.add_argument('--buscar', action='store_true', help='Buscar hiperparámetros antes de entrenar')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Solo incorporar los días nuevos a los modelos guardados')
+    parser.add_argument('--rezagos', action='store_true', help='Agregar rezagos y promedios móviles por serie')
+    parser.add_argument('--memoria', action='store_true', help='Reporte de memoria por etapa del preprocesamiento')
+    parser.add_argument('--bloques', action='store_true',
+                        help='Leer y agregar por bloques sin cargar todo el historial (snapshot o bd)')
+    args = parser.parse_args()
+
+    predictor = PredictorMermas(fuente=args.fuente, n_nucleos=args.nucleos,
+                                validacion=args.validacion, n_pliegues=args.pliegues,
+                                buscar_hiperparametros=args.buscar, rezagos=args.rezagos,
+                                perfil_memoria=args.memoria, fuera_de_memoria=args.bloques)
+    if args.incremental:
+        predictor.actualizar_incremental()
+    else:
+        predictor.ejecutar_analisis_completo()
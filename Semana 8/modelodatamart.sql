@@ -59,8 +59,9 @@ CREATE TABLE MERMAS (
     id_producto INT,
     id_tienda INT,
     id_motivo INT,
-    Merma_unidad DECIMAL(10,2),
-    Merma_monto DECIMAL(12,2),
+    -- Mismo valor que en mermasdb, sin redondear a dos decimales
+    Merma_unidad DOUBLE,
+    Merma_monto DOUBLE,
     
     FOREIGN KEY (id_tiempo) REFERENCES TIEMPO(id_tiempo),
     FOREIGN KEY (id_producto) REFERENCES PRODUCTO(id_producto),
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+def codigos_enteros(serie):
+    """Códigos enteros ordenados de una columna (-1 para nulos) y su cardinalidad"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(np.int64), len(serie.cat.categories)
+    codigos, valores = pd.factorize(serie, sort=True)
+    return codigos.astype(np.int64), len(valores)
+
+
+class MotorCaracteristicas:
+    def __init__(self, combinaciones):
+        # combinaciones: lista de (nombre de columna, dimensiones, tipo)
+        #   tipo 'codigo':   código entero de la combinación de dimensiones
+        #   tipo 'promedio': promedio del valor objetivo dentro de la combinación
+        self.combinaciones = combinaciones
+
+    def construir_clave(self, data, dimensiones, cache):
+        """Clave entera de una combinación de dimensiones, sin concatenar strings"""
+        clave, cardinalidad = None, 1
+        for dim in dimensiones:
+            if dim not in cache:
+                cache[dim] = codigos_enteros(data[dim])
+            codigos, n = cache[dim]
+            if clave is None:
+                clave = codigos.copy()
+            else:
+                validos = (clave >= 0) & (codigos >= 0)
+                clave = np.where(validos, clave * n + codigos, -1)
+            cardinalidad *= n
+
+        # Si el espacio de combinaciones es mayor que los datos, compactarlo a las observadas
+        if cardinalidad > len(clave):
+            validos = clave >= 0
+            compacta, observadas = pd.factorize(clave[validos], sort=True)
+            clave[validos] = compacta
+            cardinalidad = len(observadas)
+        return clave, cardinalidad
+
+    def calcular(self, data, valor, peso=None):
+        """Agregar al DataFrame todas las columnas de combinaciones declaradas"""
+        cache = {}
+        claves = {}
+        for _, dimensiones, _ in self.combinaciones:
+            if dimensiones not in claves:
+                claves[dimensiones] = self.construir_clave(data, dimensiones, cache)
+
+        # Códigos de combinaciones: se renumeran de forma densa (igual que pd.Categorical)
+        for nombre, dimensiones, tipo in self.combinaciones:
+            if tipo == 'codigo':
+                clave, _ = claves[dimensiones]
+                codigos = np.full(len(clave), -1, dtype=np.int64)
+                validos = clave >= 0
+                codigos[validos] = np.unique(clave[validos], return_inverse=True)[1]
+                data[nombre] = codigos
+
+        # Promedios por grupo: todas las claves se desplazan a un espacio común y
+        # sumas y conteos se obtienen en una sola pasada de bincount
+        promedios = [(nombre, dimensiones) for nombre, dimensiones, tipo in self.combinaciones
+                     if tipo == 'promedio']
+        if not promedios:
+            return data
+
+        valores = data[valor].to_numpy(np.float64)
+        valores_validos = ~np.isnan(valores)
+        # Con peso, cada fila representa varias observaciones (por ejemplo una celda de un cubo)
+        ponderaciones = data[peso].to_numpy(np.float64) if peso else np.ones(len(valores))
+        ids, pesos, conteos, desplazamientos = [], [], [], []
+        desplazamiento = 0
+        for _, dimensiones in promedios:
+            clave, cardinalidad = claves[dimensiones]
+            incluidos = (clave >= 0) & valores_validos
+            ids.append(clave[incluidos] + desplazamiento)
+            pesos.append(valores[incluidos] * ponderaciones[incluidos])
+            conteos.append(ponderaciones[incluidos])
+            desplazamientos.append(desplazamiento)
+            desplazamiento += cardinalidad
+
+        ids = np.concatenate(ids)
+        sumas = np.bincount(ids, weights=np.concatenate(pesos), minlength=desplazamiento)
+        conteos = np.bincount(ids, weights=np.concatenate(conteos), minlength=desplazamiento)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            medias = sumas / conteos
+
+        for (nombre, dimensiones), desplazamiento in zip(promedios, desplazamientos):
+            clave, _ = claves[dimensiones]
+            columna = np.full(len(clave), np.nan)
+            validos = clave >= 0
+            columna[validos] = medias[clave[validos] + desplazamiento]
+            data[nombre] = columna
+
+        return data
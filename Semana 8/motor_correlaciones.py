@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def _pearson_matriz(X, y):
+    """Correlación de Pearson de cada columna de X con y en una sola operación matricial"""
+    Z = X - X.mean(axis=0)
+    zy = y - y.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (Z.T @ zy) / np.sqrt((Z ** 2).sum(axis=0) * (zy ** 2).sum())
+
+
+def clasificar_correlacion(corr_s, corr_p):
+    """Clasificar la fuerza de una correlación según Spearman y Pearson"""
+    if abs(corr_s) > 0.7 or abs(corr_p) > 0.7:
+        return "Fuerte"
+    if abs(corr_s) >= 0.5 or abs(corr_p) >= 0.5:
+        return "Moderada"
+    return "Débil"
+
+
+def calcular_correlaciones(data, objetivo, variables):
+    """Spearman y Pearson de todas las variables contra el objetivo, ordenadas por |Spearman|"""
+    # Variables duplicadas se calculan una sola vez; las que no existen se informan aparte
+    variables = list(dict.fromkeys(variables))
+    faltantes = [var for var in variables if var not in data.columns]
+    presentes = [var for var in variables if var in data.columns]
+
+    y = data[objetivo].to_numpy(np.float64)
+    X = data[presentes].to_numpy(np.float64)
+    completas = ~np.isnan(X).any(axis=0)
+    validas_y = ~np.isnan(y)
+
+    spearman = np.full(len(presentes), np.nan)
+    pearson = np.full(len(presentes), np.nan)
+
+    # Columnas sin nulos: se rankean una vez y se correlacionan todas juntas
+    if completas.any() and validas_y.all():
+        X_completas = X[:, completas]
+        spearman[completas] = _pearson_matriz(stats.rankdata(X_completas, axis=0), stats.rankdata(y))
+        pearson[completas] = _pearson_matriz(X_completas, y)
+
+    # Columnas con nulos: Pearson por pares completos (como Series.corr); Spearman queda
+    # indefinido igual que en stats.spearmanr con nan_policy='propagate'
+    for i in np.flatnonzero(~completas | ~validas_y.all()):
+        validas = ~np.isnan(X[:, i]) & validas_y
+        if validas.sum() > 1:
+            pearson[i] = _pearson_matriz(X[validas, i:i + 1], y[validas])[0]
+
+    tabla = pd.DataFrame({'Spearman': spearman, 'Pearson': pearson}, index=pd.Index(presentes, name='Variable'))
+    tabla['Tipo'] = [clasificar_correlacion(s, p) for s, p in zip(spearman, pearson)]
+    orden = np.argsort(-np.nan_to_num(np.abs(spearman), nan=-1), kind='stable')
+    return tabla.iloc[orden], faltantes
+
+
+def _pearson_celdas(x, n, suma, suma_cuadrados):
+    """Pearson fila a fila cuando x es constante dentro de cada celda y de y solo se conocen n, Σy y Σy²"""
+    total = n.sum()
+    media_x = (n * x).sum() / total
+    media_y = suma.sum() / total
+    covarianza = ((x - media_x) * (suma - n * media_y)).sum()
+    varianza_x = (n * (x - media_x) ** 2).sum()
+    varianza_y = (suma_cuadrados - 2 * media_y * suma + n * media_y ** 2).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return covarianza / np.sqrt(varianza_x * varianza_y)
+
+
+def _rangos_ponderados(x, n):
+    """Rango promedio (con empates) de cada celda cuando la celda representa n filas iguales en x"""
+    unicos, inversos = np.unique(x, return_inverse=True)
+    pesos = np.bincount(inversos, weights=n)
+    return (np.cumsum(pesos) - (pesos - 1) / 2)[inversos]
+
+
+def calcular_correlaciones_celdas(data, variables, peso='peso', suma='suma', suma_cuadrados='suma_cuadrados',
+                                  suma_rangos='suma_rangos', suma_rangos_cuadrados='suma_rangos_cuadrados'):
+    """Mismas correlaciones que calcular_correlaciones sobre las filas originales, desde celdas agregadas
+    con n, Σy, Σy², Σrango(y) y Σrango(y)² (los rangos de y calculados sobre todas las filas).
+    Sin columnas de rangos, Spearman es aproximado: cada fila toma el rango del promedio de su celda"""
+    variables = list(dict.fromkeys(variables))
+    faltantes = [var for var in variables if var not in data.columns]
+    presentes = [var for var in variables if var in data.columns]
+
+    n = data[peso].to_numpy(np.float64)
+    estadisticos = [data[col].to_numpy(np.float64) for col in (suma, suma_cuadrados)]
+    if suma_rangos in data.columns:
+        estadisticos += [data[col].to_numpy(np.float64) for col in (suma_rangos, suma_rangos_cuadrados)]
+    else:
+        rango = _rangos_ponderados(estadisticos[0] / n, n)
+        estadisticos += [n * rango, n * rango ** 2]
+
+    spearman = np.full(len(presentes), np.nan)
+    pearson = np.full(len(presentes), np.nan)
+    for i, var in enumerate(presentes):
+        x = data[var].to_numpy(np.float64)
+        validas = ~np.isnan(x)
+        # Con nulos, Pearson por pares completos y Spearman indefinido (igual que calcular_correlaciones)
+        if validas.all():
+            spearman[i] = _pearson_celdas(_rangos_ponderados(x, n), n, *estadisticos[2:])
+        if n[validas].sum() > 1:
+            pearson[i] = _pearson_celdas(x[validas], n[validas], *(e[validas] for e in estadisticos[:2]))
+
+    tabla = pd.DataFrame({'Spearman': spearman, 'Pearson': pearson}, index=pd.Index(presentes, name='Variable'))
+    tabla['Tipo'] = [clasificar_correlacion(s, p) for s, p in zip(spearman, pearson)]
+    orden = np.argsort(-np.nan_to_num(np.abs(spearman), nan=-1), kind='stable')
+    return tabla.iloc[orden], faltantes
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from motor_caracteristicas import codigos_enteros
+
+
+class MotorRezagos:
+    def __init__(self, rezagos=(1, 7), ventanas=(7, 28), series=('linea', 'categoria'), prefijo='merma'):
+        # rezagos: días hacia atrás cuyo valor se copia (7 = mismo día de la semana anterior)
+        # ventanas: largo en días de los promedios móviles de los días anteriores
+        # Los días sin registro de una serie cuentan como 0
+        self.rezagos = tuple(rezagos)
+        self.ventanas = tuple(ventanas)
+        self.series = list(series)
+        self.horizonte = max(self.rezagos + self.ventanas)
+        self.columnas = ([f'{prefijo}_rezago_{r}' for r in self.rezagos] +
+                         [f'{prefijo}_media_{v}' for v in self.ventanas])
+        # Últimos días de historia de cada serie, para extender sin recalcular todo
+        self.cola = None
+
+    def calcular_columnas(self, data, valores):
+        """Rezagos y promedios móviles de cada fila a partir de su serie, sin recorrer grupos en Python
+        (ordena las claves serie/día, O(n log n); los días sin fila cuentan como 0 en rezagos y ventanas)"""
+        dias = pd.to_datetime(data['fecha']).to_numpy().astype('datetime64[D]').astype(np.int64)
+        dias = dias - dias.min()
+
+        # Clave entera por serie, compactada a las combinaciones observadas
+        grupo = None
+        for columna in self.series:
+            codigos, n = codigos_enteros(data[columna].astype(object))
+            grupo = codigos if grupo is None else grupo * n + codigos
+        grupo = pd.factorize(grupo)[0].astype(np.int64)
+
+        # Clave combinada serie/día: cada serie ocupa un tramo propio y el desplazamiento por el
+        # horizonte impide que un rezago o una ventana alcance el tramo de la serie anterior
+        base = int(dias.max()) + self.horizonte + 1
+        claves = grupo * base + dias + self.horizonte
+        orden = np.argsort(claves, kind='stable')
+        claves_ordenadas = claves[orden]
+        valores_ordenados = np.asarray(valores, dtype=np.float64)[orden]
+        acumulado = np.concatenate([[0.0], np.cumsum(valores_ordenados)])
+
+        resultado = {}
+        for rezago, columna in zip(self.rezagos, self.columnas):
+            buscadas = claves - rezago
+            posiciones = np.searchsorted(claves_ordenadas, buscadas)
+            posiciones_validas = np.minimum(posiciones, len(claves_ordenadas) - 1)
+            encontrados = claves_ordenadas[posiciones_validas] == buscadas
+            resultado[columna] = np.where(encontrados, valores_ordenados[posiciones_validas], 0.0)
+
+        # Suma de los días [d - ventana, d - 1] como diferencia de sumas acumuladas
+        hasta = acumulado[np.searchsorted(claves_ordenadas, claves - 1, side='right')]
+        for ventana, columna in zip(self.ventanas, self.columnas[len(self.rezagos):]):
+            desde = acumulado[np.searchsorted(claves_ordenadas, claves - ventana - 1, side='right')]
+            resultado[columna] = (hasta - desde) / ventana
+        return resultado
+
+    def recortar_cola(self, historia):
+        """Conservar solo los días que aún pueden entrar en un rezago o una ventana"""
+        limite = historia['fecha'].max() - pd.Timedelta(days=self.horizonte)
+        return historia[historia['fecha'] > limite].reset_index(drop=True)
+
+    def historia(self, data, valor):
+        historia = data[self.series + ['fecha']].copy()
+        for columna in self.series:
+            historia[columna] = historia[columna].astype(object)
+        historia['fecha'] = pd.to_datetime(historia['fecha'])
+        historia['valor'] = data[valor].to_numpy(np.float64)
+        return historia
+
+    def calcular(self, data, valor):
+        """Agregar las columnas de rezagos a un historial diario completo"""
+        historia = self.historia(data, valor)
+        for columna, valores in self.calcular_columnas(historia, historia['valor']).items():
+            data[columna] = valores
+        self.cola = self.recortar_cola(historia)
+        return data
+
+    def ultima_fecha(self):
+        """Última fecha de la historia guardada (None si aún no hay historia)"""
+        return None if self.cola is None or len(self.cola) == 0 else self.cola['fecha'].max()
+
+    def extender(self, data, valor):
+        """Agregar las columnas de rezagos a fechas nuevas usando solo la cola guardada
+        (una fecha que ya estaba en la cola reemplaza su valor)"""
+        nuevos = self.historia(data, valor)
+        if self.cola is None:
+            return self.calcular(data, valor)
+
+        # Si una fecha nueva ya estaba en la cola, prevalece la nueva
+        combinado = pd.concat([self.cola, nuevos], ignore_index=True)
+        duplicados = combinado.duplicated(subset=self.series + ['fecha'], keep='last').to_numpy()
+        combinado = combinado[~duplicados].reset_index(drop=True)
+
+        columnas = self.calcular_columnas(combinado, combinado['valor'])
+        n_nuevos = len(nuevos)
+        for columna, valores in columnas.items():
+            data[columna] = valores[-n_nuevos:]
+        self.cola = self.recortar_cola(combinado)
+        return data
+
+    def fijar_ultimos(self, valores):
+        """Reemplazar los valores de las últimas filas agregadas a la cola (por ejemplo con predicciones)"""
+        self.cola.loc[self.cola.index[-len(valores):], 'valor'] = np.asarray(valores, dtype=np.float64)
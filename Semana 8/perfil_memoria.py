@@ -0,0 +1,51 @@
+import time
+import tracemalloc
+
+
+class PerfilMemoria:
+    def __init__(self, activo=True):
+        # Si no está activo, las llamadas no hacen nada y no se paga el costo de tracemalloc
+        self.activo = activo
+        self.etapas = []
+        self.inicio = None
+
+    def iniciar(self):
+        """Comenzar a medir (reinicia las etapas registradas)"""
+        if not self.activo:
+            return
+        self.etapas = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+
+    def etapa(self, nombre, data=None):
+        """Registrar memoria actual y pico desde la etapa anterior (y el tamaño del DataFrame si se indica)"""
+        if not self.activo or self.inicio is None:
+            return
+        actual, pico = tracemalloc.get_traced_memory()
+        self.etapas.append({
+            'etapa': nombre,
+            'actual_mb': actual / 2 ** 20,
+            'pico_mb': pico / 2 ** 20,
+            'data_mb': data.memory_usage(deep=True).sum() / 2 ** 20 if data is not None else None,
+            'segundos': time.perf_counter() - self.inicio
+        })
+        tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+
+    def reporte(self):
+        """Tabla de memoria por etapa; detiene la medición"""
+        if not self.activo or not self.etapas:
+            return
+        print("\nPERFIL DE MEMORIA POR ETAPA")
+        print("-" * 72)
+        print(f"{'Etapa':28} {'Actual (MB)':>12} {'Pico (MB)':>10} {'Datos (MB)':>11} {'Tiempo (s)':>9}")
+        print("-" * 72)
+        for etapa in self.etapas:
+            datos = f"{etapa['data_mb']:11.1f}" if etapa['data_mb'] is not None else f"{'-':>11}"
+            print(f"{etapa['etapa'][:28]:28} {etapa['actual_mb']:12.1f} {etapa['pico_mb']:10.1f} "
+                  f"{datos} {etapa['segundos']:9.2f}")
+        print(f"Pico máximo: {max(etapa['pico_mb'] for etapa in self.etapas):.1f} MB")
+        tracemalloc.stop()
+        self.inicio = None
@@ -0,0 +1,137 @@
+import os
+import html
+import matplotlib
+import matplotlib.pyplot as plt
+import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
+
+
+def dibujar_mapa_calor(matriz, titulo, xlabel, ylabel):
+    """Mapa de calor de mermas promedio"""
+    plt.figure(figsize=(15, 10))
+    sns.heatmap(matriz,
+                annot=True,
+                fmt='.2f',
+                cmap='YlOrRd',
+                cbar_kws={'label': 'Merma Promedio'})
+    if titulo:
+        plt.title(titulo)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+
+
+def dibujar_serie(serie, titulo, figsize, tipo='bar', xlabel=None, ylabel=None, etiquetas=None,
+                  alinear_derecha=False, cuadricula=False, ajustar=False, marcador=None):
+    """Gráfico de barras o de línea para una serie de mermas"""
+    plt.figure(figsize=figsize)
+    if marcador:
+        serie.plot(kind=tipo, marker=marcador)
+    else:
+        serie.plot(kind=tipo)
+    if titulo:
+        plt.title(titulo)
+    if xlabel:
+        plt.xlabel(xlabel)
+    if ylabel:
+        plt.ylabel(ylabel)
+    if etiquetas is not None:
+        plt.xticks(range(len(etiquetas)), etiquetas, rotation=45)
+    elif alinear_derecha:
+        plt.xticks(rotation=45, ha='right')
+    if cuadricula:
+        plt.grid(True, alpha=0.3)
+    if ajustar:
+        plt.tight_layout()
+
+
+def _inicializar_proceso():
+    """Cada proceso del pool dibuja sin pantalla"""
+    plt.switch_backend('Agg')
+
+
+def _renderizar_figura(indice, nombre, funcion, args, kwargs, directorio, formatos):
+    """Dibujar una figura y guardarla en cada formato pedido"""
+    funcion(*args, **kwargs)
+    archivos = []
+    for formato in formatos:
+        archivo = f"{indice:03d}_{nombre}.{formato}"
+        plt.savefig(os.path.join(directorio, archivo), format=formato, dpi=100)
+        archivos.append(archivo)
+    plt.close('all')
+    return archivos
+
+
+class RenderizadorGraficos:
+    def __init__(self, directorio=None, formatos=('png',), procesos=None):
+        # Sin directorio los gráficos se muestran en pantalla (modo interactivo);
+        # con directorio se acumulan y se guardan en paralelo al llamar renderizar()
+        self.directorio = directorio
+        self.formatos = formatos
+        self.procesos = procesos
+        self.pendientes = []
+        if directorio is not None:
+            matplotlib.use('Agg', force=True)
+
+    @property
+    def sin_pantalla(self):
+        return self.directorio is not None
+
+    def graficar(self, nombre, funcion, *args, **kwargs):
+        """Mostrar la figura o dejarla en cola para el renderizado sin pantalla"""
+        if not self.sin_pantalla:
+            funcion(*args, **kwargs)
+            plt.show()
+            return
+        self.pendientes.append((nombre, funcion, args, kwargs))
+
+    def renderizar(self):
+        """Renderizar en paralelo todas las figuras pendientes y generar index.html"""
+        if not self.sin_pantalla or not self.pendientes:
+            return None
+
+        os.makedirs(self.directorio, exist_ok=True)
+        print(f"\nRenderizando {len(self.pendientes)} gráficos en {self.directorio}...")
+
+        with ProcessPoolExecutor(max_workers=self.procesos, initializer=_inicializar_proceso) as pool:
+            futuros = [
+                pool.submit(_renderizar_figura, indice, nombre, funcion, args, kwargs,
+                            self.directorio, self.formatos)
+                for indice, (nombre, funcion, args, kwargs) in enumerate(self.pendientes, 1)
+            ]
+            archivos = [futuro.result() for futuro in futuros]
+
+        ruta_indice = self.escribir_indice(archivos)
+        self.pendientes = []
+        print(f"Índice de gráficos: {ruta_indice}")
+        return ruta_indice
+
+    def escribir_indice(self, archivos):
+        """Página HTML con enlaces a todas las figuras generadas"""
+        secciones = []
+        for (nombre, _, _, kwargs), archivos_figura in zip(self.pendientes, archivos):
+            titulo = html.escape(kwargs.get('titulo') or nombre)
+            enlaces = ' | '.join(
+                f'<a href="{html.escape(archivo)}">{html.escape(archivo.rsplit(".", 1)[1].upper())}</a>'
+                for archivo in archivos_figura
+            )
+            imagen = next((archivo for archivo in archivos_figura if archivo.endswith('.png')), None)
+            secciones.append(
+                f'<section>\n<h2>{titulo}</h2>\n<p>{enlaces}</p>\n'
+                + (f'<img src="{html.escape(imagen)}" alt="{titulo}" loading="lazy">\n' if imagen else '')
+                + '</section>'
+            )
+
+        contenido = (
+            '<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">\n'
+            '<title>Análisis de correlaciones de mermas</title>\n'
+            '<style>body{font-family:sans-serif;margin:2em}img{max-width:100%}</style>\n'
+            '</head>\n<body>\n<h1>Análisis de correlaciones de mermas</h1>\n'
+            + '\n'.join(secciones)
+            + '\n</body>\n</html>\n'
+        )
+        ruta_indice = os.path.join(self.directorio, 'index.html')
+        with open(ruta_indice, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        return ruta_indice
@@ -0,0 +1,162 @@
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+from cargador_mermas import cargar_en_bloques, compactar_tipos, TAMANO_BLOQUE
+from cubos_mermas import DIAS_REVISION
+
+# Directorio por defecto del snapshot (junto a los scripts de análisis)
+DIRECTORIO_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot_mermas')
+
+# Esquema fijo para que todas las partes del snapshot sean compatibles entre sí.
+# Las dimensiones se guardan con codificación de diccionario y las medidas como
+# float32 (el tipo FLOAT de MariaDB ya es de precisión simple)
+ESQUEMA_SNAPSHOT = pa.schema([
+    ('fecha', pa.timestamp('ns')),
+    ('linea', pa.dictionary(pa.int32(), pa.string())),
+    ('categoria', pa.dictionary(pa.int32(), pa.string())),
+    ('seccion', pa.dictionary(pa.int32(), pa.string())),
+    ('motivo', pa.dictionary(pa.int32(), pa.string())),
+    ('negocio', pa.dictionary(pa.int32(), pa.string())),
+    ('comuna', pa.dictionary(pa.int32(), pa.string())),
+    ('region', pa.dictionary(pa.int32(), pa.string())),
+    ('tienda', pa.dictionary(pa.int32(), pa.string())),
+    ('descripcion', pa.string()),
+    ('merma_unidad', pa.float32()),
+    ('merma_monto', pa.float32()),
+    ('mes', pa.string()),
+    ('año', pa.int64()),
+    ('semestre', pa.string())
+])
+
+COLUMNAS_SNAPSHOT = ESQUEMA_SNAPSHOT.names
+
+
+class SnapshotMermas:
+    def __init__(self, conectar_bd, directorio=DIRECTORIO_SNAPSHOT):
+        self.conectar_bd = conectar_bd
+        self.directorio = directorio
+        self.ruta_estado = os.path.join(directorio, '_estado.json')
+
+    def leer_estado(self):
+        """Leer watermark, corte y partes registradas del snapshot"""
+        if not os.path.exists(self.ruta_estado):
+            return {'watermark': None, 'corte': None, 'partes': [], 'ventana': None,
+                    'registros': 0, 'registros_ventana': 0}
+        with open(self.ruta_estado, encoding='utf-8') as f:
+            estado = json.load(f)
+        # Estados anteriores a la ventana: todas las partes están cerradas hasta el watermark
+        estado.setdefault('corte', estado['watermark'])
+        estado.setdefault('ventana', None)
+        estado.setdefault('registros_ventana', 0)
+        return estado
+
+    def rutas(self, estado):
+        """Rutas de las partes cerradas y de la ventana, en orden de fecha"""
+        partes = estado['partes'] + ([estado['ventana']] if estado['ventana'] else [])
+        return [os.path.join(self.directorio, parte) for parte in partes]
+
+    def escribir_parte(self, data, nombre_parte):
+        """Escribir una parte del snapshot de forma atómica"""
+        tabla = pa.Table.from_pandas(data, schema=ESQUEMA_SNAPSHOT, preserve_index=False)
+        ruta_parte = os.path.join(self.directorio, nombre_parte)
+        pq.write_table(tabla, ruta_parte + '.tmp')
+        os.replace(ruta_parte + '.tmp', ruta_parte)
+
+    def guardar_estado(self, estado):
+        """Guardar el estado del snapshot de forma atómica"""
+        ruta_tmp = self.ruta_estado + '.tmp'
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, indent=2)
+        os.replace(ruta_tmp, self.ruta_estado)
+
+    def extraer(self, desde):
+        """Extraer desde la base de datos las filas con fecha posterior a desde"""
+        connection = self.conectar_bd()
+
+        query = f"""
+        SELECT
+            {', '.join(COLUMNAS_SNAPSHOT)}
+        FROM mermasdb
+        WHERE fecha IS NOT NULL
+        """
+        params = None
+        if desde is not None:
+            query += " AND fecha > %s"
+            params = (desde,)
+        query += " ORDER BY fecha"
+
+        data = cargar_en_bloques(connection, query, params)
+        connection.close()
+        return data
+
+    def actualizar(self):
+        """Actualizar el snapshot de forma incremental, volviendo a leer los últimos DIAS_REVISION días"""
+        os.makedirs(self.directorio, exist_ok=True)
+        estado = self.leer_estado()
+
+        # Las partes cerradas no se reescriben; las fechas posteriores al corte (la ventana) se vuelven a
+        # leer en cada actualización para incorporar filas cargadas tarde. Filas más antiguas que el
+        # corte requieren reconstruir el snapshot (borrar el directorio)
+        data = self.extraer(estado['corte'])
+        if len(data) == 0:
+            print(f"Snapshot al día (watermark: {estado['watermark']})")
+            return 0
+
+        watermark = data['fecha'].max()
+        corte = watermark - pd.Timedelta(days=DIAS_REVISION)
+        if estado['corte'] is not None:
+            corte = max(corte, pd.Timestamp(estado['corte']))
+
+        cerradas = data[data['fecha'] <= corte]
+        if len(cerradas) > 0:
+            nombre_parte = f"parte_{len(estado['partes']):05d}_{corte:%Y%m%d}.parquet"
+            self.escribir_parte(cerradas, nombre_parte)
+            estado['partes'].append(nombre_parte)
+
+        ventana_anterior = estado['ventana']
+        ventana = data[data['fecha'] > corte]
+        estado['ventana'] = f"ventana_{watermark:%Y%m%d}.parquet"
+        self.escribir_parte(ventana, estado['ventana'])
+
+        nuevos = len(data) - estado['registros_ventana']
+        estado['watermark'] = watermark.strftime('%Y-%m-%d')
+        estado['corte'] = corte.strftime('%Y-%m-%d')
+        estado['registros'] += nuevos
+        estado['registros_ventana'] = len(ventana)
+        self.guardar_estado(estado)
+
+        if ventana_anterior and ventana_anterior != estado['ventana']:
+            os.remove(os.path.join(self.directorio, ventana_anterior))
+
+        print(f"Snapshot actualizado: {nuevos} registros nuevos (watermark: {estado['watermark']})")
+        return nuevos
+
+    def cargar(self, columnas=None, filtro=None, actualizar=False):
+        """Leer el snapshot local, opcionalmente filtrado y con solo algunas columnas"""
+        if actualizar:
+            self.actualizar()
+
+        rutas = self.rutas(self.leer_estado())
+        if not rutas:
+            return compactar_tipos(pd.DataFrame(columns=columnas or COLUMNAS_SNAPSHOT))
+
+        tabla = pq.read_table(rutas, columns=columnas, filters=filtro, schema=ESQUEMA_SNAPSHOT)
+        data = compactar_tipos(tabla.to_pandas())
+
+        # Mantener el mismo orden que ORDER BY fecha en la base de datos
+        return data.sort_values('fecha', kind='stable', ignore_index=True)
+
+    def bloques(self, columnas=None, filtro=None, tamano_bloque=TAMANO_BLOQUE, actualizar=False):
+        """Recorrer el snapshot en bloques en orden de fecha, sin leerlo completo a memoria"""
+        if actualizar:
+            self.actualizar()
+
+        # Las partes se escriben en orden de fecha, la ventana va al final y cada una viene ordenada por fecha
+        for ruta in self.rutas(self.leer_estado()):
+            dataset = ds.dataset(ruta, schema=ESQUEMA_SNAPSHOT)
+            for lote in dataset.to_batches(columns=columnas, filter=filtro, batch_size=tamano_bloque):
+                if lote.num_rows > 0:
+                    yield compactar_tipos(lote.to_pandas())
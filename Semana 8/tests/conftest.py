@@ -0,0 +1,127 @@
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import matplotlib
+
+matplotlib.use('Agg')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINEAS = {
+    'CERDO': ('CARNES', 'PERECIBLES', ['CERDO GRANEL', 'CERDO ENV']),
+    'REFRIGERADOS': ('LACTEOS', 'PERECIBLES', ['YOGHURT', 'LECHE']),
+    'HIGIENE': ('PGC', 'PGC', ['CUIDADO PIES', 'JABON'])
+}
+MOTIVOS = ['Clientes', 'Interno', 'Vencimiento']
+TIENDAS = [('ANGOL', 'ANGOL', 'IX'), ('TEMUCO II', 'TEMUCO', 'IX'), ('STGO', 'SANTIAGO', 'RM')]
+
+
+def generar_mermas(n_filas=3000, n_dias=90, semilla=0):
+    """Filas sintéticas con las columnas de mermasdb que leen los análisis (con algunos nulos)"""
+    rng = np.random.RandomState(semilla)
+    lineas = rng.choice(list(LINEAS), n_filas)
+    tiendas = [TIENDAS[i] for i in rng.randint(len(TIENDAS), size=n_filas)]
+    fechas = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.randint(n_dias, size=n_filas), unit='D')
+    unidades = -np.abs(rng.normal(3, 2, n_filas)) * (1 + rng.randint(3, size=n_filas))
+    data = pd.DataFrame({
+        'fecha': fechas.date,
+        'linea': lineas,
+        'categoria': [LINEAS[linea][2][i] for linea, i in zip(lineas, rng.randint(2, size=n_filas))],
+        'seccion': [LINEAS[linea][0] for linea in lineas],
+        'motivo': rng.choice(MOTIVOS, n_filas).astype(object),
+        'negocio': [LINEAS[linea][1] for linea in lineas],
+        'comuna': [tienda[1] for tienda in tiendas],
+        'region': [tienda[2] for tienda in tiendas],
+        'descripcion': [f'PRODUCTO {i % 40}' for i in range(n_filas)],
+        # mermasdb guarda las medidas como FLOAT
+        'merma_unidad': unidades.astype(np.float32).astype(np.float64),
+        'merma_monto': (unidades * rng.uniform(500, 2000, n_filas)).astype(np.float32).astype(np.float64),
+        'mes': 'Enero',
+        'año': 2022,
+        'semestre': 'Primero'
+    })
+    data.loc[::97, 'motivo'] = None
+    data.loc[::211, 'merma_monto'] = np.nan
+    return data
+
+
+class CursorFalso:
+    """Cursor que responde con pandas las consultas de mermasdb que arma PredictorMermas"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self, query, params=None):
+        data = self.data
+        params = list(params or ())
+        for columna in re.findall(r'(\w+) IS NOT NULL', query):
+            data = data[data[columna].notna()]
+        if 'fecha > %s' in query:
+            data = data[data['fecha'] > pd.Timestamp(params.pop(0)).date()]
+        if 'BETWEEN %s AND %s' in query:
+            inferior, superior = params[:2]
+            absoluto = data['merma_unidad'].abs()
+            data = data[(absoluto >= inferior) & (absoluto <= superior)]
+
+        if 'PERCENTILE_CONT' in query:
+            absoluto = data['merma_unidad'].abs().to_numpy()
+            filas = [tuple(np.quantile(absoluto, [0.25, 0.75]))] if len(absoluto) else []
+            columnas = ['q1', 'q3']
+        elif 'SELECT DISTINCT' in query:
+            columnas = [c.strip() for c in re.search(r'DISTINCT(.*?)FROM', query, re.S).group(1).split(',')]
+            filas = list(data[columnas].drop_duplicates().itertuples(index=False, name=None))
+        elif 'GROUP BY fecha, linea, categoria' in query:
+            # MIN binario con nulos como 'Unknown', como consulta_agregada_bd
+            grupos = data.assign(
+                merma_unidad_abs=data['merma_unidad'].abs(), merma_monto_abs=data['merma_monto'].abs(),
+                **{col: data[col].fillna('Unknown') for col in ['seccion', 'motivo', 'negocio']}
+            ).groupby(['fecha', 'linea', 'categoria'])
+            agregado = grupos.agg(
+                merma_unidad_abs=('merma_unidad_abs', 'sum'), merma_monto_abs=('merma_monto_abs', 'sum'),
+                seccion=('seccion', 'min'), motivo=('motivo', 'min'), negocio=('negocio', 'min')
+            ).reset_index()
+            columnas = list(agregado.columns)
+            filas = list(agregado.itertuples(index=False, name=None))
+        else:
+            columnas = [c.strip() for c in re.search(r'SELECT(.*?)FROM', query, re.S).group(1).split(',')]
+            data = data.sort_values('fecha', kind='stable')
+            filas = list(data[columnas].astype(object).where(data[columnas].notna(), None)
+                         .itertuples(index=False, name=None))
+
+        self.description = [(columna,) for columna in columnas]
+        self.filas = iter(filas)
+
+    def fetchone(self):
+        return next(self.filas, None)
+
+    def fetchall(self):
+        return list(self.filas)
+
+    def fetchmany(self, n):
+        return [fila for _, fila in zip(range(n), self.filas)]
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, data):
+        self.data = data
+
+    def cursor(self, *args):
+        return CursorFalso(self.data)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(scope='session')
+def mermas():
+    return generar_mermas()
+
+
+@pytest.fixture
+def conectar_bd(mermas):
+    return lambda: ConexionFalsa(mermas)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from motor_rezagos import MotorRezagos
+
+
+def historial(n_dias=60, semilla=0):
+    """Historial diario por (línea, categoría) con días faltantes en algunas series"""
+    rng = np.random.RandomState(semilla)
+    filas = []
+    for linea, categoria in [('CERDO', 'CERDO ENV'), ('CERDO', 'CERDO GRANEL'), ('HIGIENE', 'JABON')]:
+        for dia in pd.date_range('2022-01-01', periods=n_dias, freq='D'):
+            if rng.rand() < 0.2:
+                continue
+            filas.append((dia, linea, categoria, rng.gamma(2.0, 3.0)))
+    data = pd.DataFrame(filas, columns=['fecha', 'linea', 'categoria', 'valor'])
+    return data.sort_values(['fecha', 'linea', 'categoria'], ignore_index=True)
+
+
+def test_extender_igual_a_recalcular_todo():
+    data = historial()
+    motor = MotorRezagos()
+    completo = motor.calcular(data.copy(), 'valor')
+
+    corte = pd.Timestamp('2022-02-10')
+    incremental = MotorRezagos()
+    incremental.calcular(data[data['fecha'] <= corte].copy(), 'valor')
+    # Días nuevos de a uno, como en predecir_lote, y luego el resto de una vez
+    nuevos = data[data['fecha'] > corte]
+    partes = [nuevos[nuevos['fecha'] == dia] for dia in nuevos['fecha'].unique()[:5]]
+    partes.append(nuevos[nuevos['fecha'] > nuevos['fecha'].unique()[4]])
+    extendidos = pd.concat([incremental.extender(parte.copy(), 'valor') for parte in partes])
+
+    esperado = completo[completo['fecha'] > corte]
+    for col in motor.columnas:
+        np.testing.assert_allclose(extendidos[col].to_numpy(), esperado[col].to_numpy(), err_msg=col)
+
+
+def test_dias_sin_registro_cuentan_como_cero():
+    data = pd.DataFrame({
+        'fecha': pd.to_datetime(['2022-01-01', '2022-01-03', '2022-01-08']),
+        'linea': 'CERDO', 'categoria': 'CERDO ENV', 'valor': [7.0, 14.0, 1.0]
+    })
+    resultado = MotorRezagos(rezagos=(1, 7), ventanas=(7,)).calcular(data, 'valor')
+
+    assert resultado['merma_rezago_1'].tolist() == [0.0, 0.0, 0.0]
+    assert resultado['merma_rezago_7'].tolist() == [0.0, 0.0, 7.0]
+    assert resultado['merma_media_7'].tolist() == pytest.approx([0.0, 1.0, 3.0])
+
+
+def test_ultima_fecha():
+    motor = MotorRezagos()
+    assert motor.ultima_fecha() is None
+    motor.calcular(historial(), 'valor')
+    assert motor.ultima_fecha() == pd.Timestamp('2022-03-01')
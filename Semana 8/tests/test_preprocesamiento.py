@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modelo_predictivo import PredictorMermas
+
+
+def crear_predictor(conectar_bd, tmp_path, fuente='bd', **opciones):
+    predictor = PredictorMermas(fuente=fuente, n_nucleos=2, directorio_modelos=str(tmp_path / 'modelos'),
+                                rezagos=True, **opciones)
+    predictor.conectar_bd = conectar_bd
+    return predictor
+
+
+def comparar(esperado, obtenido):
+    """Mismas columnas y filas; las sumas pueden diferir en el redondeo de float32"""
+    assert list(esperado.columns) == list(obtenido.columns)
+    assert len(esperado) == len(obtenido)
+    for col in esperado.columns:
+        if pd.api.types.is_float_dtype(esperado[col]):
+            np.testing.assert_allclose(esperado[col].to_numpy(np.float64), obtenido[col].to_numpy(np.float64),
+                                       rtol=1e-4, atol=1e-6, err_msg=col)
+        else:
+            np.testing.assert_array_equal(esperado[col].to_numpy(), obtenido[col].to_numpy(), err_msg=col)
+
+
+def comparar_encoders(esperado, obtenido):
+    assert esperado.encoders.keys() == obtenido.encoders.keys()
+    for col in esperado.encoders:
+        assert list(esperado.encoders[col].classes_) == list(obtenido.encoders[col].classes_), col
+
+
+def test_fuera_de_memoria_igual_a_en_memoria(conectar_bd, tmp_path):
+    en_memoria = crear_predictor(conectar_bd, tmp_path)
+    por_bloques = crear_predictor(conectar_bd, tmp_path, fuera_de_memoria=True, tamano_bloque=400)
+
+    esperado = en_memoria.datos_procesados()
+    obtenido = por_bloques.datos_procesados()
+
+    assert por_bloques.limites_iqr == pytest.approx(en_memoria.limites_iqr)
+    comparar(esperado, obtenido)
+    comparar_encoders(en_memoria, por_bloques)
+
+
+def test_fuera_de_memoria_incremental(conectar_bd, tmp_path):
+    en_memoria = crear_predictor(conectar_bd, tmp_path)
+    por_bloques = crear_predictor(conectar_bd, tmp_path, fuera_de_memoria=True, tamano_bloque=400)
+    en_memoria.datos_procesados()
+    por_bloques.datos_procesados()
+
+    esperado = en_memoria.datos_procesados(desde='2022-03-01', ajustar=False)
+    obtenido = por_bloques.datos_procesados(desde='2022-03-01', ajustar=False)
+
+    assert obtenido['fecha'].min() > pd.Timestamp('2022-03-01')
+    comparar(esperado, obtenido)
+
+
+def test_agregado_en_servidor_igual_a_en_memoria(conectar_bd, tmp_path):
+    en_memoria = crear_predictor(conectar_bd, tmp_path)
+    en_servidor = crear_predictor(conectar_bd, tmp_path, fuente='bd_agregada')
+
+    esperado = en_memoria.datos_procesados()
+    obtenido = en_servidor.datos_procesados()
+
+    assert en_servidor.limites_iqr == pytest.approx(en_memoria.limites_iqr)
+    comparar(esperado, obtenido)
+    comparar_encoders(en_memoria, en_servidor)
+
+
+def test_atributos_del_grupo_con_nulos(conectar_bd, tmp_path):
+    # Sección, motivo y negocio toman el menor valor del grupo (nulos como 'Unknown'), la misma regla del
+    # MIN en el servidor
+    predictor = crear_predictor(conectar_bd, tmp_path)
+    data = predictor.datos_procesados()
+    motivos = predictor.encoders['motivo'].classes_[data['motivo_encoded']]
+
+    filas = predictor.conectar_bd().data
+    filas = filas[filas['linea'].notna() & filas['merma_monto'].notna()]
+    inferior, superior = predictor.limites_iqr
+    filas = filas[filas['merma_unidad'].abs().between(inferior, superior)]
+    esperado = filas.assign(motivo=filas['motivo'].fillna('Unknown')).groupby(
+        ['fecha', 'linea', 'categoria'])['motivo'].min()
+
+    assert 'Unknown' in predictor.encoders['motivo'].classes_
+    assert list(motivos) == list(esperado.to_numpy())
@@ -0,0 +1,28 @@
+import pytest
+from modelo_predictivo import MODELOS, MODELOS_UN_HILO, repartir_nucleos
+
+
+@pytest.mark.parametrize('n_nucleos', [6, 7, 8, 12, 16, 64])
+def test_reparte_exactamente_el_presupuesto(n_nucleos):
+    hilos = repartir_nucleos(n_nucleos)
+    assert set(hilos) == set(MODELOS)
+    assert sum(hilos.values()) == n_nucleos
+    assert all(hilos[nombre] == 1 for nombre in MODELOS_UN_HILO)
+
+
+def test_multihilo_repartidos_de_forma_pareja():
+    hilos = repartir_nucleos(16)
+    multihilo = [hilos[nombre] for nombre in MODELOS if nombre not in MODELOS_UN_HILO]
+    assert max(multihilo) - min(multihilo) <= 1
+
+
+@pytest.mark.parametrize('n_nucleos', [1, 2, len(MODELOS) - 1])
+def test_menos_nucleos_que_modelos(n_nucleos, capsys):
+    hilos = repartir_nucleos(n_nucleos)
+    assert all(n == 1 for n in hilos.values())
+    assert 'Aviso' in capsys.readouterr().out
+
+
+def test_sin_aviso_con_nucleos_suficientes(capsys):
+    repartir_nucleos(len(MODELOS))
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+
+# Palabras que no cambian el sentido de una pregunta (sin tildes, ya normalizadas).
+# No se incluyen negaciones, comparativos ni conjunciones (no, mayor, menor, mas, menos, y, o), ni
+# interrogativos, demostrativos, posesivos, preposiciones que agrupan ni verbos que fijan el tiempo
+# ("de este año" no es "por año")
+STOPWORDS = {
+    'a', 'al', 'algun', 'alguna', 'ante', 'con', 'de', 'del', 'dime', 'el', 'en', 'la', 'las',
+    'lo', 'los', 'me', 'muestrame', 'puedes', 'se', 'un', 'una', 'unas', 'unos'
+}
+
+
+def normalizar_pregunta(pregunta):
+    """Forma canónica de una pregunta: minúsculas, sin tildes, sin puntuación ni stopwords"""
+    texto = unicodedata.normalize('NFKD', pregunta.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    # "por favor" es cortesía, pero "por" suele agrupar ("por región") y se conserva
+    palabras = f" {re.sub(r'[^0-9a-z]+', ' ', texto)} ".replace(' por favor ', ' ').split()
+    return ' '.join(palabra for palabra in palabras if palabra not in STOPWORDS)
+
+
+class CacheSQL:
+    def __init__(self, ruta, estructura, capacidad=500, ttl=7 * 24 * 3600):
+        # estructura: texto de la tabla que ve el modelo; si cambia (o cambian las stopwords con que
+        # se normalizan las claves), el SQL guardado deja de valer
+        self.ruta = ruta
+        self.version = hashlib.sha256((estructura + ' '.join(sorted(STOPWORDS))).encode('utf-8')).hexdigest()
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.entradas = self.leer()
+
+    def leer(self):
+        """Entradas guardadas en disco, en orden de uso (la última es la más reciente)"""
+        if not os.path.exists(self.ruta):
+            return OrderedDict()
+        try:
+            with open(self.ruta, encoding='utf-8') as f:
+                contenido = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer la caché de SQL ({e}); se parte vacía")
+            return OrderedDict()
+        if contenido.get('version') != self.version:
+            return OrderedDict()
+        return OrderedDict(contenido['entradas'])
+
+    def guardar_disco(self):
+        """Guardar la caché de forma atómica"""
+        ruta_tmp = self.ruta + '.tmp'
+        with open(ruta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'entradas': list(self.entradas.items())}, f,
+                      ensure_ascii=False, indent=2)
+        os.replace(ruta_tmp, self.ruta)
+
+    def obtener(self, pregunta):
+        """SQL guardado para la pregunta (o una equivalente), o None si no hay o expiró"""
+        clave = normalizar_pregunta(pregunta)
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            return None
+        if time.time() - entrada['creado'] > self.ttl:
+            del self.entradas[clave]
+            self.guardar_disco()
+            return None
+        # El orden de uso solo se lleva en memoria: se escribe a disco con el próximo guardar
+        self.entradas.move_to_end(clave)
+        return entrada['sql']
+
+    def guardar(self, pregunta, sql):
+        """Guardar el SQL de una pregunta, descartando las menos usadas si se supera la capacidad"""
+        clave = normalizar_pregunta(pregunta)
+        self.entradas[clave] = {'sql': sql, 'creado': time.time()}
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.capacidad:
+            self.entradas.popitem(last=False)
+        self.guardar_disco()
+
+
+# Funciones cuyo resultado cambia aunque los datos no cambien: esas consultas no se guardan
+NO_DETERMINISTAS = re.compile(
+    r'\b(now|curdate|curtime|current_date|current_time|current_timestamp|sysdate|rand|uuid)\b', re.IGNORECASE
+)
+
+
+def canonizar_sql(sql):
+    """SQL sin espacios redundantes ni ';' final, respetando los literales entre comillas"""
+    partes = re.split(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*")""", sql.strip().rstrip(';'))
+    return ''.join(parte if i % 2 else re.sub(r'\s+', ' ', parte) for i, parte in enumerate(partes)).strip()
+
+
+def copiar_filas(resultado):
+    """Copia de las filas, para que modificar un resultado entregado no altere el guardado"""
+    return [dict(fila) if isinstance(fila, dict) else fila for fila in resultado]
+
+
+class CacheResultados:
+    def __init__(self, obtener_version, capacidad=200, max_filas=200_000, intervalo_version=60):
+        # obtener_version: función que devuelve un token que cambia cuando se cargan datos nuevos;
+        # se consulta como máximo cada intervalo_version segundos
+        self.obtener_version = obtener_version
+        self.capacidad = capacidad
+        self.max_filas = max_filas
+        self.intervalo_version = intervalo_version
+        self.version = None
+        self.version_consultada = None
+        self.entradas = OrderedDict()
+        self.filas = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def actualizar_version(self):
+        """Consultar el token de datos si pasó el intervalo; si cambió, los resultados guardados se descartan"""
+        ahora = time.monotonic()
+        if self.version_consultada is not None and ahora - self.version_consultada < self.intervalo_version:
+            return
+        version = self.obtener_version()
+        if version != self.version:
+            self.entradas.clear()
+            self.filas = 0
+        self.version = version
+        self.version_consultada = ahora
+
+    def obtener(self, sql):
+        """Resultado guardado de la consulta para la versión actual de los datos, o None"""
+        self.actualizar_version()
+        clave = (self.version, canonizar_sql(sql))
+        resultado = self.entradas.get(clave)
+        if resultado is None:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        self.entradas.move_to_end(clave)
+        return copiar_filas(resultado)
+
+    def guardar(self, sql, resultado):
+        """Guardar un resultado, descartando los menos usados si se supera la capacidad en consultas o filas"""
+        if NO_DETERMINISTAS.search(sql) or len(resultado) > self.max_filas:
+            return
+        clave = (self.version, canonizar_sql(sql))
+        if clave in self.entradas:
+            self.filas -= len(self.entradas.pop(clave))
+        self.entradas[clave] = copiar_filas(resultado)
+        self.filas += len(resultado)
+        while len(self.entradas) > self.capacidad or self.filas > self.max_filas:
+            self.filas -= len(self.entradas.popitem(last=False)[1])
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / total if total else 0.0,
+            'consultas': len(self.entradas),
+            'filas': self.filas
+        }
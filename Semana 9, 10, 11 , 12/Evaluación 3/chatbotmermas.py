@@ -1,8 +1,14 @@
 import mysql.connector
 import openai #recuerden cambiar motor aca al importar
-from datetime import datetime
-from collections import deque
+from datetime import datetime, date
+from decimal import Decimal
+from collections import deque, Counter
 import sys
+import os
+import queue
+import threading
+from cache_chatbot import CacheSQL, CacheResultados
+from pool_conexiones import PoolConexiones
 
 # Configuración de la conexión a MariaDB
 db_config = {
@@ -12,6 +18,10 @@ db_config = {
     'database': 'mermas'
 }
 
+# Conexiones reutilizables: se verifican con ping al prestarse y se cierran tras 5 minutos sin uso
+TAMANO_POOL = 5
+pool = PoolConexiones(db_config, tamano=TAMANO_POOL, max_inactivo=300)
+
 # Configurar el cliente de OpenAI con tu API Key
 client = openai.OpenAI(api_key="AQUI PRUEBN SUS KEYS/ O SI NO CMABIEN DE MOTOR DE IA")
 
@@ -58,10 +68,22 @@ EJEMPLOS_PREGUNTAS = [
     "¿Cuáles son las categorías con mayor riesgo de perecibilidad?"
 ]
 
+# Imprimir la respuesta a medida que el modelo la genera (False: esperar la respuesta completa)
+RESPUESTA_EN_STREAMING = True
+
+# Filas de resultado que se envían al modelo; sobre ese límite se agrega un resumen del total
+MAX_FILAS_PROMPT = 30
+# Valores más frecuentes que se informan por columna de texto en el resumen
+TOP_VALORES = 3
+
 # Historial de las últimas 5 preguntas y respuestas
 historial = deque(maxlen=5)
 
-def obtener_consulta_sql(pregunta):
+# SQL ya generado por pregunta normalizada (se invalida si cambia ESTRUCTURA_TABLA)
+RUTA_CACHE_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_sql.json')
+cache_sql = CacheSQL(RUTA_CACHE_SQL, ESTRUCTURA_TABLA)
+
+def generar_consulta_sql(pregunta):
     prompt = f""" Dada la siguiente estructura de tabla :
     {ESTRUCTURA_TABLA}
     Y la siguiente consulta en lenguaje natural:
@@ -93,23 +115,112 @@ def obtener_consulta_sql(pregunta):
     )
     return response.choices[0].message.content.strip()
 
+# Contador de cambios de mermasdb mantenido por triggers: cambia con cada fila insertada, modificada o
+# borrada (también con cargas LOAD DATA), y leerlo es una búsqueda por llave en vez de recorrer la tabla.
+# TRUNCATE no activa triggers: tras vaciar la tabla hay que incrementar el contador a mano
+SENTENCIAS_VERSION = [
+    """CREATE TABLE IF NOT EXISTS mermasdb_version (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL
+    )""",
+    "INSERT IGNORE INTO mermasdb_version (id, version) VALUES (1, 0)",
+    *(f"""CREATE TRIGGER IF NOT EXISTS mermasdb_version_{operacion.lower()} AFTER {operacion} ON mermasdb
+        FOR EACH ROW UPDATE mermasdb_version SET version = version + 1 WHERE id = 1"""
+      for operacion in ('INSERT', 'UPDATE', 'DELETE'))
+]
+
+def crear_version_datos():
+    with pool.conexion() as conn:
+        cur = conn.cursor()
+        for sentencia in SENTENCIAS_VERSION:
+            cur.execute(sentencia)
+        cur.close()
+
+def version_datos():
+    with pool.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM mermasdb_version WHERE id = 1")
+        version = cur.fetchone()
+        cur.close()
+    return version
+
+# Resultados por SQL canónico mientras no cambien los datos de mermasdb
+cache_resultados = CacheResultados(version_datos)
+
 def ejecutar_sql(sql):
     try:
-        conn = mysql.connector.connect(**db_config)
-        cur = conn.cursor(dictionary = True)
-        cur.execute(sql)
-        results = cur.fetchall()
-        cur.close()
-        conn.close()
+        results = cache_resultados.obtener(sql)
+        if results is not None:
+            return results
+        with pool.conexion() as conn:
+            cur = conn.cursor(dictionary = True)
+            cur.execute(sql)
+            results = cur.fetchall()
+            cur.close()
+        cache_resultados.guardar(sql, results)
         return results 
     except mysql.connector.Error as err:
         raise Exception(f"Error de base de datos: {err}")
 
-def generar_respuesta_final(resultado_sql,pregunta):
+def consultar(pregunta):
+    # Si la misma pregunta (o una equivalente) ya se respondió, no se consulta al modelo; el SQL nuevo
+    # se guarda solo si se ejecutó sin errores (un acierto conserva su fecha de creación)
+    sql = cache_sql.obtener(pregunta)
+    generado = sql is None
+    if generado:
+        sql = generar_consulta_sql(pregunta)
+    print(f"SQL GENERADO : {sql}")
+    resultados = ejecutar_sql(sql)
+    if generado:
+        cache_sql.guardar(pregunta, sql)
+    return sql, resultados
+
+def es_numero(valor):
+    return isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool)
+
+def formatear_valor(valor):
+    # Números redondeados, fechas ISO y texto sin tabulaciones ni saltos de línea
+    if valor is None:
+        return ""
+    if es_numero(valor):
+        valor = float(valor)
+        if valor.is_integer():
+            return str(int(valor))
+        return f"{valor:.2f}" if abs(valor) >= 1 else f"{valor:.4g}"
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return " ".join(str(valor).split())
+
+def resumir_columna(columna, valores):
+    valores = [v for v in valores if v is not None]
+    if valores and all(es_numero(v) for v in valores):
+        numeros = [float(v) for v in valores]
+        return (f"{columna}: total={formatear_valor(sum(numeros))} min={formatear_valor(min(numeros))} "
+                f"max={formatear_valor(max(numeros))} promedio={formatear_valor(sum(numeros) / len(numeros))}")
+    if valores and all(isinstance(v, (date, datetime)) for v in valores):
+        return f"{columna}: desde {formatear_valor(min(valores))} hasta {formatear_valor(max(valores))}"
+    frecuentes = Counter(formatear_valor(v) for v in valores).most_common(TOP_VALORES)
+    return (f"{columna}: {len(set(valores))} valores distintos; más frecuentes: "
+            + ", ".join(f"{valor} ({n})" for valor, n in frecuentes))
+
+def serializar_resultados(resultados, max_filas=MAX_FILAS_PROMPT):
+    # Tabla separada por tabulaciones con el encabezado una sola vez; si hay más filas que max_filas
+    # se envían las primeras (ya vienen ordenadas por la consulta) y un resumen calculado sobre todas
+    if not resultados:
+        return "Sin resultados."
+    columnas = list(resultados[0].keys())
+    lineas = ["\t".join(columnas)]
+    lineas += ["\t".join(formatear_valor(fila[col]) for col in columnas) for fila in resultados[:max_filas]]
+    if len(resultados) > max_filas:
+        lineas.append(f"(se muestran {max_filas} de {len(resultados)} filas; resumen de todas las filas:)")
+        lineas += [resumir_columna(col, [fila[col] for fila in resultados]) for col in columnas]
+    return "\n".join(lineas)
+
+def generar_respuesta_final(resultado_sql,pregunta,al_recibir=None):
     prompt = f"""Dada la siguiente pregunta:
     \"{pregunta}\"
-    Y los siguientes resultados de la consulta SQL:
-    {resultado_sql}
+    Y los siguientes resultados de la consulta SQL (tabla separada por tabulaciones):
+    {serializar_resultados(resultado_sql)}
     Genera una respuesta en lenguage natural, entendible para un usuario de negocio en el ámbito universitario y de RRHH con las siguientes reglas:
     1. Responde directamente sin hacer mención a SQL u otros términos técnicos.
     2. Usa un lenguaje claro, profesional, como si estuvieses conversando con el usuario que efectúa la pregunta.
@@ -125,15 +236,56 @@ def generar_respuesta_final(resultado_sql,pregunta):
     12. Los resultados son utilizados en una conversión tipo chat, por tanto no saludes ni te despidas. Limita a entregar los resultados de manera clara.
     13. IMPORTANTE: Nunca menciones datos técnicos ni pidas disculpas.
     """
-    response = client.chat.completions.create(
+    if al_recibir is None:
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0
+        )
+        return response.choices[0].message.content.strip()
+
+    # En streaming cada fragmento de texto se entrega apenas llega
+    stream = client.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "user", "content": prompt}
         ],
         max_tokens=1000,
-        temperature=0
+        temperature=0,
+        stream=True
     )
-    return response.choices[0].message.content.strip()
+    partes = []
+    for chunk in stream:
+        texto = chunk.choices[0].delta.content if chunk.choices else None
+        if texto:
+            partes.append(texto)
+            al_recibir(texto)
+    return "".join(partes).strip()
+
+def generar_en_segundo_plano(resultado_sql, pregunta, fragmentos):
+    # Corre en un hilo aparte: los fragmentos, la respuesta completa o el error van a la cola
+    try:
+        al_recibir = (lambda texto: fragmentos.put(('texto', texto))) if RESPUESTA_EN_STREAMING else None
+        fragmentos.put(('fin', generar_respuesta_final(resultado_sql, pregunta, al_recibir)))
+    except Exception as e:
+        fragmentos.put(('error', e))
+
+def imprimir_respuesta(fragmentos):
+    print("RESPUESTA : ", end="", flush=True)
+    while True:
+        tipo, valor = fragmentos.get()
+        if tipo == 'texto':
+            print(valor, end="", flush=True)
+        elif tipo == 'error':
+            print()
+            raise valor
+        else:
+            # Sin streaming la respuesta llega completa al final
+            print("" if RESPUESTA_EN_STREAMING else valor)
+            return valor
 
 def mostrar_tabla(resultados):
     if not resultados:
@@ -160,10 +312,17 @@ def mostrar_historial():
     for i, (preg, resp) in enumerate(historial, 1):
         print(f"{i}. Pregunta: {preg}\n   Respuesta: {resp}\n")
 
+def mostrar_cache():
+    est = cache_resultados.estadisticas()
+    print(f"Caché de resultados: {est['aciertos']} aciertos, {est['fallos']} fallos "
+          f"({est['tasa_aciertos']:.0%}), {est['consultas']} consultas y {est['filas']} filas guardadas")
+
 def main():
+    crear_version_datos()
     while True:
-        pregunta = input("Ingrese una pregunta (o 'salir', 'ejemplos', 'historial'): ").strip()
+        pregunta = input("Ingrese una pregunta (o 'salir', 'ejemplos', 'historial', 'cache'): ").strip()
         if pregunta.lower() == 'salir':
+            pool.cerrar()
             print("Chat finalizado")
             break
         if pregunta.lower() == 'ejemplos':
@@ -172,17 +331,21 @@ def main():
         if pregunta.lower() == 'historial':
             mostrar_historial()
             continue
+        if pregunta.lower() == 'cache':
+            mostrar_cache()
+            continue
         if not pregunta or len(pregunta) < 5:
             print("Por favor, ingresa una pregunta más específica. Escribe 'ejemplos' para ver ejemplos de preguntas.")
             continue
         try:
-            sql_query = obtener_consulta_sql(pregunta)
-            print(f"SQL GENERADO : {sql_query}")
-            sql_resultados = ejecutar_sql(sql_query)
+            sql_query, sql_resultados = consultar(pregunta)
+            # El modelo empieza a generar la respuesta mientras se imprime la tabla
+            fragmentos = queue.Queue()
+            threading.Thread(target=generar_en_segundo_plano, args=(sql_resultados, pregunta, fragmentos),
+                             daemon=True).start()
             if isinstance(sql_resultados, list) and sql_resultados and isinstance(sql_resultados[0], dict):
                 mostrar_tabla(sql_resultados)
-            respuesta_final = generar_respuesta_final(sql_resultados, pregunta)
-            print(f"RESPUESTA : {respuesta_final}")
+            respuesta_final = imprimir_respuesta(fragmentos)
             historial.append((pregunta, respuesta_final))
         except Exception as e:
             print(f"Ocurrió un error: {e}")
@@ -0,0 +1,83 @@
+import time
+import queue
+import threading
+from contextlib import contextmanager
+import mysql.connector
+
+
+class PoolConexiones:
+    def __init__(self, config, tamano=5, max_inactivo=300, espera=10):
+        # tamano: conexiones abiertas como máximo (prestadas + disponibles)
+        # max_inactivo: segundos sin uso tras los cuales una conexión se cierra en vez de reutilizarse
+        # espera: segundos que se espera una conexión libre antes de fallar
+        # autocommit evita que una conexión reutilizada siga viendo la foto de una transacción anterior
+        self.config = {**config, 'autocommit': True}
+        self.max_inactivo = max_inactivo
+        self.espera = espera
+        self.cupos = threading.BoundedSemaphore(tamano)
+        # LIFO: se reutilizan primero las más recientes y las sobrantes quedan inactivas hasta reciclarse
+        self.disponibles = queue.LifoQueue()
+        self.creadas = 0
+        self.recicladas = 0
+
+    def obtener(self):
+        """Conexión disponible y sana (verificada con ping), o una nueva si no hay"""
+        if not self.cupos.acquire(timeout=self.espera):
+            raise mysql.connector.Error(msg=f"No hay conexiones libres tras esperar {self.espera} s")
+        try:
+            while True:
+                try:
+                    conn, devuelta = self.disponibles.get_nowait()
+                except queue.Empty:
+                    self.creadas += 1
+                    return mysql.connector.connect(**self.config)
+                if time.monotonic() - devuelta > self.max_inactivo:
+                    self.cerrar_conexion(conn)
+                    continue
+                try:
+                    conn.ping(reconnect=False)
+                    return conn
+                except mysql.connector.Error:
+                    self.cerrar_conexion(conn)
+        except Exception:
+            self.cupos.release()
+            raise
+
+    def devolver(self, conn, sana=True):
+        """Devolver una conexión al pool (si falló, se cierra y el cupo queda libre para una nueva)"""
+        if sana:
+            self.disponibles.put((conn, time.monotonic()))
+        else:
+            self.cerrar_conexion(conn)
+        self.cupos.release()
+
+    def cerrar_conexion(self, conn):
+        self.recicladas += 1
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    @contextmanager
+    def conexion(self):
+        """Préstamo de una conexión: with pool.conexion() as conn: ..."""
+        conn = self.obtener()
+        try:
+            yield conn
+        except mysql.connector.Error:
+            self.devolver(conn, sana=False)
+            raise
+        except BaseException:
+            self.devolver(conn)
+            raise
+        else:
+            self.devolver(conn)
+
+    def cerrar(self):
+        """Cerrar todas las conexiones disponibles"""
+        while True:
+            try:
+                conn, _ = self.disponibles.get_nowait()
+            except queue.Empty:
+                break
+            self.cerrar_conexion(conn)
@@ -0,0 +1,105 @@
+import pytest
+from cache_chatbot import CacheResultados, canonizar_sql
+
+
+class Version:
+    """Token de datos controlable desde la prueba, que cuenta cuántas veces se consultó"""
+
+    def __init__(self):
+        self.valor = 1
+        self.consultas = 0
+
+    def __call__(self):
+        self.consultas += 1
+        return self.valor
+
+
+def consultar(cache, sql, resultado):
+    """Mismo flujo que ejecutar_sql: buscar y, si no está, guardar"""
+    guardado = cache.obtener(sql)
+    if guardado is None:
+        cache.guardar(sql, resultado)
+    return guardado
+
+
+@pytest.mark.parametrize('sql, canonico', [
+    ("SELECT  *\n FROM mermasdb ;", "SELECT * FROM mermasdb"),
+    ("SELECT * FROM mermasdb WHERE tienda = 'TEMUCO  II'", "SELECT * FROM mermasdb WHERE tienda = 'TEMUCO  II'"),
+    ("SELECT 'a;  b' ,\t\"x  y\"", "SELECT 'a;  b' , \"x  y\""),
+    ("SELECT * FROM t WHERE c = 'O''Higgins   sur'", "SELECT * FROM t WHERE c = 'O''Higgins   sur'"),
+    ("SELECT * FROM t WHERE c = 'a\\'  b'   AND d = 1", "SELECT * FROM t WHERE c = 'a\\'  b' AND d = 1"),
+])
+def test_canonizar_sql(sql, canonico):
+    assert canonizar_sql(sql) == canonico
+
+
+def test_literales_distintos_no_comparten_resultado():
+    cache = CacheResultados(Version())
+    consultar(cache, "SELECT * FROM t WHERE tienda = 'TEMUCO  II'", [{'n': 1}])
+    assert cache.obtener("SELECT * FROM t WHERE tienda = 'TEMUCO II'") is None
+    assert cache.obtener("SELECT *  FROM t WHERE tienda = 'TEMUCO  II';") == [{'n': 1}]
+
+
+def test_descarta_la_menos_usada_por_capacidad():
+    cache = CacheResultados(Version(), capacidad=2)
+    consultar(cache, 'SELECT 1', [{'a': 1}])
+    consultar(cache, 'SELECT 2', [{'a': 2}])
+    assert cache.obtener('SELECT 1') == [{'a': 1}]
+    consultar(cache, 'SELECT 3', [{'a': 3}])
+
+    assert cache.obtener('SELECT 2') is None
+    assert cache.obtener('SELECT 1') == [{'a': 1}]
+    assert cache.obtener('SELECT 3') == [{'a': 3}]
+
+
+def test_descarta_por_filas_y_no_guarda_resultados_grandes():
+    cache = CacheResultados(Version(), max_filas=5)
+    consultar(cache, 'SELECT 1', [{'a': i} for i in range(3)])
+    consultar(cache, 'SELECT 2', [{'a': i} for i in range(3)])
+    assert cache.obtener('SELECT 1') is None
+    assert cache.estadisticas()['filas'] == 3
+
+    consultar(cache, 'SELECT 3', [{'a': i} for i in range(6)])
+    assert cache.obtener('SELECT 3') is None
+    assert cache.obtener('SELECT 2') is not None
+
+
+def test_no_guarda_consultas_no_deterministas():
+    cache = CacheResultados(Version())
+    consultar(cache, 'SELECT * FROM t WHERE fecha = CURDATE()', [{'a': 1}])
+    assert cache.obtener('SELECT * FROM t WHERE fecha = CURDATE()') is None
+
+
+def test_invalida_al_cambiar_la_version():
+    version = Version()
+    cache = CacheResultados(version, intervalo_version=0)
+    consultar(cache, 'SELECT 1', [{'a': 1}])
+    assert cache.obtener('SELECT 1') == [{'a': 1}]
+
+    version.valor = 2
+    assert cache.obtener('SELECT 1') is None
+    assert cache.estadisticas()['consultas'] == 0
+
+
+def test_version_se_consulta_como_maximo_cada_intervalo():
+    version = Version()
+    cache = CacheResultados(version, intervalo_version=3600)
+    for _ in range(5):
+        consultar(cache, 'SELECT 1', [{'a': 1}])
+    version.valor = 2
+
+    assert version.consultas == 1
+    assert cache.obtener('SELECT 1') == [{'a': 1}]
+
+
+def test_resultados_entregados_son_copias():
+    cache = CacheResultados(Version())
+    filas = [{'a': 1}]
+    consultar(cache, 'SELECT 1', filas)
+    filas[0]['a'] = 99
+
+    entregado = cache.obtener('SELECT 1')
+    entregado[0]['a'] = 7
+    entregado.append({'a': 8})
+
+    assert cache.obtener('SELECT 1') == [{'a': 1}]
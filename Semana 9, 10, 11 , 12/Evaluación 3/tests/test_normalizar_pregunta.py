@@ -0,0 +1,50 @@
+import pytest
+from cache_chatbot import CacheSQL, normalizar_pregunta
+
+
+@pytest.mark.parametrize('pregunta, equivalente', [
+    ("¿Cuáles son las mermas más altas por región?", "cuales son las mermas mas altas por region"),
+    ("Por favor, dime el monto total de mermas en 2023", "monto total de mermas en 2023"),
+    ("¿Me puedes decir la merma por tienda?", "decir merma por tienda"),
+    ("Muéstrame la merma por tienda", "merma por tienda"),
+    ("MERMAS   del mes de enero!!", "mermas mes enero"),
+])
+def test_preguntas_equivalentes(pregunta, equivalente):
+    assert normalizar_pregunta(pregunta) == normalizar_pregunta(equivalente)
+
+
+@pytest.mark.parametrize('pregunta, distinta', [
+    # Agrupar no es filtrar
+    ("Mermas por año", "Mermas de este año"),
+    ("Merma por tienda", "Merma de la tienda"),
+    # Demostrativos y posesivos fijan el alcance
+    ("Mermas de este mes", "Mermas del mes"),
+    ("Mermas de esta tienda", "Mermas de la tienda"),
+    ("Mermas de mi tienda", "Mermas de la tienda"),
+    # Interrogativos cambian lo que se pide
+    ("¿Cuánto fue la merma en enero?", "¿Cuándo fue la merma en enero?"),
+    ("¿Qué tienda tuvo más merma?", "¿Cuál región tuvo más merma?"),
+    # Negaciones, comparativos y conjunciones
+    ("Mermas que no son de vencimiento", "Mermas que son de vencimiento"),
+    ("Tienda con mayor merma", "Tienda con menor merma"),
+    ("Mermas de cerdo y pollo", "Mermas de cerdo o pollo"),
+])
+def test_preguntas_distintas_no_colisionan(pregunta, distinta):
+    assert normalizar_pregunta(pregunta) != normalizar_pregunta(distinta)
+
+
+def test_por_se_conserva_fuera_de_por_favor():
+    assert normalizar_pregunta("Por favor, merma por región") == 'merma por region'
+
+
+def test_cache_sql_comparte_entrada_entre_equivalentes(tmp_path):
+    cache = CacheSQL(str(tmp_path / 'cache_sql.json'), 'TABLA mermasdb')
+    cache.guardar("¿Cuál es la merma por región?", 'SELECT 1')
+
+    assert cache.obtener("cual es la merma por region") == 'SELECT 1'
+    assert cache.obtener("¿Cuál es la merma de esta región?") is None
+    assert CacheSQL(str(tmp_path / 'cache_sql.json'), 'TABLA mermasdb').obtener(
+        "Cuál es la merma por región") == 'SELECT 1'
+    # Otra estructura de tabla invalida lo guardado
+    assert CacheSQL(str(tmp_path / 'cache_sql.json'), 'TABLA otra').obtener(
+        "Cuál es la merma por región") is None
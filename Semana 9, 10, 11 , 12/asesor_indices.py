@@ -0,0 +1,277 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+import mysql.connector
+
+# Scripts de análisis y predicción de Semana 8
+RUTA_SEMANA_8 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Semana 8')
+
+# Configuración de la conexión a MariaDB (la misma del chatbot)
+db_config = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '12345',
+    'database': 'mermas'
+}
+
+# SQL representativo de lo que genera el chatbot para EJEMPLOS_PREGUNTAS
+CONSULTAS_CHATBOT = {
+    "¿Cuáles son las mermas más altas por región?": """
+        SELECT region, SUM(ABS(merma_unidad)) AS total_unidades, SUM(ABS(merma_monto)) AS total_monto
+        FROM mermasdb
+        GROUP BY region
+        ORDER BY total_monto DESC
+        LIMIT 100
+    """,
+    "¿Qué productos tuvieron mayor merma en el mes de enero?": """
+        SELECT descripcion, SUM(ABS(merma_unidad)) AS total_unidades
+        FROM mermasdb
+        WHERE MONTH(fecha) = 1
+        GROUP BY descripcion
+        ORDER BY total_unidades DESC
+        LIMIT 100
+    """,
+    "¿Cuánto fue el monto total de mermas en 2023?": """
+        SELECT SUM(ABS(merma_monto)) AS monto_total
+        FROM mermasdb
+        WHERE fecha >= '2023-01-01' AND fecha < '2024-01-01'
+    """,
+    "¿En qué tienda se registró la mayor merma de unidades?": """
+        SELECT tienda, SUM(ABS(merma_unidad)) AS total_unidades
+        FROM mermasdb
+        GROUP BY tienda
+        ORDER BY total_unidades DESC
+        LIMIT 100
+    """,
+    "¿Cuáles son las categorías con mayor riesgo de perecibilidad?": """
+        SELECT categoria, linea, COUNT(*) AS registros
+        FROM mermasdb
+        WHERE LOWER(riesgo_perecibilidad) LIKE '%alto%'
+        GROUP BY categoria, linea
+        ORDER BY registros DESC
+        LIMIT 100
+    """,
+    "Mermas de la región IX en el último mes": """
+        SELECT fecha, SUM(ABS(merma_monto)) AS monto
+        FROM mermasdb
+        WHERE region = 'IX' AND fecha >= (SELECT MAX(fecha) FROM mermasdb) - INTERVAL 1 MONTH
+        GROUP BY fecha
+        ORDER BY fecha
+    """,
+    "Evolución de mermas de una tienda": """
+        SELECT fecha, SUM(ABS(merma_unidad)) AS unidades
+        FROM mermasdb
+        WHERE tienda = (SELECT MIN(tienda) FROM mermasdb)
+        GROUP BY fecha
+        ORDER BY fecha
+    """
+}
+
+# Índices candidatos: nombre -> columnas
+INDICES_PROPUESTOS = {
+    'idx_mermasdb_fecha': ['fecha'],
+    'idx_mermasdb_region_fecha': ['region', 'fecha'],
+    'idx_mermasdb_tienda_fecha': ['tienda', 'fecha'],
+    'idx_mermasdb_categoria_linea': ['categoria', 'linea']
+}
+
+# Mejora mínima (fracción del tiempo base) para considerar que un índice gana
+MEJORA_MINIMA = 0.10
+
+
+def generar_consultas_chatbot():
+    """Generar con el LLM el SQL de EJEMPLOS_PREGUNTAS (requiere la API configurada)"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Evaluación 3'))
+    import chatbotmermas
+    return {pregunta: chatbotmermas.generar_consulta_sql(pregunta)
+            for pregunta in chatbotmermas.EJEMPLOS_PREGUNTAS}
+
+
+def consultas_carga(cursor):
+    """Consultas de carga de Semana 8, armadas por AnalisisCorrelacional y PredictorMermas (las de
+    fuente='bd_agregada' con los límites IQR reales de mermasdb)"""
+    sys.path.insert(0, RUTA_SEMANA_8)
+    from analisis_correlacional import AnalisisCorrelacional
+    from modelo_predictivo import PredictorMermas
+    predictor = PredictorMermas(fuente='bd_agregada')
+    cuartiles = predictor.consulta_cuartiles_bd()
+    cursor.execute(*cuartiles)
+    q1_unidad, q3_unidad = (float(valor) for valor in cursor.fetchone().values())
+    iqr_unidad = q3_unidad - q1_unidad
+    predictor.limites_iqr = (q1_unidad - 1.5 * iqr_unidad, q3_unidad + 1.5 * iqr_unidad)
+    return {
+        'carga_correlacional': AnalisisCorrelacional(fuente='bd').consulta_bd(),
+        'carga_predictor': predictor.consulta_bd(),
+        'carga_predictor_cuartiles': cuartiles,
+        'carga_predictor_dimensiones': predictor.consulta_dimensiones_bd(),
+        'carga_predictor_agregada': predictor.consulta_agregada_bd()
+    }
+
+
+def indices_existentes(cursor):
+    """Nombres de índices definidos actualmente sobre mermasdb"""
+    cursor.execute("SHOW INDEX FROM mermasdb")
+    return {fila['Key_name'] for fila in cursor.fetchall()}
+
+
+def crear_indice(cursor, nombre):
+    columnas = ', '.join(INDICES_PROPUESTOS[nombre])
+    cursor.execute(f"CREATE INDEX {nombre} ON mermasdb ({columnas})")
+
+
+def eliminar_indice(cursor, nombre):
+    cursor.execute(f"DROP INDEX {nombre} ON mermasdb")
+
+
+def explicar(cursor, sql, params=None):
+    """Plan de ejecución resumido: tipo de acceso, índice usado, filas estimadas y extras"""
+    cursor.execute(f"EXPLAIN {sql}", params)
+    return [
+        {
+            'tabla': fila['table'],
+            'tipo': fila['type'],
+            'indice': fila['key'],
+            'filas': fila['rows'],
+            'extra': fila['Extra']
+        }
+        for fila in cursor.fetchall()
+    ]
+
+
+def medir(cursor, sql, repeticiones, params=None):
+    """Mediana del tiempo de ejecución (incluye leer todas las filas), tras un calentamiento"""
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def ejecutar_carga(cursor, consultas, repeticiones):
+    """Medir y explicar cada consulta de la carga de trabajo (SQL o tupla SQL y parámetros)"""
+    resultados = {}
+    for nombre, consulta in consultas.items():
+        sql, params = consulta if isinstance(consulta, tuple) else (consulta, None)
+        resultados[nombre] = {
+            'tiempo': medir(cursor, sql, repeticiones, params),
+            'plan': explicar(cursor, sql, params)
+        }
+    return resultados
+
+
+def resumir_plan(plan):
+    return '; '.join(
+        f"{p['tipo']}/{p['indice'] or '-'}/{p['filas']}" + (f" ({p['extra']})" if p['extra'] else '')
+        for p in plan
+    )
+
+
+def imprimir_comparacion(titulo, base, nuevo):
+    print(f"\n{titulo}")
+    print("-" * 100)
+    print(f"{'Consulta':45} {'Antes (s)':>10} {'Después (s)':>12} {'Mejora':>8}")
+    print("-" * 100)
+    for nombre in base:
+        antes = base[nombre]['tiempo']
+        despues = nuevo[nombre]['tiempo']
+        mejora = (antes - despues) / antes * 100 if antes > 0 else 0
+        print(f"{nombre[:45]:45} {antes:10.4f} {despues:12.4f} {mejora:7.1f}%")
+        print(f"    antes:   {resumir_plan(base[nombre]['plan'])}")
+        print(f"    después: {resumir_plan(nuevo[nombre]['plan'])}")
+
+
+def asesorar(aplicar=False, repeticiones=3, usar_llm=False):
+    """Comparar la carga de trabajo sin índices, con cada índice candidato y con el conjunto ganador"""
+    # El chatbot (cliente de OpenAI y pool de conexiones) solo se importa con usar_llm
+    consultas_chatbot = generar_consultas_chatbot() if usar_llm else CONSULTAS_CHATBOT
+
+    conn = mysql.connector.connect(**db_config)
+    cur = conn.cursor(dictionary=True)
+
+    # Índices candidatos que ya existían: se restauran al terminar, pase lo que pase
+    originales = INDICES_PROPUESTOS.keys() & indices_existentes(cur)
+    aplicados = set()
+    try:
+        consultas = {**consultas_carga(cur), **consultas_chatbot}
+        ganadores = evaluar_indices(cur, consultas, repeticiones)
+        if ganadores and aplicar:
+            aplicados = set(ganadores)
+            print("\nÍndices aplicados.")
+        elif ganadores:
+            print("\nÍndices no aplicados (use --aplicar para dejarlos creados).")
+        return ganadores
+    finally:
+        restaurar_indices(cur, originales | aplicados)
+        cur.close()
+        conn.close()
+
+
+def restaurar_indices(cur, objetivo):
+    """Dejar creados exactamente los índices candidatos de objetivo (los demás candidatos se eliminan)"""
+    existentes = INDICES_PROPUESTOS.keys() & indices_existentes(cur)
+    for nombre in existentes - objetivo:
+        eliminar_indice(cur, nombre)
+    for nombre in objetivo - existentes:
+        crear_indice(cur, nombre)
+
+
+def evaluar_indices(cur, consultas, repeticiones):
+    """Medir la carga sin índices candidatos, con cada uno y con el conjunto ganador; devuelve los ganadores"""
+    # Línea base: sin ninguno de los índices propuestos
+    restaurar_indices(cur, set())
+    cur.execute("ANALYZE TABLE mermasdb")
+    cur.fetchall()
+    print("Midiendo carga de trabajo sin índices...")
+    base = ejecutar_carga(cur, consultas, repeticiones)
+
+    # Cada índice por separado: gana si alguna consulta lo usa y mejora lo suficiente
+    ganadores = []
+    for nombre in INDICES_PROPUESTOS:
+        print(f"Evaluando {nombre} ({', '.join(INDICES_PROPUESTOS[nombre])})...")
+        crear_indice(cur, nombre)
+        cur.execute("ANALYZE TABLE mermasdb")
+        cur.fetchall()
+        con_indice = ejecutar_carga(cur, consultas, repeticiones)
+        beneficiadas = [
+            consulta for consulta, medida in con_indice.items()
+            if any(p['indice'] == nombre for p in medida['plan'])
+            and medida['tiempo'] < base[consulta]['tiempo'] * (1 - MEJORA_MINIMA)
+        ]
+        eliminar_indice(cur, nombre)
+        if beneficiadas:
+            ganadores.append(nombre)
+            print(f"  ✔ mejora: {', '.join(beneficiadas)}")
+        else:
+            print("  ✘ sin mejora significativa")
+
+    if not ganadores:
+        print("\nNingún índice candidato mejoró la carga de trabajo.")
+        return []
+
+    # Conjunto ganador completo
+    restaurar_indices(cur, set(ganadores))
+    cur.execute("ANALYZE TABLE mermasdb")
+    cur.fetchall()
+    final = ejecutar_carga(cur, consultas, repeticiones)
+    imprimir_comparacion("Carga de trabajo: sin índices vs conjunto ganador", base, final)
+
+    print("\nConjunto ganador:")
+    for nombre in ganadores:
+        print(f"  CREATE INDEX {nombre} ON mermasdb ({', '.join(INDICES_PROPUESTOS[nombre])});")
+    return ganadores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Asesor de índices para mermasdb')
+    parser.add_argument('--aplicar', action='store_true', help='Dejar creado el conjunto de índices ganador')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por consulta')
+    parser.add_argument('--llm', action='store_true',
+                        help='Generar el SQL de EJEMPLOS_PREGUNTAS con el chatbot en vez de usar el predefinido')
+    args = parser.parse_args()
+    asesorar(aplicar=args.aplicar, repeticiones=args.repeticiones, usar_llm=args.llm)